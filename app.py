@@ -1,27 +1,44 @@
 import eventlet
 eventlet.monkey_patch()
 
-from flask import Flask, render_template, jsonify, request
-from flask_socketio import SocketIO, emit
+from flask import Flask, Response, render_template, jsonify, request, send_file, stream_with_context
+from flask_socketio import SocketIO, emit, join_room, leave_room
 # 匯入 reconstruct_game_data 來處理 Hash 資料重組
-from database import get_aggregated_character_stats, get_all_games_from_redis, reconstruct_game_data, redis_client
+from database import (get_aggregated_character_stats, get_all_games_from_redis, get_games_page,
+                      get_player_leaderboard as get_player_leaderboard_from_redis, reconstruct_game_data, redis_client)
+from config import REPLAY_PAGE_SIZE, SIMULATE_BATCH_MAX_GAMES, SIMULATE_BATCH_TIMEOUT
 from web_game_logic import WebBattleGame
 import json
 import sys
 import os
 import threading
-import queue
-import time
+import uuid
+from eventlet.green import subprocess
 
 # 匯入 GUI 模式遊戲執行器
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from main import run_gui_game
+from web_runner import WebTurnRunner, DASHBOARD_ROOM, game_room
+from assets import asset_stats
+from cache import ResponseCache, cached_response
+from session_store import create_session_store
+from write_behind import WriteBehind
+from metrics import Metrics
+from request_timing import (RouteProfiler, SlowRequestLog, check_admin_token, init_request_timing,
+                            profile_text, timed_event)
+from game_scheduler import GameScheduler
+from replay import ReplayCache, iter_replay_pages, load_replay_page, verify_game
+from state_protocol import DeltaEncoder, RoomEncoders, negotiate, pack_message, client_mode, state_room
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret'
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
-game_input_queue = queue.Queue()
-active_web_games = {}
+init_request_timing(app)  # 每個路由的延遲 (/metrics)、慢請求日誌與按需 cProfile
+game_scheduler = GameScheduler(socketio.start_background_task)  # Pygame 遊戲的並行上限與排隊
+game_input_queues = {}  # game_id -> 該場 web 顯示模式遊戲的 WebTurnRunner (有 put()，遊戲結束時移除)
+active_web_games = create_session_store()  # 進行中的網頁版遊戲 (LRU + 閒置清理，可選 Redis 共用)
+simulate_batch_lock = threading.Lock()  # /api/simulate_batch 同一時間只執行一批
+client_protocols = {}  # sid -> protocol_hello 協商結果 + 該客戶端各場遊戲的 DeltaEncoder
 
 @app.route('/')
 def index():
@@ -46,7 +63,25 @@ def get_all_games():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/games')
+def get_games():
+    """
+    游標分頁的遊戲記錄 (新到舊)
+    參數: cursor (上一頁的 next_cursor)、limit (1-100，預設 20)、fields (逗號分隔的欄位)
+    """
+    try:
+        cursor = request.args.get('cursor', type=int)
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        fields = request.args.get('fields')
+        fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
+        return jsonify(get_games_page(cursor=cursor, limit=limit, fields=fields))
+    except Exception as e:
+        print(f"[API] 分頁讀取遊戲錯誤: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/stats')
+@cached_response('stats')
 def get_stats():
     """獲取整體統計資料"""
     try:
@@ -81,6 +116,7 @@ def get_stats():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/recent_games')
+@cached_response('recent_games')
 def get_recent_games():
     """獲取最近的遊戲記錄"""
     try:
@@ -126,6 +162,7 @@ def get_game_detail(game_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/character_stats')
+@cached_response('character_stats')
 def get_character_stats():
     """獲取角色統計資料"""
     try:
@@ -142,6 +179,107 @@ def get_character_stats():
         print(f"[API] 獲取角色統計錯誤: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/asset_stats')
+def get_asset_stats():
+    """Pygame 素材快取統計 (命中率與記憶體佔用)"""
+    try:
+        return jsonify(asset_stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cache_stats')
+def get_cache_stats():
+    """API 回應快取統計 (命中 / 未命中 / 失效次數)"""
+    try:
+        return jsonify(dict(ResponseCache.stats(), replay=ReplayCache.stats()))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions/stats')
+def get_session_stats():
+    """進行中網頁版遊戲的數量、淘汰次數與記憶體估計 (含背景寫入的佇列狀態)"""
+    try:
+        return jsonify(dict(active_web_games.stats(), write_behind=WriteBehind.stats()))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def allocate_game_id():
+    """向 Redis 取號；Redis 未連接時使用本機暫用 ID (不會存檔)"""
+    return redis_client.incr('game:id:counter') if redis_client else f'local-{uuid.uuid4().hex[:8]}'
+
+def scheduled_game_response(game_id, ticket):
+    """依排程結果回應：立即開始 / 排隊中 / 429 (附 Retry-After 秒數)"""
+    if ticket['status'] == 'rejected':
+        response = jsonify({
+            'success': False,
+            'error': '目前進行中的 Pygame 遊戲已達上限，請稍後再試',
+            'retry_after': ticket['retry_after']
+        })
+        response.headers['Retry-After'] = str(ticket['retry_after'])
+        return response, 429
+
+    message = 'Game started' if ticket['status'] == 'running' else 'Game queued'
+    return jsonify(dict(ticket, success=True, message=message, game_id=game_id))
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus 格式的執行指標 (Redis 指令延遲、錯誤、重試與連線池使用量)"""
+    return Response(Metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# === 管理 API (需要 X-Admin-Token，admin_token 未設定時停用) ===
+
+ADMIN_FORBIDDEN_MSG = '需要有效的 X-Admin-Token'
+
+@app.route('/api/admin/slow_requests')
+def get_slow_requests():
+    """最近超過 slow_request_ms 的請求 (含請求內容)"""
+    if not check_admin_token():
+        return jsonify({'error': ADMIN_FORBIDDEN_MSG}), 403
+    return jsonify(SlowRequestLog.recent())
+
+@app.route('/api/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """
+    按需 cProfile
+    POST {"route": "/api/leaderboard/players", "count": 20} 量測該路由接下來 20 次請求
+    (Socket.IO 事件用 "socketio:web_action")；GET 查詢狀態與已完成的結果；DELETE 取消
+    """
+    if not check_admin_token():
+        return jsonify({'error': ADMIN_FORBIDDEN_MSG}), 403
+    try:
+        if request.method == 'POST':
+            data = request.json or {}
+            route = data.get('route')
+            if not route:
+                return jsonify({'error': '缺少 route'}), 400
+            return jsonify(RouteProfiler.arm(route, data.get('count', 10)))
+        if request.method == 'DELETE':
+            RouteProfiler.cancel()
+        return jsonify(RouteProfiler.status())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/profile/<name>')
+def download_profile(name):
+    """下載 .prof 檔 (pstats 格式，可用 snakeviz 開啟)；format=text 回傳依累計時間排序的文字報表"""
+    if not check_admin_token():
+        return jsonify({'error': ADMIN_FORBIDDEN_MSG}), 403
+    path = RouteProfiler.profile_path(name)
+    if path is None:
+        return jsonify({'error': '找不到此 profile'}), 404
+    if request.args.get('format') == 'text':
+        limit = request.args.get('limit', 40, type=int)
+        return Response(profile_text(path, limit), mimetype='text/plain')
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=name)
+
+@app.route('/api/scheduler/stats')
+def get_scheduler_stats():
+    """Pygame 遊戲排程：執行中 / 排隊數、各難度等待時間、拒絕次數"""
+    try:
+        return jsonify(game_scheduler.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/run_game', methods=['POST'])
 def run_game():
     """執行一場新遊戲（手動模式）"""
@@ -157,26 +295,106 @@ def run_game():
         
         print(f"[API] 開始手動戰鬥 - 玩家: {player_name}, 難度: {difficulty}, 顯示: {display_mode}")
         
-        socketio.start_background_task(
-            target=run_gui_game,
+        # 先配置遊戲 ID：前端以 join_game 加入該場的 room，player_action 也要帶上它
+        game_id = allocate_game_id()
+        
+        if display_mode != 'web':
+            ticket = game_scheduler.submit(
+                run_gui_game,
+                mode=mode,
+                player_name=player_name,
+                difficulty=difficulty,
+                socketio=socketio,
+                game_id=game_id if isinstance(game_id, int) else None
+            )
+            return scheduled_game_response(game_id, ticket)
+        
+        # 網頁顯示模式：事件驅動，只在玩家輸入或計時到期時推進，不佔用 green thread
+        runner = WebTurnRunner(
+            game_id,
             mode=mode,
             player_name=player_name,
             difficulty=difficulty,
-            display_mode=display_mode,
             socketio=socketio,
-            input_queue=game_input_queue
+            on_finish=lambda: game_input_queues.pop(game_id, None)
         )
+        game_input_queues[game_id] = runner
+        runner.start()
         
-        return jsonify({'success': True, 'message': 'Game started'})
+        return jsonify({'success': True, 'message': 'Game started', 'game_id': game_id})
     except Exception as e:
         print(f"[API] 執行遊戲錯誤: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
     
 @socketio.on('player_action')
+@timed_event('player_action')
 def handle_player_action(data):
     action = data.get('action')
-    print(f"[WebSocket] 收到網頁動作: {action}")
-    game_input_queue.put(action)
+    game_id = data.get('game_id')
+    if isinstance(game_id, str) and game_id.isdigit():
+        game_id = int(game_id)
+    
+    # 舊版前端不帶 game_id：只有在剛好一場遊戲進行中時才能判斷目標
+    if game_id is None and len(game_input_queues) == 1:
+        game_id = next(iter(game_input_queues))
+    
+    input_queue = game_input_queues.get(game_id)
+    if input_queue is None:
+        print(f"[WebSocket] 找不到遊戲 #{game_id} 的輸入隊列，忽略動作: {action}")
+        return
+    
+    print(f"[WebSocket] 收到遊戲 #{game_id} 的網頁動作: {action}")
+    input_queue.put(action)
+
+@app.route('/api/simulate_batch', methods=['POST'])
+def simulate_batch_api():
+    """
+    無介面批次對戰 (simulate_batch.py)
+    參數: games (場數)、difficulty、save (是否逐場存檔)、workers、player_name、seed
+    以子行程執行 (行程池不在 eventlet 的 worker 內建立)，等待期間不阻塞其他請求
+    需要 X-Admin-Token；同一時間只執行一批 (執行中回 429)，workers 不超過 CPU 核心數
+    """
+    if not check_admin_token():
+        return jsonify({'error': ADMIN_FORBIDDEN_MSG}), 403
+    if not simulate_batch_lock.acquire(blocking=False):
+        return jsonify({'error': '已有批次對戰執行中，請稍後再試'}), 429
+    try:
+        data = request.get_json() or {}
+        games = max(1, min(int(data.get('games', 100)), SIMULATE_BATCH_MAX_GAMES))
+        difficulty = data.get('difficulty', 'normal')
+        if difficulty not in ['easy', 'normal', 'hard']:
+            difficulty = 'normal'
+
+        cmd = [sys.executable, 'simulate_batch.py', '--json', '--games', str(games), '--difficulty', difficulty,
+               '--player-name', str(data.get('player_name') or '模擬玩家')]
+        if data.get('save'):
+            cmd.append('--save')
+        if data.get('workers'):
+            cmd += ['--workers', str(max(1, min(int(data['workers']), os.cpu_count() or 1)))]
+        if data.get('seed') is not None:
+            cmd += ['--seed', str(int(data['seed']))]
+
+        print(f"[API] 批次對戰 - {games} 場, 難度: {difficulty}, 存檔: {bool(data.get('save'))}")
+        proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        try:
+            out, err = proc.communicate(timeout=SIMULATE_BATCH_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            return jsonify({'error': f'批次對戰超過 {SIMULATE_BATCH_TIMEOUT} 秒未完成'}), 504
+
+        if proc.returncode != 0:
+            return jsonify({'error': err.strip().splitlines()[-1] if err.strip() else '批次對戰失敗'}), 500
+        # 匯入時的連線日誌也在 stdout，結果固定是最後一行
+        return jsonify(json.loads(out.strip().splitlines()[-1]))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'參數錯誤: {e}'}), 400
+    except Exception as e:
+        print(f"[API] 批次對戰錯誤: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        simulate_batch_lock.release()
 
 @app.route('/api/run_game_auto', methods=['POST'])
 def run_game_auto():
@@ -191,19 +409,16 @@ def run_game_auto():
         
         print(f"[API] 開始自動戰鬥 - 玩家: {player_name}, 難度: {difficulty}")
         
-        socketio.start_background_task(
-            target=run_gui_game,
+        game_id = allocate_game_id()
+        ticket = game_scheduler.submit(
+            run_gui_game,
             mode='auto', 
             player_name=player_name, 
             difficulty=difficulty,
-            display_mode='pygame',
-            socketio=socketio
+            socketio=socketio,
+            game_id=game_id if isinstance(game_id, int) else None
         )
-        
-        return jsonify({
-            'success': True,
-            'message': 'Auto game started in background'
-        })
+        return scheduled_game_response(game_id, ticket)
 
     except Exception as e:
         print(f"[API] 自動戰鬥錯誤: {e}")
@@ -213,6 +428,7 @@ def run_game_auto():
         }), 500
 
 @app.route('/api/leaderboard')
+@cached_response('leaderboard')
 def get_leaderboard():
     """最高傷害排行榜"""
     try:
@@ -250,6 +466,7 @@ def get_leaderboard():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/leaderboard/rounds')
+@cached_response('leaderboard:rounds')
 def get_rounds_leaderboard():
     """最長回合排行榜"""
     try:
@@ -287,81 +504,60 @@ def get_rounds_leaderboard():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/leaderboard/players')
+@cached_response('leaderboard:players')
 def get_player_leaderboard():
     """玩家勝場排行榜"""
     try:
         if not redis_client:
             return jsonify([])
         
-        game_ids = redis_client.lrange('game:list', 0, -1)
-        player_stats = {}
-        
-        # [修正] 使用 Pipeline + hgetall
-        pipe = redis_client.pipeline()
-        for gid in game_ids:
-            pipe.hgetall(f'game:{gid}')
-        games_results = pipe.execute()
-        
-        for flat_data in games_results:
-            if not flat_data:
-                continue
-            
-            # [修正] 重組資料以便取得巢狀結構 (雖然這裡可以直接讀 Hash key，但統一用 reconstruct 比較安全)
-            data = reconstruct_game_data(flat_data)
-            
-            player_name = data.get('player_name', '匿名玩家')
-            winner = data.get('winner', '')
-            
-            if player_name not in player_stats:
-                player_stats[player_name] = {'wins': 0, 'total': 0, 'damage': 0}
-            
-            player_stats[player_name]['total'] += 1
-            # 注意：reconstruct 後是巢狀 dict
-            player_stats[player_name]['damage'] += data.get('person_stats', {}).get('total_damage_dealt', 0)
-            
-            if winner == '勇者':
-                player_stats[player_name]['wins'] += 1
-        
-        leaderboard = [
-            {
-                'player_name': name,
-                'wins': stats['wins'],
-                'total': stats['total'],
-                'win_rate': round(stats['wins'] / stats['total'] * 100, 1) if stats['total'] > 0 else 0,
-                'total_damage': stats['damage']
-            }
-            for name, stats in player_stats.items()
-        ]
-        leaderboard.sort(key=lambda x: (-x['wins'], -x['win_rate']))
-        
-        return jsonify(leaderboard[:10])
+        # 累計數據由 save_game_to_redis 在同一個交易中維護
+        return jsonify(get_player_leaderboard_from_redis(limit=10))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/game/<int:game_id>/replay')
 def get_game_replay(game_id):
-    """戰鬥回放"""
+    """
+    戰鬥回放
+    不帶參數時回傳完整事件列表 (舊格式)；
+    帶 cursor / limit 時以 Stream ID 分頁，回傳 {'events': [...], 'next_cursor': ...}；
+    stream=1 時以 NDJSON (每行一筆事件) 分塊串流，前端收到第一塊就能開始播放。
+    沒有 Stream 的網頁版遊戲以存檔的種子與輸入重新產生 (replay.py)。
+    """
     try:
         if not redis_client:
             return jsonify({'error': 'Redis 未連接'}), 500
-        
-        events_raw = redis_client.xrange(f'game:{game_id}:stream', min='-', max='+')
-        
+
+        limit = max(1, min(request.args.get('limit', REPLAY_PAGE_SIZE, type=int), 1000))
+        cursor = request.args.get('cursor') or None
+
+        if request.args.get('stream'):
+            def generate():
+                for events in iter_replay_pages(game_id, cursor=cursor, limit=limit):
+                    yield ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        if 'cursor' in request.args or 'limit' in request.args:
+            return jsonify(load_replay_page(game_id, cursor=cursor, limit=limit))
+
         events = []
-        for msg_id, data in events_raw:
-            events.append({
-                'id': msg_id,
-                'turn': data.get('turn'),
-                'actor': data.get('actor'),
-                'action': data.get('action'),
-                'value': data.get('value'),
-                'details': data.get('details')
-            })
-            
+        for page in iter_replay_pages(game_id, limit=1000):
+            events.extend(page)
         return jsonify(events)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/game/<int:game_id>/verify')
+def verify_game_result(game_id):
+    """以種子與輸入重播，核對存檔的勝負與統計"""
+    try:
+        if not redis_client:
+            return jsonify({'error': 'Redis 未連接'}), 500
+        return jsonify(verify_game(game_id))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ========== WebSocket 事件處理 ==========
 
 @socketio.on('connect')
@@ -373,8 +569,88 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """客戶端斷開連接事件"""
+    client_protocols.pop(request.sid, None)
     print('[WebSocket] 客戶端已斷開')
 
+@socketio.on('protocol_hello')
+def handle_protocol_hello(data):
+    """
+    協商遊戲狀態的傳輸方式 (需在 join_game 之前送出)
+    回傳 protocol_ack: {'delta': bool, 'encoding': 'json' | 'msgpack', 'keyframe_interval': int}
+    """
+    protocol = negotiate(data)
+    client_protocols[request.sid] = dict(protocol, encoders={})
+    emit('protocol_ack', protocol)
+
+@socketio.on('state_ack')
+def handle_state_ack(data):
+    """客戶端確認已套用某序號的狀態，之後的 web_update_d 以它為差異基準"""
+    protocol = client_protocols.get(request.sid)
+    if not protocol:
+        return
+    encoder = protocol['encoders'].get(data.get('id'))
+    if encoder is not None:
+        encoder.ack(data.get('s'))
+
+@socketio.on('state_resync')
+def handle_state_resync(data):
+    """客戶端缺少差異基準時，重送最後一筆狀態的關鍵影格"""
+    protocol = client_protocols.get(request.sid)
+    if not protocol or not protocol['delta']:
+        return
+    event = data.get('event')
+    if event == 'web_game_update':
+        encoder = RoomEncoders.peek(data.get('id'))
+    else:
+        event = 'web_update'
+        encoder = protocol['encoders'].get(data.get('id'))
+    message = encoder.keyframe() if encoder is not None else None
+    if message is not None:
+        emit(event + '_d', pack_message(message, protocol['encoding']))
+
+@socketio.on('replay_request')
+def handle_replay_request(data):
+    """
+    以 Socket.IO 分段推送回放：每次回傳一頁 replay_chunk，
+    前端播完目前這頁再帶 next_cursor 要下一頁，不必一次讀完整個 Stream
+    """
+    try:
+        game_id = int(data.get('game_id'))
+        limit = max(1, min(int(data.get('limit') or REPLAY_PAGE_SIZE), 1000))
+    except (AttributeError, ValueError, TypeError):
+        emit('replay_chunk', {'error': 'game_id 或 limit 格式錯誤', 'events': [], 'next_cursor': None})
+        return
+    cursor = data.get('cursor') or None
+    if cursor is not None and not isinstance(cursor, str):
+        emit('replay_chunk', {'error': 'cursor 格式錯誤', 'events': [], 'next_cursor': None, 'game_id': game_id})
+        return
+    page = load_replay_page(game_id, cursor=cursor, limit=limit)
+    emit('replay_chunk', dict(page, game_id=game_id))
+
+@socketio.on('join_game')
+def handle_join_game(data):
+    """加入某場遊戲的 room，之後只會收到該場的 web_game_update / game_over"""
+    game_id = data.get('game_id')
+    if game_id is None:
+        return
+    room = game_room(game_id)
+    join_room(room)
+    join_room(state_room(room, client_mode(client_protocols.get(request.sid))))
+    emit('joined_game', {'game_id': game_id})
+
+@socketio.on('leave_game')
+def handle_leave_game(data):
+    game_id = data.get('game_id')
+    if game_id is not None:
+        room = game_room(game_id)
+        leave_room(room)
+        leave_room(state_room(room, client_mode(client_protocols.get(request.sid))))
+
+@socketio.on('join_dashboard')
+def handle_join_dashboard():
+    """訂閱遊戲完成通知 (game_update)，只有顯示儀表板的頁面需要"""
+    join_room(DASHBOARD_ROOM)
+
 @socketio.on('request_initial_data')
 def handle_initial_data_request():
     """客戶端請求初始數據"""
@@ -403,6 +679,9 @@ def redis_subscriber():
                     notification_data = json.loads(message['data'])
                     print(f"[Redis] 收到遊戲通知: 遊戲 #{notification_data.get('game_id')}")
                     
+                    # 統計與排行榜已改變，清除儀表板 API 快取
+                    ResponseCache.invalidate()
+                    
                     # 轉換格式以符合前端期望
                     game_update = {
                         'game_id': notification_data.get('game_id'),
@@ -414,7 +693,8 @@ def redis_subscriber():
                         'person_stats': notification_data.get('person_stats', {})
                     }
                     
-                    socketio.emit('game_update', game_update)
+                    # 只推送給訂閱儀表板的客戶端
+                    socketio.emit('game_update', game_update, to=DASHBOARD_ROOM)
                     
                 except json.JSONDecodeError as e:
                     print(f"[Redis] 解析通知數據失敗: {e}")
@@ -443,15 +723,12 @@ def start_web_battle():
         player_name = data.get('player_name', '匿名玩家')
         difficulty = data.get('difficulty', 'normal')
         
-        # 產生 ID
-        if redis_client:
-            game_id = redis_client.incr('game:id:counter')
-        else:
-            game_id = int(time.time())
+        # 產生 ID (與 Pygame 遊戲共用取號與本機暫用 ID)
+        game_id = allocate_game_id()
 
         # 建立遊戲實例
         new_game = WebBattleGame(game_id, player_name, difficulty)
-        active_web_games[game_id] = new_game
+        active_web_games.create(new_game)
         
         print(f"[WebBattle] 遊戲 #{game_id} 啟動 (玩家: {player_name})")
         
@@ -466,33 +743,49 @@ def start_web_battle():
 
 # === SocketIO 事件處理 ===
 
+# 遊戲已結束、閒置逾時或被淘汰時回給前端的訊息
+SESSION_EXPIRED_MSG = '遊戲已結束或閒置逾時，請重新開始'
+
+def emit_web_update(game_id, state):
+    """
+    回傳回合結果給發出動作的客戶端
+    協商為差異協定時送 web_update_d (只含變動欄位)，錯誤訊息與舊客戶端仍送完整的 web_update
+    """
+    if state is None:
+        state = {'error': SESSION_EXPIRED_MSG}
+    protocol = client_protocols.get(request.sid)
+    if not protocol or not protocol['delta'] or 'error' in state:
+        emit('web_update', state)
+        return
+
+    encoders = protocol['encoders']
+    encoder = encoders.get(game_id)
+    if encoder is None:
+        encoder = encoders[game_id] = DeltaEncoder(game_id)
+    emit('web_update_d', pack_message(encoder.encode(state), protocol['encoding']))
+    if state.get('game_over'):
+        encoders.pop(game_id, None)
+
 @socketio.on('web_action')
+@timed_event('web_action')
 def handle_web_action(data):
     """處理手動攻擊"""
     game_id = data.get('game_id')
     action = data.get('action') # 1, 2, 3
     
-    if game_id in active_web_games:
-        game = active_web_games[game_id]
-        new_state = game.process_turn(action_id=action, is_auto=False)
-        emit('web_update', new_state)
-        
-        if new_state['game_over']:
-            del active_web_games[game_id] # 清除記憶體
+    # 遊戲結束時 Session 會自動移除
+    new_state = active_web_games.apply_turn(game_id, action_id=action, is_auto=False)
+    emit_web_update(game_id, new_state)
 
 @socketio.on('web_auto_action')
+@timed_event('web_auto_action')
 def handle_web_auto(data):
     """處理自動攻擊請求"""
     game_id = data.get('game_id')
     
-    if game_id in active_web_games:
-        game = active_web_games[game_id]
-        # 呼叫後端的自動邏輯
-        new_state = game.process_turn(is_auto=True)
-        emit('web_update', new_state)
-        
-        if new_state['game_over']:
-            del active_web_games[game_id]
+    # 呼叫後端的自動邏輯
+    new_state = active_web_games.apply_turn(game_id, is_auto=True)
+    emit_web_update(game_id, new_state)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,194 @@
+# assets.py
+import os
+from collections import OrderedDict
+import pygame
+import pygame.freetype
+from config import FONT_PATH
+
+
+class DummySound:
+    """音效載入失敗時的替代品，讓 .play() 呼叫不會報錯"""
+    def play(self): pass
+
+
+# --- 全域素材快取 (單例模式) ---
+class AssetCache:
+    """
+    行程共用的素材快取，依「路徑 + 尺寸」延遲載入。
+
+    - 圖片：載入後依是否有透明度做 convert() / convert_alpha()
+    - 字型：依 (路徑, 大小) 共用同一個 freetype.Font
+    - 音效：依檔名共用同一個 mixer.Sound
+    - 文字：預先渲染好的文字 Surface，依 (字型, 大小, 內容, 顏色) 快取，上限 TEXT_CACHE_SIZE 筆 (LRU)
+
+    pygame.quit() 之後字型與音效會失效，因此會透過 pygame.register_quit 清掉這兩類；
+    圖片與文字是一般 Surface，可以跨場遊戲繼續使用。
+    """
+    TEXT_CACHE_SIZE = 512
+
+    _images = {}
+    _fonts = {}
+    _sounds = {}
+    _texts = OrderedDict()
+    _hits = 0
+    _misses = 0
+    _evictions = 0
+    _quit_hook_registered = False
+
+    @classmethod
+    def _register_quit_hook(cls):
+        """確保 pygame.quit() 時會清掉已失效的字型與音效"""
+        if not cls._quit_hook_registered:
+            pygame.register_quit(cls._on_pygame_quit)
+            cls._quit_hook_registered = True
+
+    @classmethod
+    def _on_pygame_quit(cls):
+        cls._fonts.clear()
+        cls._sounds.clear()
+        cls._quit_hook_registered = False
+
+    @classmethod
+    def get_image(cls, path, alpha=True):
+        """取得圖片 (找不到時回傳紫色方塊代表缺圖)"""
+        key = (path, alpha)
+        entry = cls._images.get(key)
+        display_ready = pygame.display.get_init() and pygame.display.get_surface() is not None
+
+        if entry is not None:
+            surface, converted = entry
+            # 第一次載入時還沒有視窗，等視窗建立後補做 convert
+            if not converted and display_ready:
+                surface = surface.convert_alpha() if alpha else surface.convert()
+                cls._images[key] = (surface, True)
+            cls._hits += 1
+            return surface
+
+        cls._misses += 1
+        real_path = path
+        if not os.path.exists(path) and os.path.exists('static/' + path):
+            real_path = 'static/' + path
+        try:
+            surface = pygame.image.load(real_path)
+        except Exception:
+            # 真的找不到就創一個空圖片避免報錯
+            surface = pygame.Surface((100, 100))
+            surface.fill((255, 0, 255))  # 紫色方塊代表缺圖
+
+        if display_ready:
+            surface = surface.convert_alpha() if alpha else surface.convert()
+        cls._images[key] = (surface, display_ready)
+        return surface
+
+    @classmethod
+    def get_font(cls, size, path=FONT_PATH):
+        """取得字型 (字型檔不存在時改用系統 Arial)"""
+        key = (path, size)
+        font = cls._fonts.get(key)
+        if font is not None:
+            cls._hits += 1
+            return font
+
+        cls._misses += 1
+        if not pygame.freetype.get_init():
+            pygame.freetype.init()
+        try:
+            font = pygame.freetype.Font(path, size)
+        except Exception:
+            font = pygame.freetype.SysFont('Arial', size)  # 備用字型
+        cls._fonts[key] = font
+        cls._register_quit_hook()
+        return font
+
+    @classmethod
+    def get_sound(cls, filename):
+        """
+        取得音效 (依序嘗試 static/images/ 與 images/)
+        mixer 未初始化或載入失敗時回傳 DummySound，且不寫入快取，之後仍會重試
+        """
+        sound = cls._sounds.get(filename)
+        if sound is not None:
+            cls._hits += 1
+            return sound
+
+        cls._misses += 1
+        path = 'static/images/' + filename if os.path.exists('static/images/' + filename) else 'images/' + filename
+        try:
+            # 只有在 mixer 有初始化成功時才載入
+            if not pygame.mixer.get_init():
+                return DummySound()
+            sound = pygame.mixer.Sound(path)
+        except Exception as e:
+            print(f"Warning: 音效載入失敗 ({e})，將以靜音模式執行")
+            return DummySound()
+
+        cls._sounds[filename] = sound
+        cls._register_quit_hook()
+        return sound
+
+    @classmethod
+    def render_text(cls, text, size, fgcolor, bgcolor=None, path=FONT_PATH):
+        """取得預先渲染的文字 Surface"""
+        key = (path, size, text, fgcolor, bgcolor)
+        surface = cls._texts.get(key)
+        if surface is not None:
+            cls._texts.move_to_end(key)
+            cls._hits += 1
+            return surface
+
+        cls._misses += 1
+        surface = cls.get_font(size, path).render(text, fgcolor, bgcolor)[0]
+        cls._texts[key] = surface
+        if len(cls._texts) > cls.TEXT_CACHE_SIZE:
+            cls._texts.popitem(last=False)
+            cls._evictions += 1
+        return surface
+
+    @classmethod
+    def stats(cls):
+        """快取統計：命中 / 未命中次數、各類數量與目前佔用的位元組數"""
+        def surface_bytes(surface):
+            return surface.get_pitch() * surface.get_height()
+
+        image_bytes = sum(surface_bytes(surface) for surface, _ in cls._images.values())
+        text_bytes = sum(surface_bytes(surface) for surface in cls._texts.values())
+
+        sound_bytes = 0
+        mixer_init = pygame.mixer.get_init()
+        if mixer_init:
+            frequency, size, channels = mixer_init
+            for sound in cls._sounds.values():
+                sound_bytes += int(sound.get_length() * frequency) * (abs(size) // 8) * channels
+
+        total = cls._hits + cls._misses
+        return {
+            'hits': cls._hits,
+            'misses': cls._misses,
+            'hit_rate': round(cls._hits / total * 100, 2) if total > 0 else 0,
+            'evictions': cls._evictions,
+            'images': len(cls._images),
+            'fonts': len(cls._fonts),
+            'sounds': len(cls._sounds),
+            'texts': len(cls._texts),
+            'bytes': image_bytes + text_bytes + sound_bytes,
+            'bytes_by_type': {'images': image_bytes, 'texts': text_bytes, 'sounds': sound_bytes}
+        }
+
+    @classmethod
+    def clear(cls):
+        """清空所有快取 (測試或釋放記憶體時使用)"""
+        cls._images.clear()
+        cls._fonts.clear()
+        cls._sounds.clear()
+        cls._texts.clear()
+        cls._hits = 0
+        cls._misses = 0
+        cls._evictions = 0
+
+
+# 模組層級的捷徑函式
+load_image = AssetCache.get_image
+get_font = AssetCache.get_font
+load_sound = AssetCache.get_sound
+render_text = AssetCache.render_text
+asset_stats = AssetCache.stats
@@ -0,0 +1,484 @@
+# benchmarks/run_benchmarks.py
+"""
+效能基準測試 (遊戲邏輯、Redis 存取、HTTP API 與 Socket.IO)
+
+使用 fakeredis 作為本機記憶體內的 Redis 替身，不需要連線到真正的 Redis。
+每個項目回報 ops/sec 與 p50 / p99 延遲，結果可存成 JSON，
+之後用 --compare 比對兩次結果找出效能退步。
+
+用法:
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/run_benchmarks.py                       # 跑全部項目
+    python benchmarks/run_benchmarks.py --only api --quick    # 只輸出名稱含 api 的項目
+    python benchmarks/run_benchmarks.py --output results/base.json
+    python benchmarks/run_benchmarks.py --compare results/base.json results/new.json --threshold 15
+
+注意：
+- /api/run_game 與 /api/run_game_auto 會在背景啟動完整的 pygame 遊戲迴圈，不列入 API 延遲測試。
+- latency 項目替 fakeredis 加上固定往返延遲，比較 web_game_write_behind 開關前後的 Socket.IO 處理量。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # 讓相對路徑的素材 (images/...) 可以正確載入
+
+SEED_GAMES = 1000
+DIFFICULTIES = ['easy', 'normal', 'hard']
+
+
+# ========== 測試環境 ==========
+
+def install_fake_redis():
+    """
+    建立 fakeredis 並替換 database.redis_client
+    必須在匯入 app / web_game_logic 等模組之前呼叫，它們會在匯入時取得 redis_client
+    """
+    import fakeredis
+    with contextlib.redirect_stdout(io.StringIO()):
+        import database
+    client = fakeredis.FakeRedis(decode_responses=True)
+    database.redis_client = client
+    database.RedisConnection._client = client
+    return client
+
+
+def seed_games(client, count):
+    """預先寫入 count 場完整的遊戲 (含事件串流)，讓讀取類測試有資料"""
+    from web_game_logic import WebBattleGame
+    game_ids = []
+    for i in range(count):
+        game_id = client.incr('game:id:counter')
+        game = WebBattleGame(game_id, f'玩家{i % 50}', DIFFICULTIES[i % 3])
+        while not game.is_game_over:
+            game.process_turn(is_auto=True)
+        game_ids.append(game_id)
+    return game_ids
+
+
+# ========== 計時工具 ==========
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(name, samples_ns, wall_seconds):
+    samples = sorted(samples_ns)
+    ops = len(samples)
+    return {
+        'name': name,
+        'iterations': ops,
+        'ops_per_sec': round(ops / wall_seconds, 2) if wall_seconds > 0 else 0,
+        'mean_ms': round(sum(samples) / ops / 1e6, 4) if ops else 0,
+        'p50_ms': round(percentile(samples, 0.50) / 1e6, 4),
+        'p99_ms': round(percentile(samples, 0.99) / 1e6, 4),
+        'max_ms': round(samples[-1] / 1e6, 4) if samples else 0
+    }
+
+
+def bench(name, fn, iterations, setup=None, warmup=10):
+    """
+    重複執行 fn 並記錄每次延遲
+    setup: 每次執行前呼叫 (不計時)，回傳值會當作 fn 的參數
+    """
+    for _ in range(warmup):
+        fn(setup() if setup else None)
+
+    samples = []
+    wall = 0
+    for _ in range(max(1, int(iterations))):
+        arg = setup() if setup else None
+        start = time.perf_counter_ns()
+        fn(arg)
+        elapsed = time.perf_counter_ns() - start
+        samples.append(elapsed)
+        wall += elapsed
+    return summarize(name, samples, wall / 1e9)
+
+
+def bench_concurrent(name, fn, workers, iterations_per_worker):
+    """多個執行緒同時呼叫 fn(worker_index, i)，ops/sec 以整體經過時間計算"""
+    samples = []
+    lock = threading.Lock()
+
+    def worker(index):
+        local = []
+        for i in range(max(1, int(iterations_per_worker))):
+            start = time.perf_counter_ns()
+            fn(index, i)
+            local.append(time.perf_counter_ns() - start)
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(name, samples, time.perf_counter() - start)
+
+
+# ========== 測試項目 ==========
+
+class FakeRole:
+    """save_game_to_redis 需要的最小角色介面"""
+    def __init__(self, name, damage, hp):
+        self.name = name
+        self.hp = hp
+        self.total_damage_dealt = damage
+        self.total_healing = 4
+        self.critical_hits = 1
+
+    def get_stats(self):
+        return {'name': self.name, 'final_hp': max(0, self.hp), 'total_damage_dealt': self.total_damage_dealt,
+                'total_healing': self.total_healing, 'critical_hits': self.critical_hits}
+
+
+def run_game_benchmarks(client, scale):
+    from web_game_logic import WebBattleGame
+    results = []
+
+    counter = iter(range(10_000_000, 20_000_000))
+    for difficulty in DIFFICULTIES:
+        results.append(bench(
+            f'game_init[{difficulty}]',
+            lambda _: WebBattleGame(next(counter), 'bench', difficulty),
+            iterations=2000 * scale
+        ))
+
+    # process_turn：遊戲結束時會換一場新的 (建立新遊戲不計時)
+    for difficulty in DIFFICULTIES:
+        current = {'game': None}
+
+        def next_game(difficulty=difficulty):
+            game = current['game']
+            if game is None or game.is_game_over:
+                game = current['game'] = WebBattleGame(next(counter), 'bench', difficulty)
+            return game
+
+        results.append(bench(
+            f'process_turn[{difficulty}]',
+            lambda game: game.process_turn(is_auto=True),
+            iterations=3000 * scale,
+            setup=next_game
+        ))
+
+    # Redis Session：每回合都是 讀取 -> 重建 -> process_turn -> 寫回
+    from session_store import RedisGameSessionStore
+    store = RedisGameSessionStore(idle_timeout=600)
+    current = {'game_id': None}
+
+    def next_session():
+        game_id = current['game_id']
+        if game_id is None or game_id not in store:
+            game_id = current['game_id'] = next(counter)
+            store.create(WebBattleGame(game_id, 'bench', 'normal'))
+        return game_id
+
+    results.append(bench(
+        'process_turn[redis session]',
+        lambda game_id: store.apply_turn(game_id, is_auto=True),
+        iterations=3000 * scale,
+        setup=next_session
+    ))
+    store.clear()
+    return results
+
+
+def run_persistence_benchmarks(client, scale):
+    from database import save_game_to_redis, get_all_games_from_redis
+    results = []
+    dragon, person = FakeRole('龍王', 30, 0), FakeRole('勇者', 24, 6)
+
+    ids = iter(range(30_000_000, 40_000_000))
+    results.append(bench(
+        'save_game_to_redis',
+        lambda game_id: save_game_to_redis(game_id, dragon, person, '龍王', 12, 'bench'),
+        iterations=2000 * scale,
+        setup=lambda: next(ids)
+    ))
+
+    # 多個 worker 同時存不同的遊戲：量測同時結束的遊戲數增加時的存檔延遲
+    concurrent_base = 50_000_000
+    results.append(bench_concurrent(
+        'save_game_to_redis[concurrent x8]',
+        lambda worker, i: save_game_to_redis(concurrent_base + worker * 1_000_000 + i, dragon, person, '勇者', 9, f'w{worker}'),
+        workers=8,
+        iterations_per_worker=250 * scale
+    ))
+
+    # 多個 worker 同時搶存同一批 game_id：只有一個會成功，其餘回傳 duplicate
+    contended_base = 40_000_000
+    results.append(bench_concurrent(
+        'save_game_to_redis[contended x8]',
+        lambda worker, i: save_game_to_redis(contended_base + i, dragon, person, '勇者', 9, f'w{worker}'),
+        workers=8,
+        iterations_per_worker=250 * scale
+    ))
+
+    results.append(bench(
+        f'get_all_games_from_redis[{client.llen("game:list")} games]',
+        lambda _: get_all_games_from_redis(),
+        iterations=20 * scale
+    ))
+    return results
+
+
+def run_api_benchmarks(client, scale, game_ids):
+    import app as app_module
+    from cache import ResponseCache
+    http = app_module.app.test_client()
+    results = []
+    sample_id = game_ids[len(game_ids) // 2]
+
+    get_routes = [
+        '/api/stats',
+        '/api/recent_games',
+        '/api/all_games',
+        '/api/games',
+        '/api/games?cursor=<id>&fields=winner,total_rounds',
+        '/api/game/<id>',
+        '/api/game/<id>/replay',
+        '/api/game/<id>/replay?limit=50',
+        '/api/character_stats',
+        '/api/leaderboard',
+        '/api/leaderboard/rounds',
+        '/api/leaderboard/players',
+        '/api/asset_stats',
+    ]
+    cached = {'/api/stats', '/api/recent_games', '/api/character_stats',
+              '/api/leaderboard', '/api/leaderboard/rounds', '/api/leaderboard/players'}
+    heavy = {'/api/all_games'}
+    for route in get_routes:
+        iterations = (20 if route in heavy else 500) * scale
+        url = route.replace('<id>', str(sample_id))
+        results.append(bench(f'api GET {route}', lambda _, url=url: http.get(url), iterations=iterations))
+        if route in cached:
+            # 每次先清快取，量測實際讀取 Redis 的成本
+            def uncached(_, url=url):
+                ResponseCache.invalidate()
+                return http.get(url)
+            results.append(bench(f'api GET {route} [uncached]', uncached, iterations=iterations))
+
+    body = {'player_name': 'bench', 'difficulty': 'normal'}
+    results.append(bench(
+        'api POST /api/start_web_battle',
+        lambda _: http.post('/api/start_web_battle', json=body),
+        iterations=500 * scale
+    ))
+    app_module.active_web_games.clear()
+    return results
+
+
+def run_socketio_benchmarks(client, scale):
+    import app as app_module
+    http = app_module.app.test_client()
+    sio = app_module.socketio.test_client(app_module.app)
+    sio.get_received()
+    results = []
+
+    current = {'game_id': None}
+
+    def next_game():
+        game_id = current['game_id']
+        if game_id is None or game_id not in app_module.active_web_games:
+            res = http.post('/api/start_web_battle', json={'player_name': 'bench', 'difficulty': 'normal'})
+            game_id = current['game_id'] = res.get_json()['game_id']
+        return game_id
+
+    def round_trip(event):
+        def call(game_id):
+            payload = {'game_id': game_id}
+            if event == 'web_action':
+                game = app_module.active_web_games.get(game_id)
+                payload['action'] = next(k for k in (3, 2, 1) if game.person.cooldowns.get(k, 0) == 0)
+            sio.emit(event, payload)
+            received = sio.get_received()
+            assert received and received[-1]['name'] == 'web_update'
+        return call
+
+    for event in ('web_action', 'web_auto_action'):
+        results.append(bench(f'socketio {event} round trip', round_trip(event),
+                             iterations=1000 * scale, setup=next_game))
+    sio.disconnect()
+    app_module.active_web_games.clear()
+    return results
+
+
+@contextlib.contextmanager
+def redis_latency(client, seconds):
+    """
+    模擬遠端 Redis：每個指令 (Pipeline 整批算一次) 先等待 seconds 秒
+    匯入 app 後 time.sleep 已被 eventlet 換成會讓出的版本，與真正的 Redis 連線行為相同
+    """
+    execute_command, pipeline = client.execute_command, client.pipeline
+
+    def slow_execute_command(*args, **kwargs):
+        time.sleep(seconds)
+        return execute_command(*args, **kwargs)
+
+    def slow_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def slow_execute(*a, **k):
+            time.sleep(seconds)
+            return execute(*a, **k)
+        pipe.execute = slow_execute
+        return pipe
+
+    client.execute_command, client.pipeline = slow_execute_command, slow_pipeline
+    try:
+        yield
+    finally:
+        del client.execute_command, client.pipeline
+
+
+def run_latency_benchmarks(client, scale, latency=0.002, connections=16):
+    """
+    Redis 有延遲時，多個 Socket.IO 連線同時送 web_auto_action 的處理量
+    比較回合中同步寫入 (inline) 與交給 WriteBehind 背景寫入 (write-behind)
+    """
+    import app as app_module
+    from write_behind import WriteBehind
+    store = app_module.active_web_games
+    http = app_module.app.test_client()
+    clients = [app_module.socketio.test_client(app_module.app) for _ in range(connections)]
+    current = [None] * connections
+    original = store.write_behind
+    results = []
+
+    def play(index, _):
+        time.sleep(0)  # 相當於真實伺服器讀取下一個 WebSocket 訊息時的讓出
+        game_id = current[index]
+        if game_id is None or game_id not in store:
+            res = http.post('/api/start_web_battle', json={'player_name': 'bench', 'difficulty': 'normal'})
+            game_id = current[index] = res.get_json()['game_id']
+        sio = clients[index]
+        sio.emit('web_auto_action', {'game_id': game_id})
+        received = sio.get_received()
+        assert received and received[-1]['name'] == 'web_update'
+
+    for mode, write_behind in (('inline', False), ('write-behind', True)):
+        store.clear()
+        store.write_behind = write_behind
+        current[:] = [None] * connections
+        with redis_latency(client, latency):
+            results.append(bench_concurrent(
+                f'socketio auto x{connections} redis {latency * 1000:g}ms ({mode})',
+                play, workers=connections, iterations_per_worker=100 * scale))
+            WriteBehind.join()
+
+    for sio in clients:
+        sio.disconnect()
+    store.clear()
+    store.write_behind = original
+    return results
+
+
+SUITES = [
+    ('game', run_game_benchmarks),
+    ('persistence', run_persistence_benchmarks),
+    ('api', run_api_benchmarks),
+    ('socketio', run_socketio_benchmarks),
+    ('latency', run_latency_benchmarks),
+]
+
+
+def run_all(scale=1, only=None, seed_games_count=SEED_GAMES):
+    client = install_fake_redis()
+    with contextlib.redirect_stdout(io.StringIO()):
+        game_ids = seed_games(client, seed_games_count)
+
+    results = []
+    for suite_name, suite in SUITES:
+        # 遊戲與 API 內部大量 print / traceback，測試期間暫時關閉輸出
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            if suite_name == 'api':
+                suite_results = suite(client, scale, game_ids)
+            else:
+                suite_results = suite(client, scale)
+        for result in suite_results:
+            if only and only not in result['name']:
+                continue
+            results.append(result)
+            print(f"{result['name']:<48} {result['ops_per_sec']:>12.1f} ops/s"
+                  f"   p50 {result['p50_ms']:>9.4f} ms   p99 {result['p99_ms']:>9.4f} ms")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(base_path, new_path, threshold):
+    """比較兩次結果，p50 / p99 變慢或 ops/sec 下降超過 threshold% 視為退步"""
+    with open(base_path, encoding='utf-8') as f:
+        base = {r['name']: r for r in json.load(f)['results']}
+    with open(new_path, encoding='utf-8') as f:
+        new = {r['name']: r for r in json.load(f)['results']}
+
+    regressions = 0
+    for name, new_result in new.items():
+        old = base.get(name)
+        if old is None:
+            print(f"{name:<48} (新項目)")
+            continue
+        change = lambda key: (new_result[key] - old[key]) / old[key] * 100 if old[key] else 0
+        ops_change, p50_change, p99_change = change('ops_per_sec'), change('p50_ms'), change('p99_ms')
+        regressed = ops_change < -threshold or p50_change > threshold or p99_change > threshold
+        regressions += regressed
+        flag = '✗ 退步' if regressed else '✓'
+        print(f"{name:<48} ops {ops_change:+7.1f}%   p50 {p50_change:+7.1f}%   p99 {p99_change:+7.1f}%   {flag}")
+    print(f"\n共 {regressions} 項退步 (門檻 {threshold}%)")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='龍王 vs 勇者 - 效能基準測試')
+    parser.add_argument('--output', default=None, help='結果 JSON 檔 (預設 benchmarks/results/<時間>.json)')
+    parser.add_argument('--only', default=None, help='只輸出名稱包含此字串的項目')
+    parser.add_argument('--quick', action='store_true', help='減少迭代次數 (快速檢查用)')
+    parser.add_argument('--seed-games', type=int, default=SEED_GAMES, help='預先寫入的遊戲數')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='比較兩個結果檔')
+    parser.add_argument('--threshold', type=float, default=10.0, help='比較時視為退步的變化百分比')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+
+    results = run_all(scale=1 if not args.quick else 0.2, only=args.only, seed_games_count=args.seed_games)
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'seed_games': args.seed_games,
+                'quick': args.quick
+            },
+            'results': results
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n結果已寫入 {output}")
@@ -0,0 +1,115 @@
+# cache.py
+import threading
+import time
+from functools import wraps
+from flask import current_app, request
+from config import RESPONSE_CACHE_TTL
+
+
+# --- 行程內 API 回應快取 (單例模式) ---
+class ResponseCache:
+    """
+    儀表板類 API 的回應快取
+
+    - 每筆快取有 TTL，過期後下一次請求重新讀取 Redis
+    - redis_subscriber 收到遊戲結束通知時呼叫 invalidate() 全部清除
+    - 同一個 key 同時只有一個請求會去讀 Redis (single-flight)，其他請求等它完成後直接使用結果
+    - invalidate() 會遞增世代編號，清除前就開始的讀取結果不會被寫回快取，
+      並一併清掉每個 key 的鎖 (key 數量不會無限成長)
+    """
+    _entries = {}          # key -> (expires_at, value)
+    _key_locks = {}
+    _lock = threading.Lock()
+    _generation = 0
+    _hits = 0
+    _misses = 0
+    _coalesced = 0
+    _invalidations = 0
+
+    @classmethod
+    def _get_key_lock(cls, key):
+        with cls._lock:
+            lock = cls._key_locks.get(key)
+            if lock is None:
+                lock = cls._key_locks[key] = threading.Lock()
+            return lock
+
+    @classmethod
+    def _lookup(cls, key):
+        entry = cls._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry
+        return None
+
+    @classmethod
+    def get_or_compute(cls, key, compute, ttl=None, cacheable=None):
+        """
+        取得快取，未命中時呼叫 compute() 並寫入
+        cacheable: 判斷結果是否可快取的函式 (例如只快取成功的回應)
+        """
+        entry = cls._lookup(key)
+        if entry is not None:
+            cls._hits += 1
+            return entry[1]
+
+        with cls._get_key_lock(key):
+            # 等待期間其他請求可能已經填好快取
+            entry = cls._lookup(key)
+            if entry is not None:
+                cls._coalesced += 1
+                return entry[1]
+
+            cls._misses += 1
+            generation = cls._generation
+            value = compute()
+            if generation == cls._generation and (cacheable is None or cacheable(value)):
+                ttl = RESPONSE_CACHE_TTL if ttl is None else ttl
+                cls._entries[key] = (time.monotonic() + ttl, value)
+            return value
+
+    @classmethod
+    def invalidate(cls):
+        """清除所有快取 (遊戲結束時呼叫)"""
+        with cls._lock:
+            cls._generation += 1
+            cls._entries = {}
+            cls._key_locks = {}
+            cls._invalidations += 1
+
+    @classmethod
+    def stats(cls):
+        lookups = cls._hits + cls._coalesced + cls._misses
+        return {
+            'hits': cls._hits,
+            'coalesced': cls._coalesced,
+            'misses': cls._misses,
+            'hit_rate': round((cls._hits + cls._coalesced) / lookups * 100, 2) if lookups > 0 else 0,
+            'invalidations': cls._invalidations,
+            'entries': len(cls._entries),
+            'ttl': RESPONSE_CACHE_TTL
+        }
+
+
+def cached_response(key, ttl=None, params=()):
+    """
+    Flask 路由裝飾器：快取 200 的 JSON 回應
+    快取的是回應內容 (bytes)，命中時不需重新 jsonify
+    params: 會影響回應內容的查詢參數，只有這些參數納入快取 key；
+            其他查詢字串 (例如 ?_=時間戳記 的防快取參數) 一律忽略，不會造成未命中
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache_key = key
+            if params:
+                cache_key += '?' + '&'.join(f"{name}={request.args.get(name, '')}" for name in params)
+
+            def compute():
+                response = current_app.make_response(view(*args, **kwargs))
+                return response.status_code, response.mimetype, response.get_data()
+
+            status, mimetype, body = ResponseCache.get_or_compute(
+                cache_key, compute, ttl=ttl, cacheable=lambda value: value[0] == 200)
+            return current_app.response_class(body, status=status, mimetype=mimetype)
+        return wrapper
+    return decorator
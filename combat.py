@@ -0,0 +1,318 @@
+# combat.py
+import random
+from config import DIFFICULTY_SETTINGS
+from database import log_battle_event
+
+
+class Combatant():
+    """
+    純邏輯的戰鬥單位 (不依賴 pygame)
+
+    只保存血量、冷卻、暴擊與統計等狀態，網頁版 WebBattleGame 直接使用；
+    Pygame 版的 characters.Role 繼承此類別，只額外負責圖片、字型與音效。
+    """
+    def __init__(self, name):
+        self.name = name
+        self.hp = 20
+        self.initial_hp = 20
+        self.skillchose = 0
+        # status: 本次攻擊是否暴擊；status_time: 暴擊/受擊提示的剩餘影格數
+        self.status = False
+        self.status_time = 0
+
+        # 統計與 CD
+        self.total_damage_dealt = 0
+        self.total_healing = 0
+        self.skill1_used = 0
+        self.skill2_used = 0
+        self.skill3_used = 0
+        self.critical_hits = 0
+        self.cooldowns = {1: 0, 2: 0, 3: 0}
+        self.max_cooldowns = {1: 0, 2: 2, 3: 5}
+
+        # AI 難度設定
+        self.ai_difficulty = 'normal'
+        self.crit_rate_bonus = 0  # 暴擊率加成
+
+        # 亂數來源：預設為 random 模組；網頁版每回合換成由該場種子衍生的 random.Random
+        self.rng = random
+
+    def set_difficulty(self, difficulty):
+        """設定 AI 難度"""
+        self.ai_difficulty = difficulty
+
+        # 根據難度調整暴擊率
+        if difficulty == 'easy':
+            self.crit_rate_bonus = -5  # 簡單模式暴擊率降低
+        elif difficulty == 'hard':
+            self.crit_rate_bonus = 5   # 困難模式暴擊率提升
+        else:
+            self.crit_rate_bonus = 0
+
+    def decrement_cooldowns(self):
+        for skill in self.cooldowns:
+            if self.cooldowns[skill] > 0:
+                self.cooldowns[skill] -= 1
+
+    def _get_ai_choice(self, enemy):
+        """
+        根據難度決定 AI 技能選擇
+
+        簡單模式：較笨的 AI，隨機性高
+        普通模式：基本策略
+        困難模式：智能策略，會分析血量
+        """
+        difficulty = self.ai_difficulty
+        my_hp = self.hp
+        enemy_hp = enemy.hp
+
+        # === 簡單模式 ===
+        if difficulty == 'easy':
+            roll = self.rng.random()
+            # 70% 普攻, 25% 治療, 5% 大絕 (很少用大絕)
+            if roll < 0.70:
+                return 1
+            elif roll < 0.95:
+                return 2
+            else:
+                return 3
+
+        # === 困難模式：智能 AI ===
+        elif difficulty == 'hard':
+            # 策略 1: 如果自己血量危險 (< 8)，優先治療
+            if my_hp < 8 and self.cooldowns[2] == 0:
+                # 80% 機率治療
+                if self.rng.random() < 0.8:
+                    return 2
+
+            # 策略 2: 如果敵人血量很低 (< 6)，嘗試用大絕收頭
+            if enemy_hp <= 6 and self.cooldowns[3] == 0:
+                # 70% 機率放大絕
+                if self.rng.random() < 0.7:
+                    return 3
+
+            # 策略 3: 如果敵人血量中等 (6-12)，有機會放大絕
+            if 6 < enemy_hp <= 12 and self.cooldowns[3] == 0:
+                if self.rng.random() < 0.4:
+                    return 3
+
+            # 策略 4: 自己血量健康時，積極進攻
+            if my_hp > 12:
+                roll = self.rng.random()
+                # 60% 普攻, 10% 治療, 30% 大絕 (CD 允許的話)
+                if roll < 0.60:
+                    return 1
+                elif roll < 0.70 and self.cooldowns[2] == 0:
+                    return 2
+                elif self.cooldowns[3] == 0:
+                    return 3
+                else:
+                    return 1
+
+            # 預設：普通攻擊
+            roll = self.rng.random()
+            if roll < 0.5:
+                return 1
+            elif roll < 0.75 and self.cooldowns[2] == 0:
+                return 2
+            elif self.cooldowns[3] == 0:
+                return 3
+            else:
+                return 1
+
+        # === 普通模式 (預設) ===
+        else:
+            roll = self.rng.random()
+            if roll > 0.3:
+                return 1
+            elif 0.1 < roll <= 0.3 or my_hp == 1:
+                return 2
+            else:
+                return 3
+
+    def _check_critical(self, base_crit_chance=10):
+        """
+        檢查是否暴擊
+        base_crit_chance: 基礎暴擊機率 (1-100)
+        """
+        effective_crit = base_crit_chance + self.crit_rate_bonus
+        effective_crit = max(1, min(effective_crit, 50))  # 限制在 1-50%
+
+        return self.rng.randint(1, 100) <= effective_crit
+
+    def attack(self, enemy, choice=None, game_id=None, current_round=0, event_log=None):
+        """
+        執行攻擊
+        choice: 手動選擇的技能 (1/2/3)，None 則由 AI 決定
+        event_log: 該場遊戲的 BattleEventLog；未提供時依 game_id 直接寫入 Stream
+        """
+
+        if choice:
+            self.skillchose = choice
+        else:
+            # 使用智能 AI 選擇
+            self.skillchose = self._get_ai_choice(enemy)
+
+        # 設定冷卻
+        if self.max_cooldowns.get(self.skillchose, 0) > 0:
+            self.cooldowns[self.skillchose] = self.max_cooldowns[self.skillchose]
+
+        action_name = ""
+        damage_val = 0
+        detail_msg = ""
+
+        # === 技能 1: 普通攻擊 ===
+        if self.skillchose == 1:
+            self.skill1_used += 1
+            action_name = "Basic Attack"
+
+            if self._check_critical(10):  # 10% 基礎暴擊率
+                damage = 4
+                detail_msg = "Critical Hit!"
+                enemy.hp -= damage
+                self.total_damage_dealt += damage
+                self.status = True
+                self.status_time = 60
+                self.critical_hits += 1
+            else:
+                damage = 2
+                enemy.hp -= damage
+                self.total_damage_dealt += damage
+            damage_val = damage
+
+        # === 技能 2: 治療 ===
+        elif self.skillchose == 2:
+            self.skill2_used += 1
+            action_name = "Heal"
+            heal = 4
+            self.hp += heal
+            # 血量上限檢查 (不超過初始血量)
+            if self.hp > self.initial_hp:
+                heal = heal - (self.hp - self.initial_hp)
+                self.hp = self.initial_hp
+            self.total_healing += heal
+            damage_val = heal
+            detail_msg = "Recovered HP"
+
+        # === 技能 3: 大絕招 ===
+        elif self.skillchose == 3:
+            self.skill3_used += 1
+            action_name = "Ultimate"
+
+            if self._check_critical(10):  # 10% 基礎暴擊率
+                damage = 10
+                detail_msg = "Critical Ultimate!"
+                enemy.hp -= damage
+                self.total_damage_dealt += damage
+                self.status = True
+                self.status_time = 60
+                self.critical_hits += 1
+            else:
+                damage = 5
+                enemy.hp -= damage
+                self.total_damage_dealt += damage
+                enemy.status_time = 60
+            damage_val = damage
+
+        # Redis Stream Logging
+        if event_log is not None:
+            event_log.append(current_round, self.name, action_name, damage_val, detail_msg)
+        elif game_id:
+            log_battle_event(
+                game_id=game_id,
+                turn=current_round,
+                actor=self.name,
+                action=action_name,
+                value=damage_val,
+                details=detail_msg
+            )
+
+    def get_stats(self):
+        return {
+            'name': self.name,
+            'final_hp': max(0, self.hp),
+            'total_damage_dealt': self.total_damage_dealt,
+            'total_healing': self.total_healing,
+            'skill1_used': self.skill1_used,
+            'skill2_used': self.skill2_used,
+            'skill3_used': self.skill3_used,
+            'critical_hits': self.critical_hits
+        }
+
+
+# ★★★ AI 自動選擇技能函數 ★★★
+def ai_choose_skill(person, dragon):
+    """
+    AI 自動選擇最佳技能 (Pygame 自動模式的勇者策略)
+    """
+    available_skills = []
+
+    # 檢查哪些技能可用
+    if person.cooldowns.get(1, 0) == 0:
+        available_skills.append(1)  # 普攻
+    if person.cooldowns.get(2, 0) == 0:
+        available_skills.append(2)  # 治療
+    if person.cooldowns.get(3, 0) == 0:
+        available_skills.append(3)  # 大絕
+
+    if not available_skills:
+        return 1  # 如果都在 CD，預設普攻（普攻不應該有 CD）
+
+    # AI 策略
+    person_hp_ratio = person.hp / person.initial_hp if person.initial_hp > 0 else 1
+    dragon_hp_ratio = dragon.hp / dragon.initial_hp if dragon.initial_hp > 0 else 1
+
+    # 血量低於 40% 且治療可用，優先治療
+    if person_hp_ratio < 0.4 and 2 in available_skills:
+        return 2
+
+    # 龍王血量低，且大絕可用，使用大絕收頭
+    if dragon_hp_ratio < 0.3 and 3 in available_skills:
+        return 3
+
+    # 龍王血量中等，有一定機率使用大絕
+    if dragon_hp_ratio < 0.6 and 3 in available_skills and person.rng.random() < 0.3:
+        return 3
+
+    # 血量還行，隨機選擇攻擊技能
+    attack_skills = [s for s in available_skills if s != 2]
+    if attack_skills:
+        return person.rng.choice(attack_skills)
+
+    # 預設普攻
+    return 1
+
+
+def auto_player_choice(person):
+    """網頁版託管模式的勇者策略 (WebBattleGame 自動回合使用)"""
+    available = [k for k, v in person.cooldowns.items() if v == 0]
+    if not available: return 1
+    hp_ratio = person.hp / person.initial_hp
+    if hp_ratio < 0.4 and 2 in available: return 2
+    if 3 in available: return 3
+    return person.rng.choice(available)
+
+
+def apply_difficulty_hp(dragon, person, difficulty):
+    """依 DIFFICULTY_SETTINGS 調整雙方血量，並設定勇者大絕初始 CD"""
+    diff_settings = DIFFICULTY_SETTINGS.get(difficulty, DIFFICULTY_SETTINGS['normal'])
+
+    dragon.hp += diff_settings['dragon_hp_bonus']
+    dragon.initial_hp += diff_settings['dragon_hp_bonus']
+    person.hp += diff_settings['player_hp_bonus']
+    person.initial_hp += diff_settings['player_hp_bonus']
+
+    person.cooldowns[3] = 2  # 大絕初始 CD
+
+
+def create_combatant_from_config(config, difficulty='normal'):
+    """
+    從配置創建純邏輯角色 (不載入任何圖片、字型或音效)
+    difficulty: 難度設定 (easy/normal/hard)
+    """
+    if not config:
+        return None
+
+    combatant = Combatant(name=config['name'])
+    combatant.set_difficulty(difficulty)
+    return combatant
@@ -19,7 +19,75 @@ SKILL_IMG = [
 BG_IMG = 'images/bg_dragon_hit_person.png'
 KING_IMG = 'images/king.png'
 
+# === 難度設定常數 ===
+DIFFICULTY_SETTINGS = {
+    'easy': {
+        'name': '簡單',
+        'dragon_hp_bonus': -2,
+        'player_hp_bonus': 2,
+        'turn_duration': 7000,
+        'description': '龍王較弱，適合新手'
+    },
+    'normal': {
+        'name': '普通',
+        'dragon_hp_bonus': 0,
+        'player_hp_bonus': 0,
+        'turn_duration': 5000,
+        'description': '標準難度'
+    },
+    'hard': {
+        'name': '困難',
+        'dragon_hp_bonus': 3,
+        'player_hp_bonus': -2,
+        'turn_duration': 4000,
+        'description': '龍王更強更聰明'
+    }
+}
+
 # Redis 連線資訊
 REDIS_HOST = os.getenv('host')
 REDIS_PORT = os.getenv('port')
-REDIS_PASSWORD = os.getenv('password')
\ No newline at end of file
+REDIS_PASSWORD = os.getenv('password')
+# 戰鬥事件紀錄 (Redis Stream) 寫入策略
+# immediate: 每個動作立即寫入 / turn: 每回合一次 Pipeline / game_end: 遊戲結束時一次寫入
+EVENT_LOG_FLUSH_POLICY = os.getenv('event_log_flush_policy', 'turn')
+EVENT_LOG_MAX_BACKLOG = int(os.getenv('event_log_max_backlog', 200))  # 緩衝超過此數量就強制寫入
+EVENT_LOG_ASYNC = os.getenv('event_log_async', 'false').lower() == 'true'  # 交給背景寫入器
+EVENT_LOG_WRITER_QUEUE_SIZE = int(os.getenv('event_log_writer_queue_size', 1000))
+# 儀表板 API 回應快取 (秒)，遊戲結束的 Pub/Sub 通知會立即清除
+RESPONSE_CACHE_TTL = float(os.getenv('response_cache_ttl', 30))
+# 網頁版進行中遊戲的 Session 管理
+WEB_GAME_MAX_SESSIONS = int(os.getenv('web_game_max_sessions', 1000))      # 同時存在的遊戲上限 (超過時淘汰最久未操作的)
+WEB_GAME_IDLE_TIMEOUT = float(os.getenv('web_game_idle_timeout', 600))     # 閒置多少秒視為放棄
+WEB_GAME_SWEEP_INTERVAL = float(os.getenv('web_game_sweep_interval', 30))  # 清理執行緒的檢查間隔 (秒)
+WEB_GAME_ABANDON_POLICY = os.getenv('web_game_abandon_policy', 'drop')     # drop: 直接丟棄 / save: 以「中斷」存檔 (不計入統計與排行榜)
+WEB_GAME_SESSION_BACKEND = os.getenv('web_game_session_backend', 'memory')  # memory: 單一 worker / redis: 可多 worker 共用
+# 網頁版遊戲狀態的差異傳輸 (客戶端以 protocol_hello 選用)
+STATE_DELTA_ENABLED = os.getenv('state_delta_enabled', 'false').lower() == 'true'
+STATE_KEYFRAME_INTERVAL = int(os.getenv('state_keyframe_interval', 10))  # 每幾筆差異訊息送一次完整的關鍵影格
+# 戰鬥回放分頁 (每頁 / 每個串流區塊的事件數)
+REPLAY_PAGE_SIZE = int(os.getenv('replay_page_size', 100))
+# 戰鬥事件 Stream 寫入格式 (v2: 每回合一筆精簡 entry / v1: 每個動作一筆完整欄位)，讀取時兩者皆支援
+REPLAY_STREAM_FORMAT = os.getenv('replay_stream_format', 'v2')
+# 網頁版遊戲是否寫入戰鬥事件 Stream；false 時只在 game:{id} 保存種子與輸入，回放即時重新產生
+WEB_GAME_EVENT_STREAM = os.getenv('web_game_event_stream', 'true').lower() == 'true'
+REPLAY_CACHE_SIZE = int(os.getenv('replay_cache_size', 256))  # 重新產生的回放保留幾場 (LRU)
+# 批次對戰 API (/api/simulate_batch)
+SIMULATE_BATCH_MAX_GAMES = int(os.getenv('simulate_batch_max_games', 100000))  # 單次請求的場數上限
+SIMULATE_BATCH_TIMEOUT = float(os.getenv('simulate_batch_timeout', 300))      # 子行程逾時 (秒)
+# Pygame 遊戲 (/api/run_game、/api/run_game_auto) 的並行上限與排隊
+GUI_GAME_MAX_CONCURRENT = int(os.getenv('gui_game_max_concurrent', 2))  # 同時執行的場數
+GUI_GAME_MAX_QUEUE = int(os.getenv('gui_game_max_queue', 10))           # 等待佇列上限，滿了回 429
+# 網頁版回合結束後的 Redis 寫入 (戰鬥事件、結果存檔) 改由背景工作者執行，不佔用 Socket.IO 事件處理
+WEB_GAME_WRITE_BEHIND = os.getenv('web_game_write_behind', 'false').lower() == 'true'
+WRITE_BEHIND_WORKERS = int(os.getenv('write_behind_workers', 4))         # 工作者數 (同一場遊戲固定由同一個處理)
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv('write_behind_queue_size', 1000))  # 每個工作者的佇列上限，滿了改為同步寫入
+# Redis 連線池與指標 (GET /metrics)
+REDIS_MAX_CONNECTIONS = int(os.getenv('redis_max_connections', 30))       # 連線池上限
+REDIS_POOL_TIMEOUT = float(os.getenv('redis_pool_timeout', 0))            # 連線池滿了最多等待幾秒 (0: 立即失敗)
+REDIS_METRICS_ENABLED = os.getenv('redis_metrics_enabled', 'true').lower() == 'true'  # 記錄指令延遲與連線池使用量
+# 請求延遲記錄與按需 cProfile (request_timing.py)
+SLOW_REQUEST_MS = float(os.getenv('slow_request_ms', 500))          # 超過此毫秒數的請求印出慢請求日誌
+ADMIN_TOKEN = os.getenv('admin_token', '')                          # 管理 API 的 X-Admin-Token，未設定時停用
+PROFILE_OUTPUT_DIR = os.getenv('profile_output_dir', 'profiles')    # cProfile 結果 (.prof) 的存放目錄
+PROFILE_MAX_REQUESTS = int(os.getenv('profile_max_requests', 100))  # 單次量測的請求數上限
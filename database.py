@@ -1,14 +1,25 @@
 # database.py
 import redis
-from redis.connection import ConnectionPool
+from redis.backoff import NoBackoff
+from redis.connection import ConnectionPool, BlockingConnectionPool
 import json
+import re
 from datetime import datetime, timezone, timedelta
-from config import REDIS_HOST, REDIS_PORT, REDIS_PASSWORD
+from config import (REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REPLAY_STREAM_FORMAT, REDIS_MAX_CONNECTIONS,
+                    REDIS_POOL_TIMEOUT, REDIS_METRICS_ENABLED)
+from metrics import (InstrumentedRedis, InstrumentedConnectionPool, InstrumentedBlockingConnectionPool,
+                     CountingRetry)
 from redis.commands.search.field import NumericField, TagField
 from redis.commands.search.index_definition import IndexDefinition, IndexType
 
 TAIPEI_TZ = timezone(timedelta(hours=8))
 
+# 中途離開 (Session 閒置逾時 / 被淘汰) 的遊戲結果：只保存紀錄，不計入統計、角色數據與排行榜
+ABANDONED_WINNER = '中斷'
+
+# stats:characters 累計的欄位 (與 game:{id} Hash 欄位同名)
+CHARACTER_STAT_FIELDS = ('d_damage', 'd_heal', 'd_crit', 'p_damage', 'p_heal', 'p_crit')
+
 # --- Redis 連接池設定 (單例模式) ---
 class RedisConnection:
     _pool = None
@@ -19,18 +30,27 @@ class RedisConnection:
         """取得或建立連線池 (只會建立一次)"""
         if cls._pool is None:
             try:
-                cls._pool = ConnectionPool(
+                # redis_pool_timeout > 0 時連線池滿了會等待 (最多該秒數)，否則立即丟出 MaxConnectionsError
+                if REDIS_POOL_TIMEOUT > 0:
+                    pool_class = InstrumentedBlockingConnectionPool if REDIS_METRICS_ENABLED else BlockingConnectionPool
+                    pool_options = {'timeout': REDIS_POOL_TIMEOUT}
+                else:
+                    pool_class = InstrumentedConnectionPool if REDIS_METRICS_ENABLED else ConnectionPool
+                    pool_options = {}
+                cls._pool = pool_class(
                     host=REDIS_HOST,
                     port=REDIS_PORT,
                     username="default",
                     password=REDIS_PASSWORD,
                     decode_responses=True,
-                    max_connections=30,  # 限制最大連線數
+                    max_connections=REDIS_MAX_CONNECTIONS,  # 限制最大連線數
                     socket_keepalive=True,
                     socket_connect_timeout=5,
                     socket_timeout=5,
                     retry_on_timeout=True,
+                    retry=CountingRetry(NoBackoff(), 1) if REDIS_METRICS_ENABLED else None,  # 逾時重試一次
                     health_check_interval=30,  # 每30秒檢查連線健康
+                    **pool_options
                 )
                 print("✓ Redis 連線池已建立")
             except Exception as e:
@@ -45,7 +65,9 @@ class RedisConnection:
             pool = cls.get_pool()
             if pool is not None:
                 try:
-                    cls._client = redis.Redis(connection_pool=pool)
+                    # InstrumentedRedis 記錄每個指令的延遲與錯誤 (GET /metrics)
+                    client_class = InstrumentedRedis if REDIS_METRICS_ENABLED else redis.Redis
+                    cls._client = client_class(connection_pool=pool)
                     cls._client.ping()
                     print("✓ 成功連接到 Redis！啟用進階功能")
                 except Exception as e:
@@ -115,18 +137,89 @@ def reconstruct_game_data(flat_data):
         }
     }
 
-def save_game_to_redis(game_id, dragon, person, winner, total_rounds, player_name='匿名玩家'):
+def player_rank_score(wins, games):
+    """
+    玩家排行榜分數：先比勝場，再比勝率 (千分比，四捨五入)
+    勝率最多 1000，因此乘上 10000 的勝場數不會被勝率蓋過
+    只用整數運算，與 COMMIT_GAME_LUA 內的算法完全一致
     """
-    使用 Pipeline 和 Watch 確保交易完整性。
+    win_rate = (wins * 1000 + games // 2) // games if games > 0 else 0
+    return wins * 10000 + win_rate
+
+# ★★★ 遊戲存檔腳本：存在檢查 + 所有寫入 + 通知，在 Redis 端一次原子完成 ★★★
+# KEYS: 見 save_game_to_redis 的 keys 列表
+# ARGV: ttl, winner, total_rounds, player_name, is_win, person_damage, 通知頻道, 通知內容,
+#       是否計入統計 (1/0), 之後為 Hash 的 field/value
+# 回傳 1 = 已寫入，0 = game_id 已存在
+COMMIT_GAME_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+
+local fields = {}
+for i = 10, #ARGV, 2 do
+    fields[ARGV[i]] = ARGV[i + 1]
+end
+local game_id = fields['game_id']
+local person_damage = tonumber(ARGV[6])
+
+redis.call('HSET', KEYS[1], unpack(ARGV, 10, #ARGV))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[1]))
+redis.call('LPUSH', KEYS[2], game_id)
+redis.call('ZADD', KEYS[3], game_id, game_id)
+
+if ARGV[9] ~= '1' then
+    -- 中斷的遊戲只留紀錄 (歷史列表可查)，不計入統計與排行榜
+    redis.call('PUBLISH', ARGV[7], ARGV[8])
+    return 1
+end
+
+redis.call('HINCRBY', KEYS[4], ARGV[2], 1)
+redis.call('HINCRBY', KEYS[5], 'sum', tonumber(ARGV[3]))
+redis.call('INCR', KEYS[6])
+redis.call('ZADD', KEYS[7], tonumber(ARGV[3]), game_id)
+redis.call('ZADD', KEYS[8], person_damage, game_id)
+
+for _, field in ipairs({'d_damage', 'd_heal', 'd_crit', 'p_damage', 'p_heal', 'p_crit'}) do
+    redis.call('HINCRBY', KEYS[9], field, tonumber(fields[field]))
+end
+redis.call('HINCRBY', KEYS[9], 'games', 1)
+
+local wins = redis.call('HINCRBY', KEYS[10], 'wins', tonumber(ARGV[5]))
+local games = redis.call('HINCRBY', KEYS[10], 'games', 1)
+redis.call('HINCRBY', KEYS[10], 'damage', person_damage)
+local win_rate = math.floor((wins * 1000 + math.floor(games / 2)) / games)
+redis.call('ZADD', KEYS[11], wins * 10000 + win_rate, ARGV[4])
+
+redis.call('PUBLISH', ARGV[7], ARGV[8])
+return 1
+"""
+_commit_game_script = None
+
+def save_game_to_redis(game_id, dragon, person, winner, total_rounds, player_name='匿名玩家', replay_fields=None):
+    """
+    以 Lua 腳本在 Redis 端一次完成遊戲存檔 (單次網路往返)
     優化點：
-    1. 原子性：確保所有寫入要嘛全成功，要嘛全失敗。
-    2. 冪等性：使用 WATCH 檢查 game_id 是否已存在，防止重複計算統計數據。
+    1. 原子性：存在檢查、所有寫入與 PUBLISH 在同一個腳本中執行，不會有半套資料。
+    2. 冪等性：game_id 已存在時不做任何寫入，不會重複計算統計數據。
+    3. 不需要 WATCH 重試，同時結束的遊戲再多也不會因衝突而遺失。
+    winner 為 ABANDONED_WINNER (中斷) 時只寫入遊戲紀錄，不更新統計、角色數據與排行榜。
+    replay_fields: 額外寫入 Hash 的重播資訊 (seed / inputs / difficulty / rules)，見 replay.py
+
+    回傳 dict：
+        {'status': 'committed', 'game': flat_data}
+        {'status': 'duplicate', 'game_id': game_id}
+        {'status': 'error', 'error': 錯誤訊息}
     """
+    global _commit_game_script
+
     if redis_client is None:
         print("Redis 未連接，無法儲存資料")
-        return None
+        return {'status': 'error', 'error': 'Redis 未連接'}
     
     game_key = f'game:{game_id}'
+    player_key = f'player:{player_name}:stats'
+    is_win = 1 if winner == '勇者' else 0
     
     try:
         flat_data = {
@@ -144,54 +237,51 @@ def save_game_to_redis(game_id, dragon, person, winner, total_rounds, player_nam
             'p_crit': person.critical_hits,
             'p_hp': max(0, person.hp)
         }
+        if replay_fields:
+            flat_data.update(replay_fields)
         
-        with redis_client.pipeline() as pipe:
-            max_retries = 3
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    pipe.watch(game_key)
-                    
-                    if pipe.exists(game_key):
-                        pipe.unwatch()
-                        return None
-                    
-                    pipe.multi()
-                    pipe.hset(game_key, mapping=flat_data)
-                    pipe.expire(game_key, 86400 * 30)
-                    pipe.lpush('game:list', game_id)
-                    pipe.hincrby('stats:wins', winner, 1)
-                    pipe.hincrby('stats:total_rounds', 'sum', total_rounds)
-                    pipe.incr('stats:total_games')
-                    pipe.zadd('leaderboard:longest_rounds', {str(game_id): total_rounds})
-                    pipe.zadd('leaderboard:max_damage:person', {str(game_id): person.total_damage_dealt})
-                    
-                    notification = {
-                        'event': 'game_completed',
-                        'game_id': game_id,
-                        'timestamp': flat_data['timestamp'],
-                        'winner': winner,
-                        'total_rounds': total_rounds,
-                        'player_name': player_name,
-                        'dragon_stats': dragon.get_stats(),
-                        'person_stats': person.get_stats()
-                    }
-                    pipe.publish('channel:game_notifications', json.dumps(notification))
-                    pipe.execute()
-                    
-                    return flat_data
-                    
-                except redis.WatchError:
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        return None
-                    continue
+        notification = {
+            'event': 'game_completed',
+            'game_id': game_id,
+            'timestamp': flat_data['timestamp'],
+            'winner': winner,
+            'total_rounds': total_rounds,
+            'player_name': player_name,
+            'dragon_stats': dragon.get_stats(),
+            'person_stats': person.get_stats()
+        }
+        
+        keys = [
+            game_key,
+            'game:list',
+            'game:index',
+            'stats:wins',
+            'stats:total_rounds',
+            'stats:total_games',
+            'leaderboard:longest_rounds',
+            'leaderboard:max_damage:person',
+            'stats:characters',
+            player_key,
+            'leaderboard:players'
+        ]
+        args = [86400 * 30, winner, total_rounds, player_name, is_win, person.total_damage_dealt,
+                'channel:game_notifications', json.dumps(notification), 0 if winner == ABANDONED_WINNER else 1]
+        for field, value in flat_data.items():
+            args.extend((field, value))
+        
+        # 腳本只註冊一次 (EVALSHA)，Redis 端沒有快取時 redis-py 會自動改用 SCRIPT LOAD
+        if _commit_game_script is None:
+            _commit_game_script = redis_client.register_script(COMMIT_GAME_LUA)
+        committed = _commit_game_script(keys=keys, args=args, client=redis_client)
+        
+        if not committed:
+            print(f"遊戲 #{game_id} 已存在，略過重複存檔")
+            return {'status': 'duplicate', 'game_id': game_id}
+        return {'status': 'committed', 'game': flat_data}
                     
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return None
+        print(f"遊戲 #{game_id} 存檔失敗: {e}")
+        return {'status': 'error', 'error': str(e)}
 
 def load_character_from_redis(character_id):
     if not redis_client: 
@@ -234,16 +324,61 @@ def get_default_character_config(character_id):
         }
     return None
 
+def _format_character_stats(dragon, person, game_count):
+    """將雙方的累計值整理成 /api/character_stats 的回應格式"""
+    if game_count == 0:
+        return {
+            'dragon': {'total_damage': 0, 'avg_damage': 0, 'total_healing': 0, 'avg_healing': 0, 'total_crits': 0},
+            'person': {'total_damage': 0, 'avg_damage': 0, 'total_healing': 0, 'avg_healing': 0, 'total_crits': 0},
+            'analyzed_games': 0
+        }
+
+    def side(stats):
+        return {
+            'total_damage': int(stats.get('total_damage', 0)),
+            'total_healing': int(stats.get('total_healing', 0)),
+            'total_crits': int(stats.get('total_crits', 0)),
+            'avg_damage': round(stats.get('total_damage', 0) / game_count, 1),
+            'avg_healing': round(stats.get('total_healing', 0) / game_count, 1)
+        }
+
+    return {'dragon': side(dragon), 'person': side(person), 'analyzed_games': game_count}
+
 def get_aggregated_character_stats():
     """
-    使用 FT.AGGREGATE 進行聚合查詢
+    讀取雙方角色的累計傷害 / 治療 / 暴擊
+    stats:characters 由 save_game_to_redis 在同一個交易中累加，這裡只需一次 HGETALL
+    """
+    if redis_client is None:
+        return None
+
+    try:
+        totals = {k: int(v) for k, v in redis_client.hgetall('stats:characters').items()}
+
+        def side(prefix):
+            return {
+                'total_damage': totals.get(f'{prefix}_damage', 0),
+                'total_healing': totals.get(f'{prefix}_heal', 0),
+                'total_crits': totals.get(f'{prefix}_crit', 0)
+            }
+
+        return _format_character_stats(side('d'), side('p'), totals.get('games', 0))
+
+    except Exception as e:
+        print(f"讀取角色統計失敗: {e}")
+        return None
+
+def get_search_character_stats():
+    """
+    使用 FT.AGGREGATE 對 idx:games 進行聚合查詢 (需要 RediSearch)
+    只作為 maintenance.py verify-character-stats 的比對來源，API 不再使用
     """
     if redis_client is None: 
         return None
 
     try:
         dragon_result = redis_client.execute_command(
-            'FT.AGGREGATE', 'idx:games', '*',
+            'FT.AGGREGATE', 'idx:games', f'-@winner:{{{ABANDONED_WINNER}}}',
             'GROUPBY', '0',
             'REDUCE', 'SUM', '1', '@d_dmg', 'AS', 'total_damage',
             'REDUCE', 'SUM', '1', '@d_heal', 'AS', 'total_healing',
@@ -252,7 +387,7 @@ def get_aggregated_character_stats():
         )
         
         person_result = redis_client.execute_command(
-            'FT.AGGREGATE', 'idx:games', '*',
+            'FT.AGGREGATE', 'idx:games', f'-@winner:{{{ABANDONED_WINNER}}}',
             'GROUPBY', '0',
             'REDUCE', 'SUM', '1', '@p_dmg', 'AS', 'total_damage',
             'REDUCE', 'SUM', '1', '@p_heal', 'AS', 'total_healing',
@@ -278,32 +413,9 @@ def get_aggregated_character_stats():
         
         dragon_stats = parse_aggregate_result(dragon_result)
         person_stats = parse_aggregate_result(person_result)
-        game_count = dragon_stats.get('game_count', 0)
+        game_count = int(dragon_stats.get('game_count', 0))
         
-        if game_count == 0:
-            return {
-                'dragon': {'total_damage': 0, 'avg_damage': 0, 'total_healing': 0, 'avg_healing': 0, 'total_crits': 0},
-                'person': {'total_damage': 0, 'avg_damage': 0, 'total_healing': 0, 'avg_healing': 0, 'total_crits': 0},
-                'analyzed_games': 0
-            }
-        
-        return {
-            'dragon': {
-                'total_damage': int(dragon_stats.get('total_damage', 0)),
-                'total_healing': int(dragon_stats.get('total_healing', 0)),
-                'total_crits': int(dragon_stats.get('total_crits', 0)),
-                'avg_damage': round(dragon_stats.get('total_damage', 0) / game_count, 1),
-                'avg_healing': round(dragon_stats.get('total_healing', 0) / game_count, 1)
-            },
-            'person': {
-                'total_damage': int(person_stats.get('total_damage', 0)),
-                'total_healing': int(person_stats.get('total_healing', 0)),
-                'total_crits': int(person_stats.get('total_crits', 0)),
-                'avg_damage': round(person_stats.get('total_damage', 0) / game_count, 1),
-                'avg_healing': round(person_stats.get('total_healing', 0) / game_count, 1)
-            },
-            'analyzed_games': game_count
-        }
+        return _format_character_stats(dragon_stats, person_stats, game_count)
 
     except Exception as e:
         print(f"聚合查詢失敗: {e}")
@@ -345,6 +457,284 @@ def get_all_games_from_redis():
         traceback.print_exc()
         return []
 
+# 遊戲 Hash 中可供查詢的欄位
+GAME_FIELDS = ('game_id', 'timestamp', 'total_rounds', 'winner', 'player_name',
+               'd_damage', 'd_heal', 'd_crit', 'd_hp', 'p_damage', 'p_heal', 'p_crit', 'p_hp')
+GAME_TEXT_FIELDS = ('timestamp', 'winner', 'player_name')
+
+def get_games_page(cursor=None, limit=20, fields=None):
+    """
+    以游標分頁讀取遊戲記錄 (新到舊)
+
+    使用 Sorted Set game:index (score = game_id)，每頁只讀 limit 筆，
+    耗時與總場次無關。
+    cursor: 上一頁回傳的 next_cursor，None 表示第一頁
+    fields: 只回傳指定的 Hash 欄位 (攤平格式)；None 則回傳 reconstruct_game_data 的完整格式
+    回傳 {'games': [...], 'next_cursor': int 或 None}
+    """
+    if not redis_client:
+        return {'games': [], 'next_cursor': None}
+
+    try:
+        # 多取一筆用來判斷是否還有下一頁
+        max_score = f'({int(cursor)}' if cursor is not None else '+inf'
+        game_ids = redis_client.zrevrangebyscore('game:index', max_score, '-inf', start=0, num=limit + 1)
+        has_more = len(game_ids) > limit
+        game_ids = game_ids[:limit]
+
+        if fields:
+            fields = [f for f in fields if f in GAME_FIELDS]
+            if 'game_id' not in fields:
+                fields.insert(0, 'game_id')
+
+        pipe = redis_client.pipeline()
+        for game_id in game_ids:
+            if fields:
+                pipe.hmget(f'game:{game_id}', fields)
+            else:
+                pipe.hgetall(f'game:{game_id}')
+        results = pipe.execute()
+
+        games = []
+        expired = []
+        for game_id, result in zip(game_ids, results):
+            if fields:
+                if result[0] is None:
+                    expired.append(game_id)
+                    continue
+                games.append({
+                    field: (value if field in GAME_TEXT_FIELDS or value is None else int(value))
+                    for field, value in zip(fields, result)
+                })
+            else:
+                if not result:
+                    expired.append(game_id)
+                    continue
+                games.append(reconstruct_game_data(result))
+
+        # 遊戲 Hash 已過期 (30 天) 的索引順手清掉
+        if expired:
+            redis_client.zrem('game:index', *expired)
+
+        next_cursor = int(game_ids[-1]) if has_more and game_ids else None
+        return {'games': games, 'next_cursor': next_cursor}
+
+    except Exception as e:
+        print(f"分頁讀取遊戲列表失敗: {e}")
+        return {'games': [], 'next_cursor': None}
+
+def backfill_game_index(batch_size=500):
+    """
+    將 game:list 中仍存在的遊戲補進 game:index (舊資料遷移用)
+    回傳新加入索引的筆數
+    """
+    if not redis_client:
+        return 0
+
+    added = 0
+    start = 0
+    while True:
+        game_ids = redis_client.lrange('game:list', start, start + batch_size - 1)
+        if not game_ids:
+            break
+
+        pipe = redis_client.pipeline(transaction=False)
+        for game_id in game_ids:
+            pipe.exists(f'game:{game_id}')
+        exists = pipe.execute()
+
+        mapping = {str(game_id): int(game_id) for game_id, ok in zip(game_ids, exists) if ok}
+        if mapping:
+            added += redis_client.zadd('game:index', mapping)
+        start += batch_size
+
+    print(f"game:index 補建完成，新增 {added} 筆")
+    return added
+
+def get_player_leaderboard(limit=10):
+    """
+    玩家勝場排行榜 (由 save_game_to_redis 增量維護)
+    ZREVRANGE 取前 limit 名，再以一個 Pipeline 讀取各玩家的累計數據
+    """
+    if not redis_client:
+        return []
+
+    players = redis_client.zrevrange('leaderboard:players', 0, limit - 1)
+    if not players:
+        return []
+
+    pipe = redis_client.pipeline()
+    for player_name in players:
+        pipe.hmget(f'player:{player_name}:stats', 'wins', 'games', 'damage')
+    results = pipe.execute()
+
+    leaderboard = []
+    for player_name, (wins, games, damage) in zip(players, results):
+        wins, games = int(wins or 0), int(games or 0)
+        leaderboard.append({
+            'player_name': player_name,
+            'wins': wins,
+            'total': games,
+            'win_rate': round(wins / games * 100, 1) if games > 0 else 0,
+            'total_damage': int(damage or 0)
+        })
+    return leaderboard
+
+def _iter_game_hashes(fields, batch_size=500):
+    """
+    以 SCAN 分批讀取所有 game:{id} Hash 的指定欄位 (補建工具共用)
+    每批一個 Pipeline，逐筆產生 HMGET 的結果列表；已不存在的遊戲會略過
+    """
+    def fetch(keys):
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(key, fields)
+        return [values for values in pipe.execute() if values[0] is not None]
+
+    batch = []
+    for key in redis_client.scan_iter(match='game:*', count=batch_size, _type='hash'):
+        # 只處理 game:{數字}，略過 game:{id}:stream 等其他 key
+        if not key[5:].isdigit():
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield from fetch(batch)
+            batch = []
+    if batch:
+        yield from fetch(batch)
+
+def backfill_player_stats(batch_size=500):
+    """
+    從既有的 game:{id} Hash 重建玩家累計數據與 leaderboard:players (舊資料遷移用)
+
+    以 SCAN 分批讀取，最後以 HSET 覆寫累計值，
+    因此重複執行結果相同。執行期間若有新遊戲存檔，請在結束後再執行一次。
+    回傳處理的遊戲數
+    """
+    if not redis_client:
+        return 0
+
+    player_stats = {}
+    scanned = 0
+    for player_name, winner, damage in _iter_game_hashes(['player_name', 'winner', 'p_damage'], batch_size):
+        if winner == ABANDONED_WINNER:
+            continue
+        stats = player_stats.setdefault(player_name, {'wins': 0, 'games': 0, 'damage': 0})
+        stats['games'] += 1
+        stats['damage'] += int(damage or 0)
+        if winner == '勇者':
+            stats['wins'] += 1
+        scanned += 1
+
+    names = list(player_stats.items())
+    for i in range(0, len(names), batch_size):
+        pipe = redis_client.pipeline(transaction=False)
+        for player_name, stats in names[i:i + batch_size]:
+            pipe.hset(f'player:{player_name}:stats', mapping=stats)
+            pipe.zadd('leaderboard:players', {player_name: player_rank_score(stats['wins'], stats['games'])})
+        pipe.execute()
+
+    print(f"玩家排行榜補建完成，共 {scanned} 場遊戲、{len(player_stats)} 位玩家")
+    return scanned
+
+def backfill_character_stats(batch_size=500):
+    """
+    從既有的 game:{id} Hash 重建 stats:characters (舊資料遷移用)
+    以 HSET 覆寫，重複執行結果相同。回傳處理的遊戲數
+    """
+    if not redis_client:
+        return 0
+
+    totals = dict.fromkeys(CHARACTER_STAT_FIELDS, 0)
+    totals['games'] = 0
+    for values in _iter_game_hashes(list(CHARACTER_STAT_FIELDS) + ['winner'], batch_size):
+        if values[-1] == ABANDONED_WINNER:
+            continue
+        for field, value in zip(CHARACTER_STAT_FIELDS, values):
+            totals[field] += int(value or 0)
+        totals['games'] += 1
+
+    redis_client.hset('stats:characters', mapping=totals)
+    print(f"角色統計補建完成，共 {totals['games']} 場遊戲")
+    return totals['games']
+
+# === 戰鬥事件 Stream 格式 ===
+# v1: 每個動作一筆 entry，欄位 turn / actor / action / value / details / timestamp (全部字串)
+# v2: 每回合一筆 entry，欄位 t (回合) 與 e (以空白分隔的事件代碼)，不另存時間 (entry ID 即為寫入毫秒數)
+#     事件代碼 = 角色代碼 + 技能代碼 + (暴擊時 c) + 數值，例如 p1c4 = 勇者普攻暴擊 4 點
+#     details 可由技能與暴擊推回；無法以代碼表示的事件仍寫成 v1
+STREAM_ACTOR_CODES = {'龍王': 'd', '勇者': 'p'}
+STREAM_ACTION_CODES = {'Basic Attack': '1', 'Heal': '2', 'Ultimate': '3'}
+STREAM_ACTORS = {code: name for name, code in STREAM_ACTOR_CODES.items()}
+STREAM_ACTIONS = {code: name for name, code in STREAM_ACTION_CODES.items()}
+STREAM_EVENT_PATTERN = re.compile(r'^([a-z])(\d)(c?)(-?\d+)$')
+STREAM_MAXLEN = 1000  # 每場 Stream 保留的 entry 數上限
+
+def _event_details(action_code, crit):
+    """依技能與是否暴擊推回 v1 的 details 文字"""
+    if action_code == '2':
+        return 'Recovered HP'
+    if crit:
+        return 'Critical Ultimate!' if action_code == '3' else 'Critical Hit!'
+    return ''
+
+def encode_stream_event(actor, action, value, details):
+    """把一個動作編成 v2 事件代碼，無法表示時回傳 None"""
+    actor_code = STREAM_ACTOR_CODES.get(str(actor))
+    action_code = STREAM_ACTION_CODES.get(str(action))
+    if actor_code is None or action_code is None:
+        return None
+    crit = str(details).startswith('Critical')
+    if _event_details(action_code, crit) != str(details):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return f"{actor_code}{action_code}{'c' if crit else ''}{value}"
+
+def _encode_turn_entries(events):
+    """
+    把同一批事件依回合分組成要寫入 Stream 的 entry 列表
+    可編碼的回合寫成一筆 v2，否則該回合每個事件各寫一筆 v1
+    """
+    entries = []
+    groups = []
+    for event in events:
+        if groups and groups[-1][0] == event['turn']:
+            groups[-1][1].append(event)
+        else:
+            groups.append((event['turn'], [event]))
+
+    for turn, group in groups:
+        codes = [encode_stream_event(e['actor'], e['action'], e['value'], e['details']) for e in group]
+        if REPLAY_STREAM_FORMAT == 'v2' and None not in codes:
+            entries.append({'t': turn, 'e': ' '.join(codes)})
+        else:
+            entries.extend(group)
+    return entries
+
+def decode_stream_entry(msg_id, data):
+    """把一筆 Stream entry (v1 或 v2) 還原成回放 API 的事件列表"""
+    if 'e' not in data:
+        return [_format_replay_event(msg_id, data)]
+
+    events = []
+    for code in data['e'].split():
+        match = STREAM_EVENT_PATTERN.match(code)
+        if not match:
+            continue
+        actor_code, action_code, crit, value = match.groups()
+        events.append({
+            'id': msg_id,
+            'turn': data.get('t'),
+            'actor': STREAM_ACTORS.get(actor_code, actor_code),
+            'action': STREAM_ACTIONS.get(action_code, action_code),
+            'value': value,
+            'details': _event_details(action_code, bool(crit))
+        })
+    return events
+
 def log_battle_event(game_id, turn, actor, action, value, details):
     """
     將戰鬥事件寫入 Redis Stream
@@ -364,11 +754,67 @@ def log_battle_event(game_id, turn, actor, action, value, details):
         
         # 寫入 Stream，key 為 game:{id}:stream
         stream_key = f'game:{game_id}:stream'
-        redis_client.xadd(stream_key, event_data, maxlen=1000)  # 限制 stream 長度
+        for entry in _encode_turn_entries([event_data]):
+            redis_client.xadd(stream_key, entry, maxlen=STREAM_MAXLEN)  # 限制 stream 長度
         
     except Exception as e:
         print(f"Stream 寫入錯誤: {e}")
 
+def log_battle_events(game_id, events):
+    """
+    以單一 Pipeline 批次寫入多筆戰鬥事件 (一次網路往返)
+    events: log_battle_event 相同欄位的 dict 列表，v2 格式時同一回合合併成一筆 entry
+    """
+    if redis_client is None or not events:
+        return
+
+    try:
+        stream_key = f'game:{game_id}:stream'
+        pipe = redis_client.pipeline(transaction=False)
+        for entry in _encode_turn_entries(events):
+            pipe.xadd(stream_key, entry, maxlen=STREAM_MAXLEN)  # 限制 stream 長度
+        pipe.execute()
+
+    except Exception as e:
+        print(f"Stream 批次寫入錯誤: {e}")
+
+def _format_replay_event(msg_id, data):
+    return {
+        'id': msg_id,
+        'turn': data.get('turn'),
+        'actor': data.get('actor'),
+        'action': data.get('action'),
+        'value': data.get('value'),
+        'details': data.get('details')
+    }
+
+def get_replay_page(game_id, cursor=None, limit=100):
+    """
+    以 Stream ID 為游標分頁讀取戰鬥回放 (舊到新)
+
+    每頁只 XRANGE limit 筆 entry (v2 格式一筆為一整個回合)，回放可以在第一頁到達後就開始播放。
+    cursor: 上一頁回傳的 next_cursor (Stream ID，不含該筆)，None 表示從頭開始
+    回傳 {'events': [...], 'next_cursor': Stream ID 或 None}
+    """
+    if not redis_client:
+        return {'events': [], 'next_cursor': None}
+
+    try:
+        # 多取一筆用來判斷是否還有下一頁
+        start = f'({cursor}' if cursor else '-'
+        events_raw = redis_client.xrange(f'game:{game_id}:stream', min=start, max='+', count=limit + 1)
+        has_more = len(events_raw) > limit
+        events_raw = events_raw[:limit]
+        events = []
+        for msg_id, data in events_raw:
+            events.extend(decode_stream_entry(msg_id, data))
+        next_cursor = events_raw[-1][0] if has_more else None
+        return {'events': events, 'next_cursor': next_cursor}
+
+    except Exception as e:
+        print(f"分頁讀取戰鬥回放失敗: {e}")
+        return {'events': [], 'next_cursor': None}
+
 # 程式結束時的清理函數
 def cleanup():
     """在程式結束時呼叫此函數"""
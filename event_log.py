@@ -0,0 +1,142 @@
+# event_log.py
+import queue
+import threading
+from datetime import datetime
+from config import (EVENT_LOG_FLUSH_POLICY, EVENT_LOG_MAX_BACKLOG, EVENT_LOG_ASYNC,
+                    EVENT_LOG_WRITER_QUEUE_SIZE)
+from database import TAIPEI_TZ, log_battle_events
+
+FLUSH_POLICIES = ('immediate', 'turn', 'game_end', 'off')
+
+
+# --- 背景寫入器 (單例模式) ---
+class BattleEventWriter:
+    """
+    背景寫入 Redis Stream 的工作執行緒
+
+    回合處理只把整批事件丟進佇列就返回，不等待 Redis，
+    因此 process_turn 的延遲不受 Redis 距離影響。
+    佇列有上限，滿了就丟棄該批事件並計數，避免記憶體無限成長。
+    """
+    _queue = None
+    _thread = None
+    _lock = threading.Lock()
+    _written = 0
+    _dropped = 0
+    _batches = 0
+
+    @classmethod
+    def _ensure_started(cls):
+        if cls._thread is not None:
+            return
+        with cls._lock:
+            if cls._thread is None:
+                cls._queue = queue.Queue(maxsize=EVENT_LOG_WRITER_QUEUE_SIZE)
+                cls._thread = threading.Thread(target=cls._run, daemon=True)
+                cls._thread.start()
+                print("[EventLog] 背景寫入器已啟動")
+
+    @classmethod
+    def submit(cls, game_id, events):
+        """提交一批事件，佇列已滿時回傳 False"""
+        cls._ensure_started()
+        try:
+            cls._queue.put_nowait((game_id, events))
+            return True
+        except queue.Full:
+            cls._dropped += len(events)
+            print(f"[EventLog] 寫入佇列已滿，丟棄遊戲 #{game_id} 的 {len(events)} 筆事件")
+            return False
+
+    @classmethod
+    def _run(cls):
+        while True:
+            game_id, events = cls._queue.get()
+            try:
+                log_battle_events(game_id, events)
+                cls._written += len(events)
+                cls._batches += 1
+            except Exception as e:
+                print(f"[EventLog] 背景寫入失敗: {e}")
+            finally:
+                cls._queue.task_done()
+
+    @classmethod
+    def join(cls):
+        """等待佇列中的事件全部寫完 (測試或程式結束前使用)"""
+        if cls._queue is not None:
+            cls._queue.join()
+
+    @classmethod
+    def stats(cls):
+        return {
+            'running': cls._thread is not None,
+            'queued_batches': cls._queue.qsize() if cls._queue is not None else 0,
+            'written_events': cls._written,
+            'written_batches': cls._batches,
+            'dropped_events': cls._dropped
+        }
+
+
+class BattleEventLog:
+    """
+    每場遊戲一個的戰鬥事件緩衝區
+
+    flush_policy:
+        immediate - 每個動作立即寫入 (與舊版 log_battle_event 相同)
+        turn      - 每回合結束時以一個 Pipeline 寫入
+        game_end  - 遊戲結束時一次寫入
+        off       - 不寫入 (回放由種子與輸入重新產生，見 replay.py)
+    緩衝超過 max_backlog 筆時不論策略都會立即寫入。
+    async_mode 為 True 時交給 BattleEventWriter 背景寫入。
+    """
+    def __init__(self, game_id, flush_policy=None, max_backlog=None, async_mode=None):
+        self.game_id = game_id
+        self.flush_policy = flush_policy or EVENT_LOG_FLUSH_POLICY
+        if self.flush_policy not in FLUSH_POLICIES:
+            self.flush_policy = 'turn'
+        self.max_backlog = max_backlog or EVENT_LOG_MAX_BACKLOG
+        self.async_mode = EVENT_LOG_ASYNC if async_mode is None else async_mode
+        self._events = []
+
+    def append(self, turn, actor, action, value, details):
+        """加入一筆事件 (欄位與 log_battle_event 相同)"""
+        if self.flush_policy == 'off':
+            return
+        self._events.append({
+            'turn': str(turn),
+            'actor': str(actor),
+            'action': str(action),
+            'value': str(value),
+            'details': str(details),
+            'timestamp': datetime.now(TAIPEI_TZ).isoformat()
+        })
+
+        if self.flush_policy == 'immediate' or len(self._events) >= self.max_backlog:
+            self.flush()
+
+    def end_turn(self):
+        """回合結束時呼叫"""
+        if self.flush_policy == 'turn':
+            self.flush()
+
+    def close(self):
+        """遊戲結束時呼叫，寫入所有剩餘事件"""
+        self.flush()
+
+    def flush(self):
+        if not self._events:
+            return
+        events, self._events = self._events, []
+        if self.async_mode:
+            BattleEventWriter.submit(self.game_id, events)
+        else:
+            log_battle_events(self.game_id, events)
+
+    def drain(self):
+        """取出並清空緩衝的事件 (由呼叫端自行寫入，見 write_behind.py)"""
+        events, self._events = self._events, []
+        return events
+
+    def __len__(self):
+        return len(self._events)
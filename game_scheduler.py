@@ -0,0 +1,127 @@
+# game_scheduler.py
+import threading
+import time
+from collections import deque
+from config import GUI_GAME_MAX_CONCURRENT, GUI_GAME_MAX_QUEUE
+
+WAIT_SAMPLE_SIZE = 200  # 每個難度保留最近幾筆等待時間計算百分位數
+
+
+class _Job:
+    __slots__ = ('game_id', 'difficulty', 'target', 'kwargs', 'enqueued_at')
+
+    def __init__(self, target, kwargs):
+        self.game_id = kwargs.get('game_id')
+        self.difficulty = kwargs.get('difficulty', 'normal')
+        self.target = target
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+
+
+class GameScheduler:
+    """
+    Pygame 遊戲 (run_gui_game) 的並行上限與排隊控制
+
+    每場 Pygame 遊戲都會 pygame.init()、開視窗並跑 60 FPS 迴圈，
+    同時執行的數量超過 max_concurrent 時進入 FIFO 佇列，佇列也滿了就拒絕
+    (API 回 429 + Retry-After)，讓一波連點不會拖垮其他 API。
+
+    spawn: 啟動背景工作的函式，例如 socketio.start_background_task
+    """
+    def __init__(self, spawn, max_concurrent=None, max_queue=None):
+        self.spawn = spawn
+        self.max_concurrent = max(1, max_concurrent or GUI_GAME_MAX_CONCURRENT)
+        self.max_queue = max(0, GUI_GAME_MAX_QUEUE if max_queue is None else max_queue)
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._running = set()  # 執行中的 _Job
+        self._avg_run_seconds = None
+        self._waits = {}    # 難度 -> 最近的等待秒數
+        self._admitted = 0
+        self._queued_total = 0
+        self._rejected = 0
+        self._completed = 0
+
+    def submit(self, target, **kwargs):
+        """
+        提交一場遊戲 target(**kwargs)，依 kwargs 的 difficulty 分類統計
+        回傳 {'status': 'running'} / {'status': 'queued', 'position': n} /
+             {'status': 'rejected', 'retry_after': 秒數}
+        """
+        job = _Job(target, kwargs)
+        with self._lock:
+            if len(self._running) < self.max_concurrent and not self._queue:
+                self._start(job)
+                result = {'status': 'running'}
+            elif len(self._queue) < self.max_queue:
+                self._queue.append(job)
+                self._queued_total += 1
+                return {'status': 'queued', 'position': len(self._queue)}
+            else:
+                self._rejected += 1
+                return {'status': 'rejected', 'retry_after': self._retry_after()}
+        # 在鎖外啟動：綠色執行緒的 spawn 會讓出，不可持有鎖
+        self.spawn(self._run, job)
+        return result
+
+    def _start(self, job):
+        """把 job 記為執行中 (呼叫時必須持有 _lock)；spawn 由呼叫端在釋放鎖之後進行"""
+        self._running.add(job)
+        self._admitted += 1
+        waits = self._waits.setdefault(job.difficulty, deque(maxlen=WAIT_SAMPLE_SIZE))
+        waits.append(time.monotonic() - job.enqueued_at)
+
+    def _run(self, job):
+        started = time.monotonic()
+        try:
+            job.target(**job.kwargs)
+        except Exception as e:
+            print(f"[Scheduler] 遊戲 #{job.game_id} 執行錯誤: {e}")
+        finally:
+            elapsed = time.monotonic() - started
+            next_jobs = []
+            with self._lock:
+                self._running.discard(job)
+                self._completed += 1
+                # 指數移動平均，用來估計 Retry-After
+                if self._avg_run_seconds is None:
+                    self._avg_run_seconds = elapsed
+                else:
+                    self._avg_run_seconds = self._avg_run_seconds * 0.8 + elapsed * 0.2
+                while self._queue and len(self._running) < self.max_concurrent:
+                    next_job = self._queue.popleft()
+                    self._start(next_job)
+                    next_jobs.append(next_job)
+            for next_job in next_jobs:
+                self.spawn(self._run, next_job)
+
+    def _retry_after(self):
+        """依平均遊戲時間估計多久後會有空位 (秒，至少 1)"""
+        avg = self._avg_run_seconds or 30
+        return max(1, int(avg * (len(self._queue) + 1) / self.max_concurrent))
+
+    def stats(self):
+        with self._lock:
+            difficulties = set(self._waits) | {job.difficulty for job in self._queue} | {job.difficulty for job in self._running}
+            by_difficulty = {}
+            for difficulty in sorted(difficulties):
+                waits = sorted(self._waits.get(difficulty, ()))
+                by_difficulty[difficulty] = {
+                    'running': sum(1 for job in self._running if job.difficulty == difficulty),
+                    'queued': sum(1 for job in self._queue if job.difficulty == difficulty),
+                    'wait_avg_ms': round(sum(waits) / len(waits) * 1000, 1) if waits else 0,
+                    'wait_p99_ms': round(waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000, 1) if waits else 0
+                }
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'admitted': self._admitted,
+                'queued_total': self._queued_total,
+                'rejected': self._rejected,
+                'completed': self._completed,
+                'avg_run_seconds': round(self._avg_run_seconds, 2) if self._avg_run_seconds is not None else None,
+                'retry_after': self._retry_after(),
+                'by_difficulty': by_difficulty
+            }
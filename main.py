@@ -4,105 +4,36 @@ import sys
 import ctypes
 import os
 import time
-import random
-import pygame.freetype
 from datetime import datetime
-from config import SX, SY, FPS, BG_IMG, KING_IMG, FONT_PATH
+from config import SX, SY, FPS, BG_IMG, KING_IMG, DIFFICULTY_SETTINGS
 from database import redis_client, save_game_to_redis, load_character_from_redis, get_default_character_config
 from characters import create_role_from_config
+from combat import ai_choose_skill, apply_difficulty_hp
+from assets import load_image, load_sound, render_text
+from event_log import BattleEventLog
+from web_runner import emit_to_game
 
-# === 難度設定常數 ===
-DIFFICULTY_SETTINGS = {
-    'easy': {
-        'name': '簡單',
-        'dragon_hp_bonus': -2,
-        'player_hp_bonus': 2,
-        'turn_duration': 7000,
-        'description': '龍王較弱，適合新手'
-    },
-    'normal': {
-        'name': '普通',
-        'dragon_hp_bonus': 0,
-        'player_hp_bonus': 0,
-        'turn_duration': 5000,
-        'description': '標準難度'
-    },
-    'hard': {
-        'name': '困難',
-        'dragon_hp_bonus': 3,
-        'player_hp_bonus': -2,
-        'turn_duration': 4000,
-        'description': '龍王更強更聰明'
-    }
-}
 
-
-# ★★★ AI 自動選擇技能函數 ★★★
-def ai_choose_skill(person, dragon):
-    """
-    AI 自動選擇最佳技能
+def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal', socketio=None, game_id=None):
     """
-    available_skills = []
-    
-    # 檢查哪些技能可用
-    if person.cooldowns.get(1, 0) == 0:
-        available_skills.append(1)  # 普攻
-    if person.cooldowns.get(2, 0) == 0:
-        available_skills.append(2)  # 治療
-    if person.cooldowns.get(3, 0) == 0:
-        available_skills.append(3)  # 大絕
-    
-    if not available_skills:
-        return 1  # 如果都在 CD，預設普攻（普攻不應該有 CD）
-    
-    # AI 策略
-    person_hp_ratio = person.hp / person.initial_hp if person.initial_hp > 0 else 1
-    dragon_hp_ratio = dragon.hp / dragon.initial_hp if dragon.initial_hp > 0 else 1
-    
-    # 血量低於 40% 且治療可用，優先治療
-    if person_hp_ratio < 0.4 and 2 in available_skills:
-        return 2
-    
-    # 龍王血量低，且大絕可用，使用大絕收頭
-    if dragon_hp_ratio < 0.3 and 3 in available_skills:
-        return 3
-    
-    # 龍王血量中等，有一定機率使用大絕
-    if dragon_hp_ratio < 0.6 and 3 in available_skills and random.random() < 0.3:
-        return 3
-    
-    # 血量還行，隨機選擇攻擊技能
-    attack_skills = [s for s in available_skills if s != 2]
-    if attack_skills:
-        return random.choice(attack_skills)
-    
-    # 預設普攻
-    return 1
-
-
-def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal', display_mode='pygame', socketio=None, input_queue=None):
-    """
-    執行遊戲
+    執行遊戲 (Pygame 視窗)
+    網頁顯示模式由 web_runner.WebTurnRunner 事件驅動處理，不經過這個迴圈
     
     參數:
         mode: 'manual' (手動) 或 'auto' (自動)
         player_name: 玩家名稱
         difficulty: 'easy', 'normal', 或 'hard'
-        display_mode: 'pygame' 或 'web'
-        socketio: SocketIO 實例 (用於 web 模式)
-        input_queue: 輸入隊列 (用於 web 模式接收按鍵)
+        socketio: SocketIO 實例 (遊戲結束時通知該場的 room)
+        game_id: 由呼叫端預先配置的遊戲 ID；None 則自行向 Redis 取號
     """
-    if display_mode == 'web':
-        os.environ["SDL_VIDEODRIVER"] = "dummy"
-    else:
-        if "SDL_VIDEODRIVER" in os.environ:
-            del os.environ["SDL_VIDEODRIVER"]
+    if "SDL_VIDEODRIVER" in os.environ:
+        del os.environ["SDL_VIDEODRIVER"]
 
     pygame.init()
     screen = pygame.display.set_mode((SX, SY))
 
     # 強制視窗在最上層 (Windows)
-    if sys.platform == "win32" and display_mode == 'pygame':
+    if sys.platform == "win32":
         try:
             hwnd = pygame.display.get_wm_info()['window']
             ctypes.windll.user32.ShowWindow(hwnd, 9)
@@ -113,11 +44,9 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
     clock = pygame.time.Clock()
     pygame.key.stop_text_input()
     
-    # 載入資源
-    bg = pygame.image.load(BG_IMG)
-    king = pygame.image.load(KING_IMG)
-    win_lose_pen = pygame.freetype.Font(FONT_PATH, 30)
-    difficulty_pen = pygame.freetype.Font(FONT_PATH, 18)
+    # 載入資源 (從全域快取取得，重複開局不會重新讀檔)
+    bg = load_image(BG_IMG, alpha=False)
+    king = load_image(KING_IMG)
 
     # === 取得難度設定 ===
     diff_settings = DIFFICULTY_SETTINGS.get(difficulty, DIFFICULTY_SETTINGS['normal'])
@@ -126,6 +55,11 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
     diff_text = diff_settings['name']
     pygame.display.set_caption(f"勇者對戰龍王 - {mode_text} [{diff_text}]")
 
+    # 固定不變的 HUD 文字只渲染一次
+    diff_color = {'easy': '#51cf66', 'normal': '#ffd43b', 'hard': '#ff6b6b'}.get(difficulty, '#ffd43b')
+    diff_surface = render_text(f'難度: {diff_text}', 18, diff_color, 'black')
+    auto_surface = render_text('AUTO', 18, '#00ffff', 'black')
+
     # --- 初始化角色 ---
     # print(f"\n正在加載角色數據... (難度: {diff_text}, 模式: {mode_text})")
     
@@ -135,13 +69,8 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
     dragon = create_role_from_config(d_conf, difficulty=difficulty)
     person = create_role_from_config(p_conf, difficulty='normal')
     
-    # === 應用難度調整 ===
-    dragon.hp += diff_settings['dragon_hp_bonus']
-    dragon.initial_hp += diff_settings['dragon_hp_bonus']
-    person.hp += diff_settings['player_hp_bonus']
-    person.initial_hp += diff_settings['player_hp_bonus']
-    
-    person.cooldowns[3] = 2  # 大絕初始 CD
+    # === 應用難度調整 (含大絕初始 CD) ===
+    apply_difficulty_hp(dragon, person, difficulty)
 
     # 設定位置
     d_pos = d_conf.get('position') if isinstance(d_conf.get('position'), dict) else eval(d_conf.get('position', '{"x": 550, "y": 150}'))
@@ -153,17 +82,20 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
     # --- 遊戲狀態變數 ---
     running, game_state = True, 0
     game_saved = False
-    current_game_id = None
+    current_game_id = game_id
     winner = None
     game_data = None
     
-    if redis_client:
+    if current_game_id is None and redis_client:
         try:
             current_game_id = redis_client.incr('game:id:counter')
             # print(f"遊戲開始！ID: {current_game_id} | 難度: {diff_text} | 模式: {mode_text}")
         except: 
             pass
 
+    # 戰鬥事件緩衝 (依寫入策略每回合或遊戲結束時批次寫入)
+    event_log = BattleEventLog(current_game_id) if current_game_id else None
+
     current_rounds = 1
     turn_state = 'player_turn'
     turn_start_time = pygame.time.get_ticks()
@@ -177,20 +109,11 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
     auto_action_timer = 0
     AUTO_ACTION_DELAY = 500  # 自動模式每 500ms 執行一次動作
 
-    # Web 模式：發送初始狀態
-    if display_mode == 'web' and socketio:
-        emit_web_state(socketio, dragon, person, 'init', None)
-
     while running:
         clock.tick(FPS)
         current_time = pygame.time.get_ticks()
 
-        # === Web 模式：接收輸入 ===
         action = None
-        if display_mode == 'web' and input_queue and not input_queue.empty():
-            web_cmd = input_queue.get()
-            if web_cmd.startswith('skill_'):
-                action = int(web_cmd.split('_')[1])
 
         # === 事件處理 ===
         for event in pygame.event.get():
@@ -200,8 +123,8 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
                 if event.key == pygame.K_ESCAPE: 
                     running = False
                 
-                # Pygame 模式：鍵盤輸入 (僅手動模式)
-                if display_mode == 'pygame' and mode == 'manual' and turn_state == 'player_turn':
+                # 鍵盤輸入 (僅手動模式)
+                if mode == 'manual' and turn_state == 'player_turn':
                     if event.key == pygame.K_1: action = 1
                     elif event.key == pygame.K_2: action = 2
                     elif event.key == pygame.K_3: action = 3
@@ -224,13 +147,9 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
             if action is not None:
                 # 檢查技能冷卻
                 if person.cooldowns.get(action, 0) == 0:
-                    person.attack(dragon, choice=action, game_id=current_game_id, current_round=current_rounds)
+                    person.attack(dragon, choice=action, current_round=current_rounds, event_log=event_log)
                     person.say()
                     
-                    if display_mode == 'web' and socketio:
-                        emit_web_state(socketio, dragon, person, 'attack', 'person')
-                        time.sleep(0.3)
-                    
                     turn_state = 'animating'
                     animation_start_time = current_time
                 else:
@@ -252,17 +171,15 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
                         turn_start_time = current_time
                         current_rounds += 1
                         person.decrement_cooldowns()
+                        if event_log:
+                            event_log.end_turn()
                         auto_action_timer = current_time  # 重置自動模式計時器
 
         # === 龍王回合 ===
         elif turn_state == 'dragon_turn' and dragon.hp > 0 and person.hp > 0:
-            dragon.attack(person, game_id=current_game_id, current_round=current_rounds)
+            dragon.attack(person, current_round=current_rounds, event_log=event_log)
             dragon.say()
             
-            if display_mode == 'web' and socketio:
-                emit_web_state(socketio, dragon, person, 'attack', 'dragon')
-                time.sleep(0.3)
-            
             turn_state = 'animating'
             animation_start_time = current_time
             person.skillchose = 0
@@ -277,12 +194,11 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
 
         # === 遊戲結束處理 ===
         if game_state == 1 and not game_saved:
-            # 播放音效 (僅 Pygame 模式)
-            if display_mode == 'pygame':
-                try:
-                    pygame.mixer.Sound('images/winner.mp3').play()
-                except:
-                    pass
+            # 播放音效
+            try:
+                load_sound('winner.mp3').play()
+            except:
+                pass
             
             # 判定勝負
             if dragon.hp <= 0 and person.hp <= 0: 
@@ -292,7 +208,9 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
             else: 
                 winner = '勇者'
             
-            # 儲存到 Redis
+            # 儲存到 Redis (先寫入剩餘的戰鬥事件)
+            if event_log:
+                event_log.close()
             if current_game_id:
                 save_game_to_redis(current_game_id, dragon, person, winner, current_rounds, player_name)
             
@@ -310,100 +228,73 @@ def run_gui_game(mode='manual', player_name='匿名玩家', difficulty='normal',
             
             # ★★★ 通過 WebSocket 廣播遊戲結果 ★★★
             if socketio:
-                socketio.emit('game_over', {'winner': winner, 'game_id': current_game_id})
+                emit_to_game(socketio, 'game_over', {'winner': winner, 'game_id': current_game_id}, current_game_id)
             
             game_saved = True
             # print(f"遊戲結束！勝利者: {winner}, 回合數: {current_rounds}")
 
         # === 渲染畫面 ===
-        if display_mode == 'pygame':
-            screen.blit(bg, (0, 0))
-            dragon.update(screen, current_rounds)
-            person.update(screen, current_rounds)
-            
-            # 繪製難度指示器
-            diff_color = {'easy': '#51cf66', 'normal': '#ffd43b', 'hard': '#ff6b6b'}.get(difficulty, '#ffd43b')
-            diff_surface = difficulty_pen.render(f'難度: {diff_text}', diff_color, 'black')[0]
-            screen.blit(diff_surface, (SX - 120, 10))
-            
-            # ★★★ 自動模式顯示 "AUTO" 標籤 ★★★
-            if mode == 'auto':
-                auto_surface = difficulty_pen.render('AUTO', '#00ffff', 'black')[0]
-                screen.blit(auto_surface, (SX - 120, 35))
+        screen.blit(bg, (0, 0))
+        dragon.update(screen, current_rounds)
+        person.update(screen, current_rounds)
+        
+        # 繪製難度指示器
+        screen.blit(diff_surface, (SX - 120, 10))
+        
+        # ★★★ 自動模式顯示 "AUTO" 標籤 ★★★
+        if mode == 'auto':
+            screen.blit(auto_surface, (SX - 120, 35))
+        
+        # 繪製計時條和技能 CD (手動模式)
+        if mode == 'manual' and turn_state == 'player_turn':
+            time_left = max(0, TURN_DURATION - (current_time - turn_start_time))
+            bar_w, bar_h = 200, 20
+            fill_w = int((time_left / TURN_DURATION) * bar_w)
+            pygame.draw.rect(screen, (100, 100, 100), (SX//2 - bar_w//2, 50, bar_w, bar_h))
+            pygame.draw.rect(screen, (0, 255, 0), (SX//2 - bar_w//2, 50, fill_w, bar_h))
             
-            # 繪製計時條和技能 CD (手動模式)
-            if mode == 'manual' and turn_state == 'player_turn':
-                time_left = max(0, TURN_DURATION - (current_time - turn_start_time))
-                bar_w, bar_h = 200, 20
-                fill_w = int((time_left / TURN_DURATION) * bar_w)
-                pygame.draw.rect(screen, (100, 100, 100), (SX//2 - bar_w//2, 50, bar_w, bar_h))
-                pygame.draw.rect(screen, (0, 255, 0), (SX//2 - bar_w//2, 50, fill_w, bar_h))
+            y_offset = 400
+            skills = [(1, "普攻", person.cooldowns[1]), (2, "治療", person.cooldowns[2]), (3, "大絕", person.cooldowns[3])]
+            for i, (sid, name, cd) in enumerate(skills):
+                color = 'white' if cd == 0 else 'gray'
+                text = f"{name}: {'READY' if cd == 0 else f'{cd}T'}"
+                s_surf = render_text(text, 30, color)
+                screen.blit(s_surf, (50 + i * 250, y_offset))
+        
+        # 繪製結束畫面
+        if game_state == 1:
+            if dragon.hp <= 0 and person.hp <= 0:
+                msg = "平手"
+            elif person.hp <= 0:
+                msg = "龍王勝利"
+                try:
+                    person.img = load_image(p_conf['img_dead'])
+                    screen.blit(person.img, person.rect)
+                except: pass
+                screen.blit(king, (520, 10))
+            elif dragon.hp <= 0:
+                msg = "勇者勝利"
+                try:
+                    dragon.img = load_image(d_conf['img_dead'])
+                    screen.blit(dragon.img, dragon.rect)
+                except: pass
+                screen.blit(king, (70, 10))
                 
-                y_offset = 400
-                skills = [(1, "普攻", person.cooldowns[1]), (2, "治療", person.cooldowns[2]), (3, "大絕", person.cooldowns[3])]
-                for i, (sid, name, cd) in enumerate(skills):
-                    color = 'white' if cd == 0 else 'gray'
-                    text = f"{name}: {'READY' if cd == 0 else f'{cd}T'}"
-                    s_surf = win_lose_pen.render(text, color, None)[0]
-                    screen.blit(s_surf, (50 + i * 250, y_offset))
-            
-            # 繪製結束畫面
-            if game_state == 1:
-                if dragon.hp <= 0 and person.hp <= 0:
-                    msg = "平手"
-                elif person.hp <= 0:
-                    msg = "龍王勝利"
-                    try:
-                        person.img = pygame.image.load(p_conf['img_dead'])
-                        screen.blit(person.img, person.rect)
-                    except: pass
-                    screen.blit(king, (520, 10))
-                elif dragon.hp <= 0:
-                    msg = "勇者勝利"
-                    try:
-                        dragon.img = pygame.image.load(d_conf['img_dead'])
-                        screen.blit(dragon.img, dragon.rect)
-                    except: pass
-                    screen.blit(king, (70, 10))
-                    
-                txt = win_lose_pen.render(msg, 'gold', 'black')[0]
-                screen.blit(txt, txt.get_rect(center=(SX // 2, SY // 2)))
-            
-            pygame.display.flip()
-        else:
-            # Web 模式：減少 CPU 使用
-            time.sleep(0.05)
+            txt = render_text(msg, 30, 'gold', 'black')
+            screen.blit(txt, txt.get_rect(center=(SX // 2, SY // 2)))
+        
+        pygame.display.flip()
 
         # 遊戲結束後等待一下再關閉
         if game_state == 1 and game_saved:
-            if display_mode == 'pygame':
-                pygame.display.flip()
-                time.sleep(2)  # 顯示結果 2 秒
+            pygame.display.flip()
+            time.sleep(2)  # 顯示結果 2 秒
             running = False
     
     pygame.quit()
     return game_data
 
 
-def emit_web_state(socketio, dragon, person, action_type, actor):
-    """發送 JSON 狀態給前端"""
-    state = {
-        'dragon': {'hp': dragon.hp, 'max_hp': dragon.initial_hp},
-        'person': {
-            'hp': person.hp, 
-            'max_hp': person.initial_hp,
-            'cooldowns': {
-                1: person.cooldowns.get(1, 0),
-                2: person.cooldowns.get(2, 0),
-                3: person.cooldowns.get(3, 0)
-            }
-        },
-        'action_type': action_type,
-        'last_actor': actor
-    }
-    socketio.emit('web_game_update', state)
-
-
 if __name__ == '__main__':
     import argparse
     
@@ -0,0 +1,95 @@
+# maintenance.py
+"""
+Redis 資料維護工具
+
+用法:
+    python maintenance.py backfill-game-index     # 將舊的 game:list 補建到 game:index
+    python maintenance.py backfill-player-stats   # 從既有遊戲重建玩家累計數據與玩家排行榜
+    python maintenance.py backfill-character-stats   # 從既有遊戲重建 stats:characters
+    python maintenance.py verify-character-stats     # 以 FT.AGGREGATE 核對 stats:characters (需要 RediSearch)
+    python maintenance.py verify-replays             # 以種子與輸入重播網頁版遊戲，核對存檔結果
+"""
+import argparse
+import time
+from database import (backfill_game_index, backfill_player_stats, backfill_character_stats,
+                      get_aggregated_character_stats, get_search_character_stats, init_search_index,
+                      redis_client)
+from replay import verify_all_games
+
+
+def verify_character_stats():
+    """
+    比對計數器 (stats:characters) 與 FT.AGGREGATE 的聚合結果
+    注意：遊戲 Hash 30 天後過期，計數器則會一直累加，兩者在有過期資料時本來就會不同
+    """
+    init_search_index()
+    # 新建立的索引會在背景掃描既有資料，等它完成
+    for _ in range(30):
+        if int(redis_client.ft('idx:games').info().get('indexing', 0)) == 0:
+            break
+        time.sleep(1)
+
+    counters = get_aggregated_character_stats()
+    search = get_search_character_stats()
+    if counters is None or search is None:
+        print("✗ 無法取得統計資料")
+        return False
+
+    mismatches = []
+    if counters['analyzed_games'] != search['analyzed_games']:
+        mismatches.append(f"analyzed_games: 計數器 {counters['analyzed_games']} / 聚合 {search['analyzed_games']}")
+    for side in ('dragon', 'person'):
+        for field in ('total_damage', 'total_healing', 'total_crits'):
+            if counters[side][field] != search[side][field]:
+                mismatches.append(f"{side}.{field}: 計數器 {counters[side][field]} / 聚合 {search[side][field]}")
+
+    if mismatches:
+        print("✗ stats:characters 與 FT.AGGREGATE 不一致:")
+        for line in mismatches:
+            print(f"  {line}")
+        return False
+
+    print(f"✓ stats:characters 與 FT.AGGREGATE 一致 ({counters['analyzed_games']} 場)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Redis 資料維護工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_index = sub.add_parser('backfill-game-index', help='為既有遊戲建立分頁用的 game:index')
+    p_index.add_argument('--batch-size', type=int, default=500)
+
+    p_players = sub.add_parser('backfill-player-stats', help='從 game:{id} 重建 player:{name}:stats 與 leaderboard:players')
+    p_players.add_argument('--batch-size', type=int, default=500)
+
+    p_chars = sub.add_parser('backfill-character-stats', help='從 game:{id} 重建 stats:characters')
+    p_chars.add_argument('--batch-size', type=int, default=500)
+
+    sub.add_parser('verify-character-stats', help='以 FT.AGGREGATE 核對 stats:characters')
+
+    p_replays = sub.add_parser('verify-replays', help='重播有種子與輸入的遊戲並核對存檔結果')
+    p_replays.add_argument('--batch-size', type=int, default=500)
+
+    args = parser.parse_args()
+
+    if redis_client is None:
+        print("Redis 未連接，無法執行維護工作")
+        return
+
+    if args.command == 'backfill-game-index':
+        backfill_game_index(batch_size=args.batch_size)
+    elif args.command == 'backfill-player-stats':
+        backfill_player_stats(batch_size=args.batch_size)
+    elif args.command == 'backfill-character-stats':
+        backfill_character_stats(batch_size=args.batch_size)
+    elif args.command == 'verify-character-stats':
+        verify_character_stats()
+    elif args.command == 'verify-replays':
+        summary = verify_all_games(batch_size=args.batch_size)
+        print(f"重播核對完成: 一致 {summary['ok']} 場，不一致 {len(summary['mismatch'])} 場，"
+              f"無重播資訊 {summary['unavailable']} 場")
+
+
+if __name__ == '__main__':
+    main()
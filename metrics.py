@@ -0,0 +1,266 @@
+# metrics.py
+"""
+Prometheus 格式的執行指標 (GET /metrics)
+
+不依賴 prometheus_client，只實作需要的 Counter / Gauge / Histogram 與文字輸出格式。
+Redis 的指令延遲、錯誤、重試與連線池使用量由這裡的 Instrumented* 類別記錄，
+database.RedisConnection 以它們取代 redis-py 原本的類別。
+"""
+import threading
+import time
+import redis
+from redis.client import Pipeline
+from redis.connection import ConnectionPool, BlockingConnectionPool
+from redis.retry import Retry
+
+# Redis 指令與取得連線的延遲分佈 (秒)
+REDIS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}  # 標籤值 tuple -> 數值
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                for key, value in sorted(items)]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+            return self._values[key]
+
+    def dec(self, amount=1, **labels):
+        return self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=REDIS_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [各區間計數..., 總和, 次數]
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(entry)) for key, entry in self._values.items()]
+        n = len(self.buckets)
+        bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+        lines = []
+        for key, entry in sorted(items):
+            # 超過最大區間的次數只算在 +Inf
+            counts = entry[:n] + [entry[-1] - sum(entry[:n])]
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, bound)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(entry[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {entry[-1]}')
+        return lines
+
+
+# --- 指標登錄表 (單例模式) ---
+class Metrics:
+    """所有指標的登錄表，render() 產生 /metrics 的文字內容"""
+    _metrics = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _register(cls, metric):
+        with cls._lock:
+            return cls._metrics.setdefault(metric.name, metric)
+
+    @classmethod
+    def counter(cls, name, help_text, labels=()):
+        return cls._register(Counter(name, help_text, labels))
+
+    @classmethod
+    def gauge(cls, name, help_text, labels=()):
+        return cls._register(Gauge(name, help_text, labels))
+
+    @classmethod
+    def histogram(cls, name, help_text, labels=(), buckets=REDIS_BUCKETS):
+        return cls._register(Histogram(name, help_text, labels, buckets))
+
+    @classmethod
+    def render(cls):
+        with cls._lock:
+            metrics = list(cls._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+# === Redis 指標 ===
+
+REDIS_COMMAND_SECONDS = Metrics.histogram(
+    'redis_command_duration_seconds', 'Redis 指令延遲 (Pipeline 以 PIPELINE / MULTI 整批計算)', ('command',))
+REDIS_COMMAND_ERRORS = Metrics.counter(
+    'redis_command_errors_total', 'Redis 指令錯誤次數', ('command', 'error'))
+REDIS_RETRIES = Metrics.counter(
+    'redis_connection_retries_total', 'Redis 連線錯誤後的重試 (outcome=retry 已重試 / give_up 超過次數放棄)',
+    ('error', 'outcome'))
+REDIS_WATCH_RETRIES = Metrics.counter(
+    'redis_watch_retries_total', 'WATCH / MULTI 樂觀鎖衝突後重新讀取的次數', ('operation',))
+
+REDIS_POOL_CHECKOUT_SECONDS = Metrics.histogram(
+    'redis_pool_checkout_seconds', '從連線池取得連線的等待時間 (含建立新連線)')
+REDIS_POOL_CHECKOUT_ERRORS = Metrics.counter(
+    'redis_pool_checkout_errors_total', '取得連線失敗次數 (MaxConnectionsError 表示連線池已滿)', ('error',))
+REDIS_POOL_IN_USE = Metrics.gauge('redis_pool_connections_in_use', '目前借出中的連線數')
+REDIS_POOL_IN_USE_PEAK = Metrics.gauge('redis_pool_connections_in_use_peak', '啟動以來借出中連線數的最高值')
+REDIS_POOL_CREATED = Metrics.counter('redis_pool_connections_created_total', '連線池建立的連線數')
+REDIS_POOL_MAX = Metrics.gauge('redis_pool_max_connections', '連線池上限 (max_connections)')
+
+
+def _timed_command(command, call, *args, **options):
+    start = time.perf_counter()
+    try:
+        return call(*args, **options)
+    except Exception as e:
+        REDIS_COMMAND_ERRORS.inc(command=command, error=type(e).__name__)
+        raise
+    finally:
+        REDIS_COMMAND_SECONDS.observe(time.perf_counter() - start, command=command)
+
+
+class CountingRetry(Retry):
+    """與 redis-py 的 Retry 相同，另外記錄每次連線錯誤與是否重試"""
+    def call_with_retry(self, do, fail, is_retryable=None, with_failure_count=False):
+        failures = [0]
+
+        def counted_fail(error, *args):
+            failures[0] += 1
+            retried = self._retries < 0 or failures[0] <= self._retries
+            REDIS_RETRIES.inc(error=type(error).__name__, outcome='retry' if retried else 'give_up')
+            return fail(error, *args)
+
+        return super().call_with_retry(do, counted_fail, is_retryable, with_failure_count)
+
+
+class _PoolMetricsMixin:
+    """記錄取得連線的等待時間、借出中的連線數與建立的連線數"""
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except Exception as e:
+            REDIS_POOL_CHECKOUT_ERRORS.inc(error=type(e).__name__)
+            raise
+        finally:
+            REDIS_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+        in_use = REDIS_POOL_IN_USE.inc()
+        with self._peak_lock:
+            if in_use > self._peak_in_use:
+                self._peak_in_use = in_use
+                REDIS_POOL_IN_USE_PEAK.set(in_use)
+        return connection
+
+    def release(self, connection):
+        super().release(connection)
+        REDIS_POOL_IN_USE.dec()
+
+    def make_connection(self):
+        connection = super().make_connection()
+        REDIS_POOL_CREATED.inc()
+        return connection
+
+    def _init_metrics(self):
+        self._peak_lock = threading.Lock()
+        self._peak_in_use = 0
+        REDIS_POOL_MAX.set(self.max_connections)
+
+
+class InstrumentedConnectionPool(_PoolMetricsMixin, ConnectionPool):
+    """連線池已滿時立即丟出 MaxConnectionsError (redis-py 預設行為)"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_metrics()
+
+
+class InstrumentedBlockingConnectionPool(_PoolMetricsMixin, BlockingConnectionPool):
+    """連線池已滿時最多等待 timeout 秒，等待時間記在 redis_pool_checkout_seconds"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_metrics()
+
+
+class InstrumentedPipeline(Pipeline):
+    def execute(self, raise_on_error=True):
+        return _timed_command('MULTI' if self.transaction else 'PIPELINE', super().execute, raise_on_error)
+
+    def immediate_execute_command(self, *args, **options):
+        # WATCH 之後、MULTI 之前的指令會立即執行
+        return _timed_command(str(args[0]).upper(), super().immediate_execute_command, *args, **options)
+
+
+class InstrumentedRedis(redis.Redis):
+    """每個指令記錄延遲與錯誤 (以指令名稱分類)"""
+    def execute_command(self, *args, **options):
+        return _timed_command(str(args[0]).upper(), super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -0,0 +1,265 @@
+# replay.py
+"""
+以「種子 + 玩家輸入」重播網頁版遊戲
+
+WebBattleGame 每回合的 RNG 由 (種子, 回合數) 衍生，存檔時 game:{id} Hash 會一併保存
+seed / inputs / difficulty / rules (數十 bytes)，因此不需要 Stream 也能：
+- 重新產生完整的戰鬥事件 (回放 API 在 Stream 不存在時使用，結果以 LRU 快取)
+- 重新計算結果並與存檔比對 (verify_game)
+"""
+import threading
+from collections import OrderedDict
+from config import REPLAY_CACHE_SIZE
+from database import redis_client, get_replay_page, ABANDONED_WINNER
+from web_game_logic import WebBattleGame, REPLAY_RULES, PLAYER_ACTIONS, load_character_configs
+
+# 重播後要與存檔比對的 Hash 欄位
+VERIFY_FIELDS = ('winner', 'total_rounds', 'd_damage', 'd_heal', 'd_crit', 'd_hp',
+                 'p_damage', 'p_heal', 'p_crit', 'p_hp')
+REPLAY_HASH_FIELDS = ('seed', 'inputs', 'difficulty', 'rules', 'player_name') + VERIFY_FIELDS
+# inputs 中合法的代碼 (a = 自動)
+INPUT_CODES = frozenset('a') | {str(action) for action in PLAYER_ACTIONS}
+
+
+class _CollectingEventLog:
+    """取代 BattleEventLog：事件只收集成回放 API 的格式，不寫入 Redis"""
+    def __init__(self):
+        self.events = []
+
+    def append(self, turn, actor, action, value, details):
+        self.events.append({
+            'id': f'0-{len(self.events) + 1}',  # 與 Stream ID 同格式，分頁游標可共用
+            'turn': str(turn),
+            'actor': str(actor),
+            'action': str(action),
+            'value': str(value),
+            'details': str(details)
+        })
+
+    def end_turn(self):
+        pass
+
+    def close(self):
+        pass
+
+    def flush(self):
+        pass
+
+
+def replay_game(seed, inputs, difficulty='normal', game_id=0, player_name='', characters=None):
+    """
+    依種子與輸入重播一場遊戲
+    回傳 (結束時的 WebBattleGame, 事件列表)；輸入在遊戲結束前用完時視為中途離開 (與 abandon() 相同)
+    characters: 預先載入的 (龍王設定, 勇者設定)，連續重播多場時避免每場都讀 Redis
+    inputs 含有無法辨識的代碼時丟出 ValueError (不會猜測著重播)
+    """
+    invalid = set(inputs) - INPUT_CODES
+    if invalid:
+        raise ValueError(f"無效的輸入代碼: {''.join(sorted(invalid))}")
+
+    game = WebBattleGame(game_id, player_name, difficulty, seed=int(seed), characters=characters)
+    game.persist_on_end = False
+    game.verbose = False
+    game.event_log = log = _CollectingEventLog()
+
+    for code in inputs:
+        if game.is_game_over:
+            break
+        if code == 'a':
+            game.process_turn(is_auto=True)
+        else:
+            game.process_turn(action_id=int(code))
+
+    if not game.is_game_over:
+        game.winner = ABANDONED_WINNER
+        game.is_game_over = True
+        game.final_round = game.turn_count
+    return game, log.events
+
+
+def result_fields(game):
+    """重播結果換成與 game:{id} Hash 相同的字串欄位"""
+    values = {
+        'winner': game.winner,
+        'total_rounds': game.final_round,
+        'd_damage': game.dragon.total_damage_dealt,
+        'd_heal': game.dragon.total_healing,
+        'd_crit': game.dragon.critical_hits,
+        'd_hp': max(0, game.dragon.hp),
+        'p_damage': game.person.total_damage_dealt,
+        'p_heal': game.person.total_healing,
+        'p_crit': game.person.critical_hits,
+        'p_hp': max(0, game.person.hp)
+    }
+    return {field: str(value) for field, value in values.items()}
+
+
+def load_replay_info(game_id):
+    """讀取重播所需的 Hash 欄位；不是以目前規則存檔的遊戲 (舊資料、Pygame 模式) 回傳 None"""
+    if not redis_client:
+        return None
+    values = dict(zip(REPLAY_HASH_FIELDS, redis_client.hmget(f'game:{game_id}', REPLAY_HASH_FIELDS)))
+    if values['seed'] is None or values['inputs'] is None or values['rules'] != REPLAY_RULES:
+        return None
+    return values
+
+
+# --- 重播結果快取 (單例模式) ---
+class ReplayCache:
+    """
+    重新產生的回放事件 (依 game_id，LRU)
+
+    已結束的遊戲結果不會再變，因此不需要過期時間；
+    同一場同時只有一個請求會讀 Redis 並重播 (single-flight)，其他觀看者等它完成後直接使用結果，
+    不同場的重播互不等待 (全域鎖只保護 dict 操作)。
+    """
+    _events = OrderedDict()
+    _game_locks = {}    # game_id -> 重播中的鎖
+    _characters = None  # 角色設定只在第一次重播時讀取 Redis
+    _lock = threading.Lock()
+    _hits = 0
+    _misses = 0
+    _coalesced = 0
+
+    @classmethod
+    def _lookup(cls, game_id):
+        with cls._lock:
+            events = cls._events.get(game_id)
+            if events is not None:
+                cls._events.move_to_end(game_id)
+            return events
+
+    @classmethod
+    def get_events(cls, game_id):
+        """回傳該場的事件列表，無法重播時回傳 None"""
+        events = cls._lookup(game_id)
+        if events is not None:
+            cls._hits += 1
+            return events
+
+        with cls._lock:
+            game_lock = cls._game_locks.setdefault(game_id, threading.Lock())
+        try:
+            with game_lock:
+                # 等待期間其他請求可能已經重播完成
+                events = cls._lookup(game_id)
+                if events is not None:
+                    cls._coalesced += 1
+                    return events
+
+                info = load_replay_info(game_id)
+                if info is None:
+                    return None
+                cls._misses += 1
+                if cls._characters is None:
+                    cls._characters = load_character_configs()
+                try:
+                    _, events = replay_game(info['seed'], info['inputs'], info['difficulty'], game_id=game_id,
+                                            player_name=info['player_name'], characters=cls._characters)
+                except ValueError as e:
+                    print(f"[Replay] 遊戲 #{game_id} 無法重播: {e}")
+                    return None
+                with cls._lock:
+                    cls._events[game_id] = events
+                    if len(cls._events) > REPLAY_CACHE_SIZE:
+                        cls._events.popitem(last=False)
+                return events
+        finally:
+            with cls._lock:
+                if cls._game_locks.get(game_id) is game_lock and not game_lock.locked():
+                    del cls._game_locks[game_id]
+
+    @classmethod
+    def stats(cls):
+        return {'cached_games': len(cls._events), 'hits': cls._hits, 'misses': cls._misses,
+                'coalesced': cls._coalesced}
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._events.clear()
+            cls._characters = None
+            cls._hits = 0
+            cls._misses = 0
+            cls._coalesced = 0
+
+
+def get_replay_events_page(game_id, cursor=None, limit=100):
+    """
+    以重播結果提供與 get_replay_page 相同格式的分頁 ({'events', 'next_cursor'})
+    無法重播時回傳 None
+    """
+    events = ReplayCache.get_events(game_id)
+    if events is None:
+        return None
+    start = int(str(cursor).split('-')[-1]) if cursor else 0
+    page = events[start:start + limit]
+    next_cursor = page[-1]['id'] if page and start + limit < len(events) else None
+    return {'events': page, 'next_cursor': next_cursor}
+
+
+def load_replay_page(game_id, cursor=None, limit=100):
+    """
+    回放分頁：優先讀 Stream；沒有 Stream (web_game_event_stream 關閉或已過期) 時改以重播產生
+    重播產生的事件 ID 為 0-n，游標以此區分來源
+    """
+    if not (cursor and str(cursor).startswith('0-')):
+        page = get_replay_page(game_id, cursor=cursor, limit=limit)
+        if page['events'] or cursor:
+            return page
+    regenerated = get_replay_events_page(game_id, cursor=cursor, limit=limit)
+    return regenerated if regenerated is not None else {'events': [], 'next_cursor': None}
+
+
+def iter_replay_pages(game_id, cursor=None, limit=100):
+    """依序產生回放的每一頁事件 (串流回應使用，記憶體中同時只有一頁)"""
+    while True:
+        page = load_replay_page(game_id, cursor=cursor, limit=limit)
+        if page['events']:
+            yield page['events']
+        cursor = page['next_cursor']
+        if cursor is None:
+            return
+
+
+def verify_game(game_id, characters=None):
+    """
+    重播並與存檔結果比對
+    回傳 {'game_id', 'status': 'ok' | 'mismatch' | 'unavailable', 'mismatches': {欄位: [存檔, 重播]}}
+    """
+    info = load_replay_info(game_id)
+    if info is None:
+        return {'game_id': game_id, 'status': 'unavailable', 'mismatches': {}}
+
+    try:
+        game, _ = replay_game(info['seed'], info['inputs'], info['difficulty'],
+                              game_id=game_id, player_name=info['player_name'], characters=characters)
+    except ValueError as e:
+        # 存檔的輸入本身有問題，重播結果不可信
+        return {'game_id': game_id, 'status': 'mismatch', 'mismatches': {'inputs': [info['inputs'], str(e)]}}
+    replayed = result_fields(game)
+    mismatches = {field: [info[field], replayed[field]]
+                  for field in VERIFY_FIELDS if info[field] != replayed[field]}
+    return {'game_id': game_id, 'status': 'mismatch' if mismatches else 'ok', 'mismatches': mismatches}
+
+
+def verify_all_games(batch_size=500):
+    """
+    以 game:index 逐場重播核對 (維護指令使用)
+    回傳 {'ok': 場數, 'mismatch': [game_id...], 'unavailable': 場數}
+    """
+    summary = {'ok': 0, 'mismatch': [], 'unavailable': 0}
+    if not redis_client:
+        return summary
+
+    characters = load_character_configs()
+    for game_id, _ in redis_client.zscan_iter('game:index', count=batch_size):
+        result = verify_game(int(game_id), characters=characters)
+        if result['status'] == 'mismatch':
+            summary['mismatch'].append(result['game_id'])
+            print(f"✗ 遊戲 #{game_id} 重播結果不一致: {result['mismatches']}")
+        elif result['status'] == 'ok':
+            summary['ok'] += 1
+        else:
+            summary['unavailable'] += 1
+    return summary
@@ -0,0 +1,248 @@
+# request_timing.py
+"""
+HTTP 路由與 Socket.IO 事件的延遲記錄、慢請求日誌與按需 cProfile
+
+- 每個路由 (以 URL 規則分類，如 /api/game/<int:game_id>) 與 Socket.IO 事件的延遲記在 /metrics
+- 超過 slow_request_ms 的請求印出完整請求內容，最近幾筆可由管理 API 查詢
+- 管理者指定路由 (或 socketio:事件名稱) 與次數後，接下來 N 次請求以 cProfile 量測，
+  結果合併存成 pstats 檔 (python -m pstats / snakeviz 可開啟)，不需要重新部署
+
+eventlet 下所有綠色執行緒共用同一個 OS 執行緒，量測中的請求讓出時，
+其他請求的函式呼叫也會出現在 profile 中；同一時間只量測一個請求。
+"""
+import cProfile
+import functools
+import hmac
+import io
+import os
+import pstats
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import g, request
+from config import SLOW_REQUEST_MS, ADMIN_TOKEN, PROFILE_OUTPUT_DIR, PROFILE_MAX_REQUESTS
+from metrics import Metrics
+
+# 請求延遲分佈 (秒)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_LOG_SIZE = 100  # 保留最近幾筆慢請求
+
+HTTP_REQUEST_SECONDS = Metrics.histogram(
+    'http_request_duration_seconds', 'HTTP 請求延遲 (依路由規則)', ('route', 'method', 'status'), REQUEST_BUCKETS)
+SOCKETIO_EVENT_SECONDS = Metrics.histogram(
+    'socketio_event_duration_seconds', 'Socket.IO 事件處理延遲', ('event',), REQUEST_BUCKETS)
+SOCKETIO_EVENT_ERRORS = Metrics.counter(
+    'socketio_event_errors_total', 'Socket.IO 事件處理丟出例外的次數', ('event', 'error'))
+SLOW_REQUESTS = Metrics.counter('slow_requests_total', '超過 slow_request_ms 的請求數', ('route',))
+
+
+# --- 慢請求日誌 (單例模式) ---
+class SlowRequestLog:
+    """最近的慢請求 (含請求內容)，同時印出日誌"""
+    _entries = deque(maxlen=SLOW_LOG_SIZE)
+
+    @classmethod
+    def record(cls, route, elapsed, context):
+        SLOW_REQUESTS.inc(route=route)
+        entry = dict(context, route=route, ms=round(elapsed * 1000, 1),
+                     timestamp=datetime.now().isoformat(timespec='seconds'))
+        cls._entries.append(entry)
+        details = ' '.join(f'{key}={value}' for key, value in context.items())
+        print(f"[Slow] {route} {entry['ms']}ms {details}")
+
+    @classmethod
+    def recent(cls):
+        return list(cls._entries)
+
+
+# --- 按需 cProfile (單例模式) ---
+class RouteProfiler:
+    """
+    管理者呼叫 arm(route, count) 後，量測該路由接下來 count 次請求
+    route 為 URL 規則 (/api/leaderboard/players) 或 socketio:事件名稱 (socketio:web_action)
+    """
+    _lock = threading.Lock()
+    _target = None       # 正在等待量測的路由
+    _remaining = 0
+    _stats = None        # 已量測請求合併後的 pstats.Stats
+    _profiled = 0
+    _active = False      # 是否有請求正在量測 (cProfile 同時只能有一個)
+    _finished = deque(maxlen=20)  # 已完成的量測 {'route', 'requests', 'file', ...}
+
+    @classmethod
+    def arm(cls, route, count):
+        count = max(1, min(int(count), PROFILE_MAX_REQUESTS))
+        with cls._lock:
+            cls._target = route
+            cls._remaining = count
+            cls._stats = None
+            cls._profiled = 0
+        print(f"[Profile] 開始量測 {route} 接下來 {count} 次請求")
+        return cls.status()
+
+    @classmethod
+    def start(cls, route):
+        """請求開始時呼叫，需要量測時回傳已啟動的 Profile，否則回傳 None"""
+        if cls._target != route:
+            return None
+        with cls._lock:
+            if cls._target != route or cls._remaining <= 0 or cls._active:
+                return None
+            cls._active = True
+            cls._remaining -= 1
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # 其他 profiler 正在執行
+            with cls._lock:
+                cls._active = False
+                cls._remaining += 1
+            return None
+        return profile
+
+    @classmethod
+    def stop(cls, route, profile):
+        profile.disable()
+        with cls._lock:
+            cls._active = False
+            if cls._target != route:
+                return  # 量測中被取消或改量測其他路由
+            if cls._stats is None:
+                cls._stats = pstats.Stats(profile)
+            else:
+                cls._stats.add(profile)
+            cls._profiled += 1
+            done = cls._remaining <= 0
+            if done:
+                stats, profiled = cls._stats, cls._profiled
+                cls._target, cls._stats, cls._profiled = None, None, 0
+        if done:
+            cls._save(route, stats, profiled)
+
+    @classmethod
+    def _save(cls, route, stats, profiled):
+        os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        name = f"{slug}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.prof"
+        stats.dump_stats(os.path.join(PROFILE_OUTPUT_DIR, name))
+        cls._finished.append({
+            'route': route,
+            'requests': profiled,
+            'file': name,
+            'total_seconds': round(stats.total_tt, 4),
+            'finished_at': datetime.now().isoformat(timespec='seconds')
+        })
+        print(f"[Profile] {route} 量測完成 ({profiled} 次請求)，已寫入 {name}")
+
+    @classmethod
+    def cancel(cls):
+        with cls._lock:
+            cls._target, cls._remaining, cls._stats, cls._profiled = None, 0, None, 0
+
+    @classmethod
+    def status(cls):
+        return {
+            'target': cls._target,
+            'remaining': cls._remaining,
+            'profiled': cls._profiled,
+            'finished': list(cls._finished)
+        }
+
+    @classmethod
+    def profile_path(cls, name):
+        """已完成的 profile 檔路徑 (只接受 _finished 中的檔名)，不存在時回傳 None"""
+        if not any(item['file'] == name for item in cls._finished):
+            return None
+        path = os.path.join(PROFILE_OUTPUT_DIR, name)
+        return path if os.path.isfile(path) else None
+
+
+def profile_text(path, limit=40):
+    """profile 檔依累計時間排序的文字報表 (與 python -m pstats 的 sort cumulative / stats 相同)"""
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+def check_admin_token():
+    """管理 API 驗證：admin_token 未設定時一律拒絕"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+# === HTTP 中介層 ===
+
+def _route_name():
+    return request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    g.request_profile = RouteProfiler.start(_route_name())
+
+
+def _after_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = _route_name()
+    HTTP_REQUEST_SECONDS.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        SlowRequestLog.record(route, elapsed, {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': response.status_code,
+            'remote': request.remote_addr,
+            'bytes': response.calculate_content_length()
+        })
+    return response
+
+
+def _teardown_request(exc):
+    # 例外時 after_request 不會執行，profile 仍要在這裡結束
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        RouteProfiler.stop(_route_name(), profile)
+
+
+def init_request_timing(app):
+    """替 Flask app 註冊延遲記錄、慢請求日誌與 cProfile 的 hook"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+# === Socket.IO ===
+
+def timed_event(event):
+    """
+    Socket.IO 事件處理的裝飾器 (放在 @socketio.on 下方)
+    記錄延遲與例外，慢的事件印出 sid 與資料；路由名稱為 socketio:事件名稱
+    """
+    route = f'socketio:{event}'
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(*args):
+            profile = RouteProfiler.start(route)
+            started = time.perf_counter()
+            try:
+                return handler(*args)
+            except Exception as e:
+                SOCKETIO_EVENT_ERRORS.inc(event=event, error=type(e).__name__)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                if profile is not None:
+                    RouteProfiler.stop(route, profile)
+                SOCKETIO_EVENT_SECONDS.observe(elapsed, event=event)
+                if elapsed * 1000 >= SLOW_REQUEST_MS:
+                    SlowRequestLog.record(route, elapsed, {
+                        'sid': request.sid,
+                        'data': str(args[0])[:200] if args else ''
+                    })
+        return wrapper
+    return decorator
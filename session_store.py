@@ -0,0 +1,428 @@
+# session_store.py
+import sys
+import threading
+import time
+from collections import OrderedDict
+import redis
+from config import (WEB_GAME_MAX_SESSIONS, WEB_GAME_IDLE_TIMEOUT, WEB_GAME_SWEEP_INTERVAL,
+                    WEB_GAME_ABANDON_POLICY, WEB_GAME_SESSION_BACKEND, WEB_GAME_WRITE_BEHIND)
+from database import redis_client
+from metrics import REDIS_WATCH_RETRIES
+from web_game_logic import WebBattleGame
+from write_behind import WriteBehind, write_turn_behind
+
+ABANDON_POLICIES = ('drop', 'save')
+
+
+class _Session:
+    __slots__ = ('game', 'last_access', 'lock')
+
+    def __init__(self, game):
+        self.game = game
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+
+
+def _approx_size(obj, depth=4, seen=None):
+    """粗估物件佔用的位元組數 (遞迴計算 dict / list / 物件屬性，最多 depth 層)"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if depth <= 0:
+        return size
+    if isinstance(obj, dict):
+        size += sum(_approx_size(k, depth - 1, seen) + _approx_size(v, depth - 1, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_approx_size(item, depth - 1, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += _approx_size(vars(obj), depth - 1, seen)
+    return size
+
+
+def _process_rss():
+    """目前行程的常駐記憶體 (bytes)，非 Linux 環境回傳 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        import resource
+        return pages * resource.getpagesize()
+    except Exception:
+        return None
+
+
+class GameSessionStore:
+    """
+    網頁版進行中遊戲的 Session 管理
+
+    - 依最後操作時間維持 LRU 順序，數量超過 max_size 時淘汰最久未操作的遊戲
+    - 閒置超過 idle_timeout 秒的遊戲由背景清理執行緒移除 (關掉分頁不會再留在記憶體)
+    - 被淘汰的遊戲依 abandon_policy 處理：drop 直接丟棄；save 以「中斷」結果存檔 (只留紀錄，不計入統計與排行榜)
+    - 每場遊戲有自己的鎖，同一場遊戲的回合不會被同時處理
+    - write_behind 為 True 時回合不等待 Redis：戰鬥事件與結束存檔交給 WriteBehind 背景寫入
+    """
+    def __init__(self, max_size=None, idle_timeout=None, sweep_interval=None, abandon_policy=None,
+                 write_behind=None):
+        self.max_size = max_size or WEB_GAME_MAX_SESSIONS
+        self.idle_timeout = idle_timeout or WEB_GAME_IDLE_TIMEOUT
+        self.sweep_interval = sweep_interval or WEB_GAME_SWEEP_INTERVAL
+        self.abandon_policy = abandon_policy or WEB_GAME_ABANDON_POLICY
+        if self.abandon_policy not in ABANDON_POLICIES:
+            self.abandon_policy = 'drop'
+        self.write_behind = WEB_GAME_WRITE_BEHIND if write_behind is None else write_behind
+
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+        self._created = 0
+        self._completed = 0
+        self._evicted_idle = 0
+        self._evicted_capacity = 0
+        self._abandoned_saved = 0
+        self._abandoned_dropped = 0
+
+    # --- 基本操作 ---
+
+    def create(self, game):
+        """加入一場新遊戲，超過上限時淘汰最久未操作的遊戲"""
+        self._ensure_sweeper()
+        if self.write_behind:
+            game.defer_writes()
+        evicted = []
+        with self._lock:
+            self._sessions[game.game_id] = _Session(game)
+            self._created += 1
+            while len(self._sessions) > self.max_size:
+                _, session = self._sessions.popitem(last=False)
+                evicted.append(session)
+                self._evicted_capacity += 1
+
+        # 存檔需要連線 Redis，不在鎖內進行
+        for session in evicted:
+            self._abandon(session.game, reason='超過上限', lock=session.lock)
+        return game
+
+    def get(self, game_id):
+        """取得遊戲並更新最後操作時間，不存在時回傳 None"""
+        with self._lock:
+            session = self._sessions.get(game_id)
+            if session is None:
+                return None
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(game_id)
+            return session.game
+
+    def apply_turn(self, game_id, **kwargs):
+        """
+        對指定遊戲執行一回合 (參數直接傳給 process_turn)
+        遊戲結束後自動移除；遊戲不存在時回傳 None
+        """
+        with self._lock:
+            session = self._sessions.get(game_id)
+            if session is None:
+                return None
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(game_id)
+
+        with session.lock:
+            state = session.game.process_turn(**kwargs)
+            if self.write_behind:
+                # 在鎖內取出事件，下一回合的事件不會先被寫入
+                write_turn_behind(session.game)
+
+        if state.get('game_over'):
+            with self._lock:
+                if self._sessions.get(game_id) is session:
+                    del self._sessions[game_id]
+                    self._completed += 1
+        return state
+
+    def remove(self, game_id):
+        """移除遊戲 (不套用 abandon_policy)，回傳被移除的遊戲或 None"""
+        with self._lock:
+            session = self._sessions.pop(game_id, None)
+        return session.game if session else None
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def __contains__(self, game_id):
+        return game_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    # --- 閒置清理 ---
+
+    def sweep(self):
+        """移除閒置超過 idle_timeout 的遊戲，回傳移除數量"""
+        deadline = time.monotonic() - self.idle_timeout
+        expired = []
+        with self._lock:
+            # OrderedDict 依最後操作時間排序，遇到第一個未過期的就可以停止
+            for game_id, session in self._sessions.items():
+                if session.last_access > deadline:
+                    break
+                expired.append(game_id)
+            expired = [self._sessions.pop(game_id) for game_id in expired]
+            self._evicted_idle += len(expired)
+
+        for session in expired:
+            self._abandon(session.game, reason='閒置逾時', lock=session.lock)
+        return len(expired)
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, daemon=True)
+                self._sweeper.start()
+                print(f"[Session] 清理執行緒已啟動 (閒置 {self.idle_timeout:g}s 移除，上限 {self.max_size} 場)")
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"[Session] 已清除 {removed} 場閒置遊戲，目前 {len(self)} 場進行中")
+            except Exception as e:
+                print(f"[Session] 清理失敗: {e}")
+
+    def _abandon(self, game, reason, lock=None):
+        if self.abandon_policy == 'save':
+            try:
+                # 等待正在處理中的回合完成再存檔
+                if lock is not None:
+                    with lock:
+                        self._run_abandon(game)
+                else:
+                    self._run_abandon(game)
+                self._abandoned_saved += 1
+                print(f"[Session] 遊戲 #{game.game_id} {reason}，已以中斷結果存檔")
+            except Exception as e:
+                print(f"[Session] 遊戲 #{game.game_id} 中斷存檔失敗: {e}")
+        else:
+            self._abandoned_dropped += 1
+            print(f"[Session] 遊戲 #{game.game_id} {reason}，已丟棄")
+
+    def _run_abandon(self, game):
+        """write_behind 時排在該場遊戲尚未寫完的事件之後"""
+        if self.write_behind:
+            WriteBehind.submit(game.game_id, game.abandon)
+        else:
+            game.abandon()
+
+    # --- 統計 ---
+
+    def stats(self):
+        """數量、淘汰次數與記憶體估計"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        now = time.monotonic()
+        session_bytes = sum(_approx_size(session.game) for session in sessions)
+        return {
+            'backend': 'memory',
+            'active': len(sessions),
+            'max_size': self.max_size,
+            'idle_timeout': self.idle_timeout,
+            'abandon_policy': self.abandon_policy,
+            'oldest_idle_seconds': round(now - sessions[0].last_access, 1) if sessions else 0,
+            'created': self._created,
+            'completed': self._completed,
+            'evicted_idle': self._evicted_idle,
+            'evicted_capacity': self._evicted_capacity,
+            'abandoned_saved': self._abandoned_saved,
+            'abandoned_dropped': self._abandoned_dropped,
+            'session_bytes': session_bytes,
+            'avg_session_bytes': session_bytes // len(sessions) if sessions else 0,
+            'process_rss_bytes': _process_rss()
+        }
+
+
+class RedisGameSessionStore(GameSessionStore):
+    """
+    存放在 Redis 的遊戲 Session，讓多個 worker / 主機可以處理同一場遊戲 (不需要 sticky session)
+
+    - web_game:{id}   WebBattleGame.to_state() 的精簡 JSON，TTL 為閒置時間的兩倍 (清理失敗時的保險)
+    - web_game:active Sorted Set，score 為最後操作時間，用於閒置清理與數量上限
+    - apply_turn 以 WATCH / MULTI 做樂觀鎖：讀取 -> process_turn -> 寫回，衝突時重新讀取再算一次；
+      戰鬥事件與結束存檔延後到寫回成功之後才執行，重試不會重複寫入
+    """
+    KEY_PREFIX = 'web_game:'
+    ACTIVE_KEY = 'web_game:active'
+    MAX_RETRIES = 5
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cas_conflicts = 0
+        self._state_bytes_total = 0
+        self._state_writes = 0
+
+    def _key(self, game_id):
+        return f'{self.KEY_PREFIX}{game_id}'
+
+    def _write(self, pipe, game):
+        """在 pipeline 中寫入遊戲狀態並更新最後操作時間"""
+        raw = game.to_state()
+        pipe.set(self._key(game.game_id), raw, ex=int(self.idle_timeout * 2))
+        pipe.zadd(self.ACTIVE_KEY, {str(game.game_id): time.time()})
+        self._state_bytes_total += len(raw.encode())
+        self._state_writes += 1
+
+    # --- 基本操作 ---
+
+    def create(self, game):
+        self._ensure_sweeper()
+        pipe = redis_client.pipeline()
+        self._write(pipe, game)
+        pipe.zcard(self.ACTIVE_KEY)
+        active = pipe.execute()[-1]
+        self._created += 1
+
+        # 超過上限時淘汰最久未操作的遊戲
+        overflow = active - self.max_size
+        if overflow > 0:
+            for game_id in redis_client.zrange(self.ACTIVE_KEY, 0, overflow - 1):
+                if self._claim_and_abandon(game_id, reason='超過上限'):
+                    self._evicted_capacity += 1
+        return game
+
+    def get(self, game_id):
+        raw = redis_client.get(self._key(game_id))
+        return WebBattleGame.from_state(raw) if raw else None
+
+    def apply_turn(self, game_id, **kwargs):
+        key = self._key(game_id)
+        with redis_client.pipeline() as pipe:
+            for _ in range(self.MAX_RETRIES):
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if raw is None:
+                        pipe.unwatch()
+                        return None
+
+                    game = WebBattleGame.from_state(raw, defer_side_effects=True)
+                    state = game.process_turn(**kwargs)
+                    if 'error' in state:
+                        # 技能冷卻中等錯誤，狀態沒有改變
+                        pipe.unwatch()
+                        return state
+
+                    pipe.multi()
+                    if game.is_game_over:
+                        pipe.delete(key)
+                        pipe.zrem(self.ACTIVE_KEY, str(game_id))
+                    else:
+                        self._write(pipe, game)
+                    pipe.execute()
+                    break
+
+                except redis.WatchError:
+                    # 其他 worker 搶先處理了這一回合，重新讀取再算一次
+                    self._cas_conflicts += 1
+                    REDIS_WATCH_RETRIES.inc(operation='session_turn')
+                    continue
+            else:
+                print(f"[Session] 遊戲 #{game_id} 回合寫回衝突超過 {self.MAX_RETRIES} 次")
+                return {'error': '回合處理衝突，請重試'}
+
+        # 狀態已成功寫回，才執行會寫入 Redis 的副作用
+        if self.write_behind:
+            write_turn_behind(game)
+            if game.is_game_over:
+                self._completed += 1
+        elif game.is_game_over:
+            game.persist_result()
+            self._completed += 1
+        else:
+            game.event_log.flush()
+        return state
+
+    def remove(self, game_id):
+        pipe = redis_client.pipeline()
+        pipe.get(self._key(game_id))
+        pipe.delete(self._key(game_id))
+        pipe.zrem(self.ACTIVE_KEY, str(game_id))
+        raw = pipe.execute()[0]
+        return WebBattleGame.from_state(raw) if raw else None
+
+    def clear(self):
+        game_ids = redis_client.zrange(self.ACTIVE_KEY, 0, -1)
+        pipe = redis_client.pipeline()
+        for game_id in game_ids:
+            pipe.delete(self._key(game_id))
+        pipe.delete(self.ACTIVE_KEY)
+        pipe.execute()
+
+    def __contains__(self, game_id):
+        return bool(redis_client.exists(self._key(game_id)))
+
+    def __len__(self):
+        return redis_client.zcard(self.ACTIVE_KEY)
+
+    # --- 閒置清理 ---
+
+    def _claim_and_abandon(self, game_id, reason):
+        """
+        多個 worker 可能同時清理，ZREM 成功的那一個才負責處理
+        回傳是否由本 worker 處理
+        """
+        if not redis_client.zrem(self.ACTIVE_KEY, game_id):
+            return False
+        pipe = redis_client.pipeline()
+        pipe.get(self._key(game_id))
+        pipe.delete(self._key(game_id))
+        raw = pipe.execute()[0]
+        if raw:
+            self._abandon(WebBattleGame.from_state(raw), reason=reason)
+        return True
+
+    def sweep(self):
+        deadline = time.time() - self.idle_timeout
+        removed = 0
+        for game_id in redis_client.zrangebyscore(self.ACTIVE_KEY, '-inf', deadline):
+            if self._claim_and_abandon(game_id, reason='閒置逾時'):
+                removed += 1
+        self._evicted_idle += removed
+        return removed
+
+    # --- 統計 ---
+
+    def stats(self):
+        oldest = redis_client.zrange(self.ACTIVE_KEY, 0, 0, withscores=True)
+        return {
+            'backend': 'redis',
+            'active': len(self),
+            'max_size': self.max_size,
+            'idle_timeout': self.idle_timeout,
+            'abandon_policy': self.abandon_policy,
+            'oldest_idle_seconds': round(time.time() - oldest[0][1], 1) if oldest else 0,
+            'created': self._created,
+            'completed': self._completed,
+            'evicted_idle': self._evicted_idle,
+            'evicted_capacity': self._evicted_capacity,
+            'abandoned_saved': self._abandoned_saved,
+            'abandoned_dropped': self._abandoned_dropped,
+            'cas_conflicts': self._cas_conflicts,
+            'avg_state_bytes': self._state_bytes_total // self._state_writes if self._state_writes else 0,
+            'process_rss_bytes': _process_rss()
+        }
+
+
+def create_session_store():
+    """依 web_game_session_backend 建立 Session 管理 (Redis 未連接時退回記憶體)"""
+    if WEB_GAME_SESSION_BACKEND == 'redis':
+        if redis_client is not None:
+            print("[Session] 使用 Redis 保存進行中的遊戲")
+            return RedisGameSessionStore()
+        print("[Session] Redis 未連接，改用記憶體保存進行中的遊戲")
+    return GameSessionStore()
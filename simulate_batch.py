@@ -0,0 +1,174 @@
+# simulate_batch.py
+"""
+無介面批次對戰 (多行程)
+
+以 WebBattleGame 的託管回合一次跑大量完整遊戲，不經過 Pygame 迴圈與動畫等待，
+可選擇以 save_game_to_redis 逐場存檔 (歷史資料灌入、壓力測試)。
+與 simulation.py 的差別：這裡跑的是真正的遊戲物件，存檔內容與網頁版完全相同，
+每場都有種子與輸入，可用 replay.py 重播。
+
+用法:
+    python simulate_batch.py --games 10000 --difficulty hard
+    python simulate_batch.py --games 500 --save --player-name 壓測玩家
+    python simulate_batch.py --games 1000 --json   # 結果以一行 JSON 輸出在 stdout 最後一行 (API 使用)
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config import DIFFICULTY_SETTINGS
+from database import redis_client
+from event_log import BattleEventLog
+from web_game_logic import WebBattleGame, load_character_configs
+
+DEFAULT_PLAYER_NAME = '模擬玩家'
+
+
+def _empty_totals():
+    return {
+        'games': 0,
+        'wins': {'勇者': 0, '龍王': 0},
+        'rounds': 0,
+        'min_rounds': None,
+        'max_rounds': 0,
+        'person_damage': 0,
+        'dragon_damage': 0,
+        'critical_hits': 0,
+        'saved': 0,
+        'save_errors': 0
+    }
+
+
+def _merge_totals(total, part):
+    total['games'] += part['games']
+    for winner, count in part['wins'].items():
+        total['wins'][winner] = total['wins'].get(winner, 0) + count
+    for field in ('rounds', 'person_damage', 'dragon_damage', 'critical_hits', 'saved', 'save_errors'):
+        total[field] += part[field]
+    if part['min_rounds'] is not None:
+        total['min_rounds'] = part['min_rounds'] if total['min_rounds'] is None else min(total['min_rounds'], part['min_rounds'])
+    total['max_rounds'] = max(total['max_rounds'], part['max_rounds'])
+    return total
+
+
+def run_chunk(difficulty, count, seed, save=False, player_name=DEFAULT_PLAYER_NAME):
+    """
+    在目前的行程中跑 count 場託管對戰，回傳可相加的部分統計
+    save=True 時一次向 Redis 取 count 個 game_id，並逐場存檔；
+    批次遊戲不寫 Stream，回放由存檔的種子與輸入重新產生
+    """
+    rng = random.Random(seed)
+    characters = load_character_configs()
+    totals = _empty_totals()
+
+    game_ids = [0] * count
+    if save and redis_client:
+        last_id = redis_client.incrby('game:id:counter', count)
+        game_ids = range(last_id - count + 1, last_id + 1)
+
+    for game_id in game_ids:
+        game = WebBattleGame(game_id, player_name, difficulty, seed=rng.getrandbits(32), characters=characters)
+        game.persist_on_end = False
+        game.verbose = False
+        game.event_log = BattleEventLog(game_id, flush_policy='off')
+        while not game.is_game_over:
+            game.process_turn(is_auto=True)
+
+        if save and redis_client:
+            result = game.persist_result()
+            if result['status'] == 'committed':
+                totals['saved'] += 1
+            else:
+                totals['save_errors'] += 1
+
+        totals['games'] += 1
+        totals['wins'][game.winner] = totals['wins'].get(game.winner, 0) + 1
+        totals['rounds'] += game.final_round
+        totals['min_rounds'] = game.final_round if totals['min_rounds'] is None else min(totals['min_rounds'], game.final_round)
+        totals['max_rounds'] = max(totals['max_rounds'], game.final_round)
+        totals['person_damage'] += game.person.total_damage_dealt
+        totals['dragon_damage'] += game.dragon.total_damage_dealt
+        totals['critical_hits'] += game.person.critical_hits + game.dragon.critical_hits
+    return totals
+
+
+def simulate_batch(games, difficulty='normal', workers=None, save=False, player_name=DEFAULT_PLAYER_NAME,
+                   seed=None, chunk_size=None):
+    """
+    把 games 場分成多個區塊交給 ProcessPoolExecutor，彙總成一份結果
+    workers: 行程數 (預設且最多為 CPU 核心數，1 表示在目前行程執行)
+    seed: 整批的種子，相同種子與參數會得到相同的統計
+    """
+    start = time.perf_counter()
+    workers = max(1, min(workers or os.cpu_count() or 1, os.cpu_count() or 1))
+    chunk_size = chunk_size or max(1, -(-games // (workers * 4)))  # 每個行程約 4 個區塊，平衡負載
+
+    seed_rng = random.Random(seed)
+    chunks = []
+    remaining = games
+    while remaining > 0:
+        count = min(chunk_size, remaining)
+        chunks.append((difficulty, count, seed_rng.getrandbits(32), save, player_name))
+        remaining -= count
+
+    totals = _empty_totals()
+    if workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            _merge_totals(totals, run_chunk(*chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for part in executor.map(run_chunk, *zip(*chunks)):
+                _merge_totals(totals, part)
+
+    elapsed = time.perf_counter() - start
+    played = totals['games'] or 1
+    return {
+        'difficulty': difficulty,
+        'games': totals['games'],
+        'workers': workers,
+        'person_win_rate': round(totals['wins'].get('勇者', 0) / played * 100, 3),
+        'dragon_win_rate': round(totals['wins'].get('龍王', 0) / played * 100, 3),
+        'wins': totals['wins'],
+        'avg_rounds': round(totals['rounds'] / played, 3),
+        'min_rounds': totals['min_rounds'],
+        'max_rounds': totals['max_rounds'],
+        'avg_damage': {
+            'person': round(totals['person_damage'] / played, 3),
+            'dragon': round(totals['dragon_damage'] / played, 3)
+        },
+        'avg_critical_hits': round(totals['critical_hits'] / played, 3),
+        'saved': totals['saved'],
+        'save_errors': totals['save_errors'],
+        'elapsed_seconds': round(elapsed, 3),
+        'games_per_second': round(totals['games'] / elapsed, 1) if elapsed > 0 else 0
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='龍王 vs 勇者 - 無介面批次對戰')
+    parser.add_argument('--games', type=int, default=1000, help='對戰場數')
+    parser.add_argument('--difficulty', choices=list(DIFFICULTY_SETTINGS), default='normal', help='難度')
+    parser.add_argument('--workers', type=int, default=None, help='行程數 (預設 CPU 核心數)')
+    parser.add_argument('--save', action='store_true', help='逐場存入 Redis (與網頁版相同的存檔)')
+    parser.add_argument('--player-name', default=DEFAULT_PLAYER_NAME, help='存檔使用的玩家名稱')
+    parser.add_argument('--seed', type=int, default=None, help='亂數種子')
+    parser.add_argument('--json', action='store_true', help='結果以一行 JSON 輸出在 stdout 最後一行')
+
+    args = parser.parse_args()
+
+    if args.json:
+        # 之後的存檔與結束日誌改寫到 stderr，結果固定是 stdout 的最後一行
+        sys.stdout = sys.stderr
+    result = simulate_batch(args.games, args.difficulty, workers=args.workers, save=args.save,
+                            player_name=args.player_name, seed=args.seed)
+
+    if args.json:
+        sys.__stdout__.write(json.dumps(result, ensure_ascii=False) + '\n')
+        sys.__stdout__.flush()
+    else:
+        print(f"[{result['difficulty']}] {result['games']} 場 ({result['elapsed_seconds']}s, "
+              f"{result['games_per_second']} 場/秒, {result['workers']} 行程) | 勇者勝率 {result['person_win_rate']}% "
+              f"| 平均回合 {result['avg_rounds']} | 已存檔 {result['saved']} 場")
@@ -0,0 +1,405 @@
+# simulation.py
+"""
+向量化蒙地卡羅對戰模擬器
+
+一次以 NumPy 陣列同時模擬大量「勇者 vs 龍王」自動對戰，用來檢查難度平衡。
+規則與純邏輯戰鬥核心 (combat.Combatant) 相同：
+
+- 攻擊 / 治療 / 大絕的數值與冷卻：Combatant.attack
+- 暴擊判定：Combatant._check_critical (基礎 10%，難度加成，限制在 1-50%)
+- 龍王 AI：Combatant._get_ai_choice (easy / normal / hard)
+- 勇者 AI：web = combat.auto_player_choice (WebBattleGame 託管)，
+           gui = combat.ai_choose_skill (run_gui_game 自動模式)
+- 血量加成：config.DIFFICULTY_SETTINGS
+
+rules='web' 對應 WebBattleGame (每回合雙方 CD 都遞減)；
+rules='gui' 對應 run_gui_game (只有勇者的 CD 會遞減)。
+
+用法:
+    python simulation.py --battles 1000000
+    python simulation.py --difficulty hard --policy gui --rules gui --json result.json
+    python simulation.py --check 20000   # 與純量引擎比對
+"""
+import argparse
+import json
+import time
+import numpy as np
+from config import DIFFICULTY_SETTINGS
+
+# 與 Combatant 相同的常數
+MAX_COOLDOWNS = {2: 2, 3: 5}
+BASE_CRIT_CHANCE = 10
+CRIT_RATE_BONUS = {'easy': -5, 'normal': 0, 'hard': 5}
+PERSON_INITIAL_ULT_CD = 2
+BASE_HP = 20
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+DEFAULT_MAX_ROUNDS = 200
+
+
+def _effective_crit(difficulty):
+    return max(1, min(BASE_CRIT_CHANCE + CRIT_RATE_BONUS.get(difficulty, 0), 50))
+
+
+def _apply_action(rng, choice, hp, max_hp, cd2, cd3, enemy_hp, dmg, heal, crits, crit_chance):
+    """
+    對一批角色同時執行 Combatant.attack (就地修改陣列)
+    choice: 1 普攻 / 2 治療 / 3 大絕
+    """
+    # 設定冷卻
+    cd2[choice == 2] = MAX_COOLDOWNS[2]
+    cd3[choice == 3] = MAX_COOLDOWNS[3]
+
+    # 暴擊判定：random.randint(1, 100) <= effective_crit
+    is_crit = rng.integers(1, 101, size=choice.shape[0]) <= crit_chance
+    is_attack = choice != 2
+    is_crit &= is_attack
+
+    damage = np.where(choice == 1, np.where(is_crit, 4, 2),
+                      np.where(choice == 3, np.where(is_crit, 10, 5), 0))
+    enemy_hp -= damage
+    dmg += damage
+    crits += is_crit
+
+    # 治療：+4，不超過初始血量
+    healed = np.where(choice == 2, np.minimum(hp + 4, max_hp), hp)
+    heal += healed - hp
+    hp[:] = healed
+
+
+def _person_choice_web(rng, p_hp, p_max, p_cd2, p_cd3):
+    """combat.auto_player_choice 的向量版本"""
+    avail2 = p_cd2 == 0
+    avail3 = p_cd3 == 0
+    low_hp = p_hp / p_max < 0.4
+    # random.choice(available)，此時 available 只可能是 [1] 或 [1, 2]
+    pick = np.where(avail2 & (rng.random(p_hp.shape[0]) >= 0.5), 2, 1)
+    return np.where(low_hp & avail2, 2, np.where(avail3, 3, pick))
+
+
+def _person_choice_gui(rng, p_hp, p_max, p_cd2, p_cd3, d_hp, d_max):
+    """combat.ai_choose_skill 的向量版本"""
+    n = p_hp.shape[0]
+    avail2 = p_cd2 == 0
+    avail3 = p_cd3 == 0
+    person_ratio = p_hp / p_max
+    dragon_ratio = d_hp / d_max
+    u_ult, u_pick = rng.random(n), rng.random(n)
+
+    # random.choice(attack_skills)，attack_skills 只可能是 [1] 或 [1, 3]
+    pick = np.where(avail3 & (u_pick >= 0.5), 3, 1)
+    choice = np.where(dragon_ratio < 0.6, np.where(avail3 & (u_ult < 0.3), 3, pick), pick)
+    choice = np.where((dragon_ratio < 0.3) & avail3, 3, choice)
+    return np.where((person_ratio < 0.4) & avail2, 2, choice)
+
+
+def _dragon_choice(rng, difficulty, d_hp, d_cd2, d_cd3, p_hp):
+    """Combatant._get_ai_choice 的向量版本"""
+    n = d_hp.shape[0]
+
+    if difficulty == 'easy':
+        roll = rng.random(n)
+        return np.where(roll < 0.70, 1, np.where(roll < 0.95, 2, 3))
+
+    if difficulty == 'hard':
+        u1, u2, u3, roll = rng.random(n), rng.random(n), rng.random(n), rng.random(n)
+        ready2 = d_cd2 == 0
+        ready3 = d_cd3 == 0
+
+        # 策略 4 (自己血量 > 12) 與預設策略共用同一個 roll，兩者互斥
+        healthy = np.where(roll < 0.60, 1, np.where((roll < 0.70) & ready2, 2, np.where(ready3, 3, 1)))
+        default = np.where(roll < 0.5, 1, np.where((roll < 0.75) & ready2, 2, np.where(ready3, 3, 1)))
+        choice = np.where(d_hp > 12, healthy, default)
+
+        # 依序套用策略 3、2、1 (越前面的策略優先)
+        choice = np.where((p_hp > 6) & (p_hp <= 12) & ready3 & (u3 < 0.4), 3, choice)
+        choice = np.where((p_hp <= 6) & ready3 & (u2 < 0.7), 3, choice)
+        return np.where((d_hp < 8) & ready2 & (u1 < 0.8), 2, choice)
+
+    # normal (預設)
+    roll = rng.random(n)
+    return np.where(roll > 0.3, 1, np.where(((roll > 0.1) & (roll <= 0.3)) | (d_hp == 1), 2, 3))
+
+
+def _simulate_chunk(rng, difficulty, n, policy, rules, max_rounds):
+    """模擬 n 場對戰，回傳每場的原始結果陣列"""
+    settings = DIFFICULTY_SETTINGS.get(difficulty, DIFFICULTY_SETTINGS['normal'])
+    p_max_hp = BASE_HP + settings['player_hp_bonus']
+    d_max_hp = BASE_HP + settings['dragon_hp_bonus']
+    p_crit = _effective_crit('normal')   # 勇者固定為 normal 難度
+    d_crit = _effective_crit(difficulty)
+
+    # 進行中的對戰狀態 (每回合把已結束的場次壓縮掉，只對剩下的場次運算)
+    zeros = lambda: np.zeros(n, dtype=np.int32)
+    state = {
+        'p_hp': np.full(n, p_max_hp, dtype=np.int32), 'd_hp': np.full(n, d_max_hp, dtype=np.int32),
+        'p_cd2': zeros(), 'p_cd3': np.full(n, PERSON_INITIAL_ULT_CD, dtype=np.int32),
+        'd_cd2': zeros(), 'd_cd3': zeros(),
+        'p_dmg': zeros(), 'd_dmg': zeros(), 'p_heal': zeros(), 'd_heal': zeros(),
+        'p_crits': zeros(), 'd_crits': zeros(),
+        'id': np.arange(n)
+    }
+
+    # 每場的最終結果
+    rounds = np.full(n, max_rounds, dtype=np.int32)
+    winner = np.zeros(n, dtype=np.int8)  # 0 未分勝負 / 1 勇者 / 2 龍王
+    final = {key: zeros() for key in ('p_dmg', 'd_dmg', 'p_heal', 'd_heal', 'p_crits', 'd_crits')}
+
+    for current_round in range(1, max_rounds + 1):
+        if state['id'].size == 0:
+            break
+        st = state
+
+        # === 1. 勇者行動 ===
+        if policy == 'gui':
+            choice = _person_choice_gui(rng, st['p_hp'], p_max_hp, st['p_cd2'], st['p_cd3'], st['d_hp'], d_max_hp)
+        else:
+            choice = _person_choice_web(rng, st['p_hp'], p_max_hp, st['p_cd2'], st['p_cd3'])
+        _apply_action(rng, choice, st['p_hp'], p_max_hp, st['p_cd2'], st['p_cd3'],
+                      st['d_hp'], st['p_dmg'], st['p_heal'], st['p_crits'], p_crit)
+
+        # === 2. 龍王行動 (只有龍王還活著的場次) ===
+        alive = st['d_hp'] > 0
+        idx = np.flatnonzero(alive)
+        sub = {key: st[key][idx] for key in ('d_hp', 'p_hp', 'd_cd2', 'd_cd3', 'd_dmg', 'd_heal', 'd_crits')}
+        d_choice = _dragon_choice(rng, difficulty, sub['d_hp'], sub['d_cd2'], sub['d_cd3'], sub['p_hp'])
+        _apply_action(rng, d_choice, sub['d_hp'], d_max_hp, sub['d_cd2'], sub['d_cd3'],
+                      sub['p_hp'], sub['d_dmg'], sub['d_heal'], sub['d_crits'], d_crit)
+        for key, values in sub.items():
+            st[key][idx] = values
+
+        # === 3. 回合結算 ===
+        person_won = ~alive
+        dragon_won = alive & (st['p_hp'] <= 0)
+        finished = person_won | dragon_won
+
+        np.maximum(st['p_cd2'] - 1, 0, out=st['p_cd2'])
+        np.maximum(st['p_cd3'] - 1, 0, out=st['p_cd3'])
+        if rules == 'web':
+            np.maximum(st['d_cd2'] - 1, 0, out=st['d_cd2'])
+            np.maximum(st['d_cd3'] - 1, 0, out=st['d_cd3'])
+
+        # 記錄已結束場次的結果，並從進行中的狀態移除
+        if finished.any():
+            done = st['id'][finished]
+            rounds[done] = current_round
+            winner[st['id'][person_won]] = 1
+            winner[st['id'][dragon_won]] = 2
+            for key in final:
+                final[key][done] = st[key][finished]
+            keep = ~finished
+            state = {key: values[keep] for key, values in st.items()}
+
+    # 超過回合上限仍未結束的場次
+    for key in final:
+        final[key][state['id']] = state[key]
+
+    return {
+        'winner': winner, 'rounds': rounds,
+        'person_damage': final['p_dmg'], 'dragon_damage': final['d_dmg'],
+        'person_healing': final['p_heal'], 'dragon_healing': final['d_heal'],
+        'person_crits': final['p_crits'], 'dragon_crits': final['d_crits']
+    }
+
+
+
+def _merge_bincount(total, values):
+    counts = np.bincount(values)
+    if total is None:
+        return counts
+    size = max(total.size, counts.size)
+    return np.pad(total, (0, size - total.size)) + np.pad(counts, (0, size - counts.size))
+
+
+def _summary_from_counts(counts):
+    """從 bincount 結果計算平均與百分位數"""
+    values = np.arange(counts.size)
+    n = int(counts.sum())
+    if n == 0:
+        return {'mean': 0, 'p50': 0, 'p90': 0, 'p99': 0, 'max': 0, 'histogram': {}}
+    cumulative = np.cumsum(counts)
+    percentile = lambda q: int(np.searchsorted(cumulative, q * n))
+    return {
+        'mean': round(float((values * counts).sum() / n), 3),
+        'p50': percentile(0.50),
+        'p90': percentile(0.90),
+        'p99': percentile(0.99),
+        'max': int(np.flatnonzero(counts)[-1]),
+        'histogram': {int(v): int(c) for v, c in enumerate(counts) if c}
+    }
+
+
+def simulate(difficulty='normal', battles=100_000, seed=None, policy='web', rules='web',
+             max_rounds=DEFAULT_MAX_ROUNDS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    模擬指定難度的大量自動對戰
+
+    參數:
+        difficulty: 'easy' / 'normal' / 'hard'
+        battles: 對戰場數
+        seed: 亂數種子 (相同種子結果相同)
+        policy: 勇者 AI，'web' (WebBattleGame 託管) 或 'gui' (run_gui_game 自動模式)
+        rules: 'web' (雙方 CD 都遞減) 或 'gui' (只有勇者 CD 遞減)
+        max_rounds: 單場回合上限，超過視為未分勝負
+        chunk_size: 每批同時模擬的場數 (控制記憶體用量)
+
+    回傳: 勝率、回合數分佈與傷害分佈
+    """
+    rng = np.random.default_rng(seed)
+    wins = np.zeros(3, dtype=np.int64)
+    counts = {}
+    sums = {'person_healing': 0, 'dragon_healing': 0, 'person_crits': 0, 'dragon_crits': 0}
+
+    start = time.perf_counter()
+    remaining = battles
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        result = _simulate_chunk(rng, difficulty, n, policy, rules, max_rounds)
+        wins += np.bincount(result['winner'], minlength=3)
+        for key in ('rounds', 'person_damage', 'dragon_damage'):
+            counts[key] = _merge_bincount(counts.get(key), result[key])
+        for key in sums:
+            sums[key] += int(result[key].sum())
+        remaining -= n
+    elapsed = time.perf_counter() - start
+
+    rate = lambda count: round(int(count) / battles * 100, 3) if battles > 0 else 0
+    per_game = lambda total: round(total / battles, 3) if battles > 0 else 0
+    return {
+        'difficulty': difficulty,
+        'battles': battles,
+        'policy': policy,
+        'rules': rules,
+        'seed': seed,
+        'person_win_rate': rate(wins[1]),
+        'dragon_win_rate': rate(wins[2]),
+        'unfinished_rate': rate(wins[0]),
+        'rounds': _summary_from_counts(counts['rounds']),
+        'damage': {
+            'person': _summary_from_counts(counts['person_damage']),
+            'dragon': _summary_from_counts(counts['dragon_damage'])
+        },
+        'avg_healing': {'person': per_game(sums['person_healing']), 'dragon': per_game(sums['dragon_healing'])},
+        'avg_crits': {'person': per_game(sums['person_crits']), 'dragon': per_game(sums['dragon_crits'])},
+        'elapsed_seconds': round(elapsed, 3),
+        'battles_per_second': int(battles / elapsed) if elapsed > 0 else 0
+    }
+
+
+def simulate_all(battles=100_000, seed=None, **kwargs):
+    """對每個難度各模擬 battles 場"""
+    rng = np.random.default_rng(seed)
+    return {
+        difficulty: simulate(difficulty, battles, seed=int(rng.integers(2 ** 32)), **kwargs)
+        for difficulty in DIFFICULTY_SETTINGS
+    }
+
+
+def run_scalar_battles(difficulty='normal', battles=10_000, seed=None, policy='web', rules='web',
+                       max_rounds=DEFAULT_MAX_ROUNDS):
+    """
+    以純量引擎 (combat.Combatant) 逐場模擬，作為向量版本的對照組
+    流程與 WebBattleGame.process_turn 相同 (rules='gui' 時龍王 CD 不遞減)
+    """
+    import random
+    from combat import Combatant, ai_choose_skill, auto_player_choice, apply_difficulty_hp
+
+    random.seed(seed)
+    wins = {0: 0, 1: 0, 2: 0}
+    rounds_total = 0
+    person_damage_total = 0
+    dragon_damage_total = 0
+
+    for _ in range(battles):
+        dragon, person = Combatant('龍王'), Combatant('勇者')
+        dragon.set_difficulty(difficulty)
+        apply_difficulty_hp(dragon, person, difficulty)
+
+        result, turn = 0, 1
+        while turn <= max_rounds:
+            choice = ai_choose_skill(person, dragon) if policy == 'gui' else auto_player_choice(person)
+            person.attack(dragon, choice=choice)
+            if dragon.hp <= 0:
+                result = 1
+                break
+            dragon.attack(person)
+            if person.hp <= 0:
+                result = 2
+                break
+            person.decrement_cooldowns()
+            if rules == 'web':
+                dragon.decrement_cooldowns()
+            turn += 1
+
+        wins[result] += 1
+        rounds_total += min(turn, max_rounds)
+        person_damage_total += person.total_damage_dealt
+        dragon_damage_total += dragon.total_damage_dealt
+
+    return {
+        'difficulty': difficulty,
+        'battles': battles,
+        'person_win_rate': round(wins[1] / battles * 100, 3),
+        'dragon_win_rate': round(wins[2] / battles * 100, 3),
+        'unfinished_rate': round(wins[0] / battles * 100, 3),
+        'avg_rounds': round(rounds_total / battles, 3),
+        'avg_damage': {
+            'person': round(person_damage_total / battles, 3),
+            'dragon': round(dragon_damage_total / battles, 3)
+        }
+    }
+
+
+def compare_with_scalar(difficulty='normal', scalar_battles=20_000, vector_battles=1_000_000, seed=None,
+                        policy='web', rules='web'):
+    """比較向量版與純量版的結果，回傳兩邊的指標與差距"""
+    vector = simulate(difficulty, vector_battles, seed=seed, policy=policy, rules=rules)
+    scalar = run_scalar_battles(difficulty, scalar_battles, seed=seed, policy=policy, rules=rules)
+    return {
+        'difficulty': difficulty,
+        'vector': {
+            'person_win_rate': vector['person_win_rate'],
+            'avg_rounds': vector['rounds']['mean'],
+            'avg_damage': {'person': vector['damage']['person']['mean'], 'dragon': vector['damage']['dragon']['mean']}
+        },
+        'scalar': scalar,
+        'diff': {
+            'person_win_rate': round(vector['person_win_rate'] - scalar['person_win_rate'], 3),
+            'avg_rounds': round(vector['rounds']['mean'] - scalar['avg_rounds'], 3)
+        }
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='龍王 vs 勇者 - 向量化對戰模擬')
+    parser.add_argument('--battles', type=int, default=1_000_000, help='每個難度的模擬場數')
+    parser.add_argument('--difficulty', choices=['easy', 'normal', 'hard', 'all'], default='all', help='難度')
+    parser.add_argument('--policy', choices=['web', 'gui'], default='web', help='勇者 AI 策略')
+    parser.add_argument('--rules', choices=['web', 'gui'], default='web', help='回合規則')
+    parser.add_argument('--seed', type=int, default=None, help='亂數種子')
+    parser.add_argument('--max-rounds', type=int, default=DEFAULT_MAX_ROUNDS, help='單場回合上限')
+    parser.add_argument('--check', type=int, default=0, metavar='N', help='另以純量引擎跑 N 場比對結果')
+    parser.add_argument('--json', default=None, help='將結果輸出成 JSON 檔')
+
+    args = parser.parse_args()
+    difficulties = list(DIFFICULTY_SETTINGS) if args.difficulty == 'all' else [args.difficulty]
+
+    results = {}
+    for difficulty in difficulties:
+        if args.check:
+            results[difficulty] = compare_with_scalar(difficulty, args.check, args.battles, seed=args.seed,
+                                                      policy=args.policy, rules=args.rules)
+            r = results[difficulty]
+            print(f"[{difficulty}] 勇者勝率 向量 {r['vector']['person_win_rate']}% / 純量 {r['scalar']['person_win_rate']}% "
+                  f"| 平均回合 向量 {r['vector']['avg_rounds']} / 純量 {r['scalar']['avg_rounds']}")
+        else:
+            results[difficulty] = simulate(difficulty, args.battles, seed=args.seed, policy=args.policy,
+                                           rules=args.rules, max_rounds=args.max_rounds)
+            r = results[difficulty]
+            print(f"[{difficulty}] {r['battles']} 場 ({r['elapsed_seconds']}s) | 勇者勝率 {r['person_win_rate']}% "
+                  f"| 龍王勝率 {r['dragon_win_rate']}% | 平均回合 {r['rounds']['mean']} (p99 {r['rounds']['p99']})")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {args.json}")
@@ -0,0 +1,196 @@
+# state_protocol.py
+from collections import OrderedDict
+from config import STATE_DELTA_ENABLED, STATE_KEYFRAME_INTERVAL
+
+try:
+    import msgpack
+except ImportError:  # 選用套件：沒安裝時只提供 JSON 編碼
+    msgpack = None
+
+# 攤平後的欄位路徑 -> 短鍵 (前端 state_protocol.js 有相同的對照表)
+SHORT_KEYS = {
+    'game_id': 'g',
+    'round': 'r',
+    'total_rounds': 'tr',
+    'winner': 'w',
+    'game_over': 'o',
+    'consecutive_crits': 'cc',
+    'turn_events': 'ev',
+    'action_type': 'a',
+    'last_actor': 'la',
+    'dragon.hp': 'dh',
+    'dragon.max_hp': 'dm',
+    'person.hp': 'ph',
+    'person.max_hp': 'pm',
+    'person.cooldowns.1': 'c1',
+    'person.cooldowns.2': 'c2',
+    'person.cooldowns.3': 'c3',
+}
+
+# turn_events 每筆改成 [類型, 目標, 數值, 是否暴擊]
+EVENT_TYPES = {'damage': 'd', 'heal': 'h'}
+EVENT_TARGETS = {'dragon': 'd', 'person': 'p'}
+
+ENCODINGS = ('msgpack', 'json') if msgpack is not None else ('json',)
+
+
+def _pack_events(events):
+    packed = []
+    for event in events:
+        item = [EVENT_TYPES.get(event.get('type'), event.get('type')),
+                EVENT_TARGETS.get(event.get('target'), event.get('target')),
+                event.get('value')]
+        if event.get('is_crit'):
+            item.append(1)
+        packed.append(item)
+    return packed
+
+
+def flatten_state(state, prefix=''):
+    """把巢狀的狀態 dict 攤平成 {短鍵: 值}，未列在 SHORT_KEYS 的欄位保留完整路徑"""
+    flat = {}
+    for key, value in state.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten_state(value, path + '.'))
+        elif path == 'turn_events':
+            flat[SHORT_KEYS[path]] = _pack_events(value)
+        else:
+            flat[SHORT_KEYS.get(path, path)] = value
+    return flat
+
+
+def negotiate(hello):
+    """
+    依客戶端的 protocol_hello 決定傳輸方式
+    hello: {'delta': bool, 'encodings': ['msgpack', 'json']}
+    伺服器未開啟 STATE_DELTA_ENABLED 時一律回到完整 JSON (舊格式)
+    """
+    hello = hello or {}
+    delta = STATE_DELTA_ENABLED and bool(hello.get('delta'))
+    encoding = 'json'
+    if delta:
+        for name in hello.get('encodings') or []:
+            if name in ENCODINGS:
+                encoding = name
+                break
+    return {'delta': delta, 'encoding': encoding, 'keyframe_interval': STATE_KEYFRAME_INTERVAL}
+
+
+def pack_message(message, encoding):
+    """msgpack 編碼時回傳 bytes (Socket.IO 以二進位附件傳送)，否則原樣交給 JSON"""
+    if encoding == 'msgpack' and msgpack is not None:
+        return msgpack.packb(message)
+    return message
+
+
+class DeltaEncoder:
+    """
+    單一狀態串流 (某客戶端的某場遊戲，或某場遊戲的觀戰 room) 的差異編碼器
+
+    訊息格式 (短鍵)：
+        s  序號，每次 encode 加一
+        k  1 表示關鍵影格，d 為完整狀態
+        b  差異的基準序號，d 只包含與基準不同的欄位，x 為基準有但這次沒有的欄位
+        id 遊戲編號 (前端用來分辨串流)
+
+    acked=True  時以客戶端最後確認 (ack) 的序號為基準，訊息遺失也能正確還原；
+    acked=False 時 (room 廣播，無法逐一確認) 以上一筆送出的訊息為基準，
+    前端發現缺號就送 state_resync 取得關鍵影格。
+    每 keyframe_interval 筆、或基準已不在保留範圍內時，強制送出關鍵影格。
+    """
+    def __init__(self, stream_id, keyframe_interval=None, acked=True):
+        self.stream_id = stream_id
+        self.keyframe_interval = max(1, keyframe_interval or STATE_KEYFRAME_INTERVAL)
+        self.acked = acked
+        self.seq = 0
+        self._snapshots = OrderedDict()  # seq -> 攤平後的狀態
+        self._base_seq = None
+        self._since_keyframe = 0
+
+    def encode(self, state):
+        flat = flatten_state(state)
+        self.seq += 1
+        base = self._snapshots.get(self._base_seq) if self._base_seq is not None else None
+
+        if base is None or self._since_keyframe >= self.keyframe_interval:
+            message = {'id': self.stream_id, 's': self.seq, 'k': 1, 'd': flat}
+            self._since_keyframe = 0
+        else:
+            message = {
+                'id': self.stream_id, 's': self.seq, 'b': self._base_seq,
+                'd': {k: v for k, v in flat.items() if k not in base or base[k] != v}
+            }
+            removed = [k for k in base if k not in flat]
+            if removed:
+                message['x'] = removed
+            self._since_keyframe += 1
+
+        self._snapshots[self.seq] = flat
+        while len(self._snapshots) > self.keyframe_interval + 1:
+            self._snapshots.popitem(last=False)
+        if not self.acked:
+            self._base_seq = self.seq
+        return message
+
+    def ack(self, seq):
+        """客戶端確認已套用 seq，之後的差異以它為基準"""
+        if seq in self._snapshots and (self._base_seq is None or seq > self._base_seq):
+            self._base_seq = seq
+            for old in [s for s in self._snapshots if s < seq]:
+                del self._snapshots[old]
+
+    def keyframe(self):
+        """以最後送出的狀態產生關鍵影格 (序號不變)，給 state_resync 使用"""
+        flat = self._snapshots.get(self.seq)
+        if flat is None:
+            return None
+        return {'id': self.stream_id, 's': self.seq, 'k': 1, 'd': flat}
+
+
+# --- 觀戰 room 的編碼器 (單例模式) ---
+class RoomEncoders:
+    """每場遊戲一個的 room 廣播編碼器 (不需逐一確認，缺號由前端 state_resync 補關鍵影格)"""
+    _encoders = {}
+
+    @classmethod
+    def get(cls, game_id):
+        encoder = cls._encoders.get(game_id)
+        if encoder is None:
+            encoder = cls._encoders[game_id] = DeltaEncoder(game_id, acked=False)
+        return encoder
+
+    @classmethod
+    def peek(cls, game_id):
+        return cls._encoders.get(game_id)
+
+    @classmethod
+    def drop(cls, game_id):
+        cls._encoders.pop(game_id, None)
+
+
+def client_mode(protocol):
+    """客戶端協定對應的狀態 room 後綴：full (舊格式) / delta:json / delta:msgpack"""
+    if protocol and protocol.get('delta'):
+        return f"delta:{protocol['encoding']}"
+    return 'full'
+
+
+def state_room(room, mode):
+    """
+    遊戲狀態 (web_game_update) 依協定分開的 room
+
+    每個客戶端同時在遊戲 room (game_over 等事件) 與其中一個狀態 room，
+    完整 JSON 只送給 full，差異訊息依編碼送給 delta:json / delta:msgpack。
+    """
+    return f'{room}:{mode}'
+
+
+def emit_room_state(socketio, event, state, game_id, room):
+    """依協定把狀態送給遊戲 room 中的客戶端 (差異訊息的事件名稱加上 _d)"""
+    socketio.emit(event, state, to=state_room(room, 'full'))
+    if not STATE_DELTA_ENABLED:
+        return
+    message = RoomEncoders.get(game_id).encode(state)
+    for encoding in ENCODINGS:
+        socketio.emit(event + '_d', pack_message(message, encoding), to=state_room(room, f'delta:{encoding}'))
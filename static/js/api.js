@@ -2,8 +2,9 @@
 let reconnectAttempts = 0;
 const MAX_RECONNECT_ATTEMPTS = 5;
 
-function initWebSocket() {
-    try {
+// 頁面共用的 Socket.IO 連線 (api.js 與 game.js 使用同一條，狀態協定只協商一次)
+function getGameSocket() {
+    if (!window.GameConfig.socket) {
         window.GameConfig.socket = io({
             transports: ['websocket', 'polling'],
             reconnection: true,
@@ -11,10 +12,30 @@ function initWebSocket() {
             reconnectionDelayMax: 5000,
             reconnectionAttempts: MAX_RECONNECT_ATTEMPTS
         });
+        if (typeof initStateProtocol === 'function') initStateProtocol(window.GameConfig.socket);
+    }
+    return window.GameConfig.socket;
+}
+
+// 沒有載入 state_protocol.js 的頁面 (歷史紀錄) 連線後就能加入 room
+function isRoomJoinReady(socket) {
+    return typeof stateProtocol === 'undefined' ? socket.connected : stateProtocol.ready;
+}
+
+// 加入儀表板與目前遊戲的 room (斷線重連後 room 會消失，每次連線都要重新加入)
+function joinSocketRooms() {
+    const socket = window.GameConfig.socket;
+    socket.emit('join_dashboard');
+    if (window.GameConfig.joinedGameId !== undefined && window.GameConfig.joinedGameId !== null) {
+        socket.emit('join_game', { game_id: window.GameConfig.joinedGameId });
+    }
+}
 
-        const socket = window.GameConfig.socket;
+function initWebSocket() {
+    try {
+        const socket = getGameSocket();
 
-        socket.on('connect', () => {
+        const onConnect = () => {
             // console.log('[WebSocket] 已連接');
             reconnectAttempts = 0;
             updateConnectionStatus(true);
@@ -25,7 +46,18 @@ function initWebSocket() {
                 duration: 3000 
             });
             socket.emit('request_initial_data');
-        });
+        };
+        socket.on('connect', onConnect);
+        // game.js 載入時就建立了連線，可能在這之前已經連上
+        if (socket.connected) onConnect();
+
+        // 協商完傳輸方式才加入 room，後端才會把這條連線放進對應的狀態 room
+        if (typeof onProtocolReady === 'function') {
+            onProtocolReady(joinSocketRooms);
+        } else {
+            socket.on('connect', joinSocketRooms);
+            if (socket.connected) joinSocketRooms();
+        }
 
         socket.on('connect_error', (error) => {
             // console.error('[WebSocket] 連接錯誤:', error);
@@ -48,6 +80,13 @@ function initWebSocket() {
             handleGameUpdate(data);
         });
 
+        // 已加入 room 的遊戲狀態 (web 顯示模式的遊戲由後端推送 web_game_update / web_game_update_d)
+        if (typeof onStateEvent === 'function') {
+            onStateEvent(socket, 'web_game_update', handleRoomGameState);
+        } else {
+            socket.on('web_game_update', handleRoomGameState);
+        }
+
         // 監聯遊戲結束事件
         socket.on('game_over', (data) => {
             // console.log('[WebSocket] 收到 game_over:', data);
@@ -63,6 +102,58 @@ function initWebSocket() {
     }
 }
 
+// 加入某場遊戲的 room，之後只會收到該場的狀態更新與結束通知
+// 尚未協商完成時只記下 game_id，協商完成後由 joinSocketRooms 加入
+function joinGameRoom(gameId) {
+    if (gameId === undefined || gameId === null) return;
+    const socket = window.GameConfig.socket;
+    const previous = window.GameConfig.joinedGameId;
+    window.GameConfig.joinedGameId = gameId;
+    if (!socket) return;
+    if (previous !== undefined && previous !== null && previous !== gameId) {
+        socket.emit('leave_game', { game_id: previous });
+    }
+    if (isRoomJoinReady(socket)) socket.emit('join_game', { game_id: gameId });
+}
+
+// 目前加入的遊戲的狀態更新：更新血量與行動提示
+function handleRoomGameState(state) {
+    if (String(state.game_id) !== String(window.GameConfig.joinedGameId)) return;
+    const dHpEl = document.getElementById('dragonHp');
+    const pHpEl = document.getElementById('personHp');
+    if (dHpEl && state.dragon) dHpEl.innerText = Math.max(0, state.dragon.hp);
+    if (pHpEl && state.person) pHpEl.innerText = Math.max(0, state.person.hp);
+
+    const battleStatus = document.getElementById('battleStatus');
+    if (battleStatus && state.last_actor) {
+        const attackerName = state.last_actor === 'person' ? '勇者' : '龍王';
+        const color = state.last_actor === 'person' ? 'var(--person-color)' : 'var(--dragon-color)';
+        battleStatus.innerHTML = `<span style="color: ${color};">${attackerName} 行動中...</span>`;
+    }
+}
+
+// 戰鬥回放分頁讀取：每收到一頁就呼叫 onPage(events, pageIndex)，播放不必等整場讀完
+// onPage 回傳 false 時停止讀取後續頁面 (例如已切換到別場回放)
+const REPLAY_PAGE_SIZE = 50;
+
+async function fetchReplayPages(gameId, onPage) {
+    let cursor = null;
+    let pageIndex = 0;
+    let total = 0;
+    do {
+        const params = new URLSearchParams({ limit: REPLAY_PAGE_SIZE });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/api/game/${gameId}/replay?${params}`);
+        const page = await response.json();
+        if (page.error) throw new Error(page.error);
+
+        total += page.events.length;
+        if (page.events.length > 0 && onPage(page.events, pageIndex++) === false) break;
+        cursor = page.next_cursor;
+    } while (cursor);
+    return total;
+}
+
 // ★★★ 處理遊戲更新 ★★★
 function handleGameUpdate(data) {
     // console.log('[handleGameUpdate] 處理數據:', data);
@@ -275,9 +366,11 @@ async function loadAllHistory() {
     if (!container) return; 
 
     try {
-        const response = await fetch('/api/all_games');
+        // 只取第一頁，完整列表請見 history.js 的分頁載入
+        const response = await fetch('/api/games?limit=30');
         if (!response.ok) throw new Error('API 回應錯誤');
-        const games = await response.json();
+        const page = await response.json();
+        const games = page.games;
         
         if (!games || games.length === 0) {
             container.innerHTML = '<div class="loading-tech"><span>尚無任何戰鬥記錄</span></div>';
@@ -7,7 +7,7 @@ let selectedDisplayMode = currentDisplayMode; // 讓設定選單也同步
 
 let currentPlayerName = localStorage.getItem('playerName') || '匿名玩家';
 let currentGameId = null;
-let socket = io();
+let socket = getGameSocket();  // 與 api.js 共用同一條連線 (見 getGameSocket)
 let isAutoMode = false;
 let autoTimer = null;
 
@@ -84,7 +84,7 @@ async function startWebGameBackend(auto = false) {
             if (isAutoMode) {
                 // === 自動模式 ===
                 console.log("[UI] 正在請求 Pygame 自動戰鬥 API...");
-                await fetch('/api/run_game_auto', {
+                const response = await fetch('/api/run_game_auto', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
                     body: JSON.stringify({
@@ -92,10 +92,13 @@ async function startWebGameBackend(auto = false) {
                         difficulty: difficulty
                     })
                 });
+                const result = await response.json();
+                // 加入這場遊戲的 room 才會收到結束通知
+                if (handlePygameStartResult(response, result) && typeof joinGameRoom === 'function') joinGameRoom(result.game_id);
             } else {
                 // === 手動模式 ===
                 console.log("[UI] 正在請求 Pygame 手動戰鬥 API...");
-                await fetch('/api/run_game', {
+                const response = await fetch('/api/run_game', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
                     body: JSON.stringify({
@@ -105,6 +108,8 @@ async function startWebGameBackend(auto = false) {
                         difficulty: difficulty
                     })
                 });
+                const result = await response.json();
+                if (handlePygameStartResult(response, result) && typeof joinGameRoom === 'function') joinGameRoom(result.game_id);
             }
             console.log("[UI] Pygame 啟動請求已發送");
             
@@ -153,8 +158,20 @@ function sendAction(skillId) {
     });
 }
 
-// 5. 監聽後端回傳的狀態更新
-socket.on('web_update', function(state) {
+// Pygame 遊戲的排程結果：排隊中提示位置，額滿 (429) 提示幾秒後再試
+function handlePygameStartResult(response, result) {
+    if (response.status === 429) {
+        showRealtimeNotification({type: 'error', title: '伺服器忙碌', message: `進行中的遊戲已達上限，請 ${result.retry_after} 秒後再試`});
+        return false;
+    }
+    if (result.status === 'queued') {
+        showRealtimeNotification({type: 'info', title: '排隊中', message: `前面還有 ${result.position - 1} 場，輪到時會自動開啟視窗`});
+    }
+    return true;
+}
+
+// 5. 監聽後端回傳的狀態更新 (完整的 web_update 或差異協定的 web_update_d)
+onStateEvent(socket, 'web_update', function(state) {
     // 解除鎖定
     isActionPending = false;
     
@@ -202,7 +219,7 @@ socket.on('web_update', function(state) {
             triggerNextAutoTurn();
         }
     }
-});
+}, true);
 
 // 5.5 更新回合數顯示
 function updateRoundDisplay(round) {
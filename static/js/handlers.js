@@ -109,59 +109,58 @@ async function showGameReplay(gameId) {
     replayLog.innerHTML = '<div class="loading-tech"><div class="loading-spinner"></div><span>載入回放數據...</span></div>';
     
     try {
-        const response = await fetch(`/api/game/${gameId}/replay`);
-        const events = await response.json();
-        
-        if (events.error) {
-            replayLog.innerHTML = `<div style="color: var(--dragon-color); text-align: center; padding: 20px;"><i class="fas fa-exclamation-triangle"></i> 載入失敗：${events.error}</div>`;
-            return;
-        }
-        
-        if (!events || events.length === 0) {
-            replayLog.innerHTML = '<div style="text-align: center; padding: 20px; color: var(--text-secondary);">此戰鬥無回放記錄</div>';
-            return;
-        }
-        
-        let html = `<div class="replay-header"><h4 style="font-family: var(--font-tech); color: var(--neon-cyan); margin-bottom: 20px;"><i class="fas fa-gamepad"></i> 戰鬥 #${gameId} 完整回放</h4></div>`;
-        html += '<div class="replay-timeline">';
-        
-        events.forEach((event, index) => {
-            const actorClass = event.actor === '龍王' ? 'dragon' : event.actor === '勇者' ? 'person' : 'system';
-            const actorColor = actorClass === 'dragon' ? 'var(--dragon-color)' : actorClass === 'person' ? 'var(--person-color)' : 'var(--neon-cyan)';
-            
-            let actionIcon = '<i class="fas fa-bolt"></i>';
-            const action = event.action || '';
-            if (action.includes('攻擊') || action.includes('Attack')) actionIcon = '<i class="fas fa-bolt"></i>';
-            else if (action.includes('治療') || action.includes('恢復') || action.includes('Heal')) actionIcon = '<i class="fas fa-heart"></i>';
-            else if (action.includes('暴擊') || action.includes('Critical')) actionIcon = '<i class="fas fa-bomb"></i>';
-            else if (action.includes('回合')) actionIcon = '<i class="fas fa-sync-alt"></i>';
-            else if (action.includes('勝利') || action.includes('獲勝')) actionIcon = '<i class="fas fa-trophy"></i>';
-            else if (action.includes('Ultimate') || action.includes('大絕')) actionIcon = '<i class="fas fa-star"></i>';
-            
-            let actionDisplay = action;
-            const actionTranslations = { 'Basic Attack': '普通攻擊', 'Heal': '治療', 'Ultimate': '大絕招' };
-            if (actionTranslations[actionDisplay]) actionDisplay = actionTranslations[actionDisplay];
-            
-            let detailsDisplay = event.details || '';
-            const detailsTranslations = { 'Critical Hit!': '💥 暴擊！', 'Critical Ultimate!': '💥 暴擊大絕！', 'Recovered HP': '❤️ 恢復生命值' };
-            if (detailsTranslations[detailsDisplay]) detailsDisplay = detailsTranslations[detailsDisplay];
-            
-            html += `
-                <div class="replay-event ${actorClass}" style="animation-delay: ${index * 0.05}s;">
-                    <div class="event-marker" style="background: ${actorColor};"></div>
-                    <div class="event-content">
-                        <div class="event-header">
-                            <span class="event-turn" style="color: var(--text-muted);">${event.turn ? `第 ${event.turn} 回合` : '系統訊息'}</span>
-                            <span class="event-actor" style="color: ${actorColor}; font-weight: 700;">${event.actor || '系統'}</span>
+        // 逐頁讀取並附加到時間軸，第一頁到達就開始顯示
+        replayLog.dataset.replayGameId = gameId;
+        let timeline = null;
+        const total = await fetchReplayPages(gameId, (events) => {
+            if (replayLog.dataset.replayGameId !== String(gameId)) return false;  // 已切換到別場回放
+            if (!timeline) {
+                replayLog.innerHTML = `<div class="replay-header"><h4 style="font-family: var(--font-tech); color: var(--neon-cyan); margin-bottom: 20px;"><i class="fas fa-gamepad"></i> 戰鬥 #${gameId} 完整回放</h4></div><div class="replay-timeline"></div>`;
+                timeline = replayLog.querySelector('.replay-timeline');
+            }
+
+            let html = '';
+            events.forEach((event, index) => {
+                const actorClass = event.actor === '龍王' ? 'dragon' : event.actor === '勇者' ? 'person' : 'system';
+                const actorColor = actorClass === 'dragon' ? 'var(--dragon-color)' : actorClass === 'person' ? 'var(--person-color)' : 'var(--neon-cyan)';
+                
+                let actionIcon = '<i class="fas fa-bolt"></i>';
+                const action = event.action || '';
+                if (action.includes('攻擊') || action.includes('Attack')) actionIcon = '<i class="fas fa-bolt"></i>';
+                else if (action.includes('治療') || action.includes('恢復') || action.includes('Heal')) actionIcon = '<i class="fas fa-heart"></i>';
+                else if (action.includes('暴擊') || action.includes('Critical')) actionIcon = '<i class="fas fa-bomb"></i>';
+                else if (action.includes('回合')) actionIcon = '<i class="fas fa-sync-alt"></i>';
+                else if (action.includes('勝利') || action.includes('獲勝')) actionIcon = '<i class="fas fa-trophy"></i>';
+                else if (action.includes('Ultimate') || action.includes('大絕')) actionIcon = '<i class="fas fa-star"></i>';
+                
+                let actionDisplay = action;
+                const actionTranslations = { 'Basic Attack': '普通攻擊', 'Heal': '治療', 'Ultimate': '大絕招' };
+                if (actionTranslations[actionDisplay]) actionDisplay = actionTranslations[actionDisplay];
+                
+                let detailsDisplay = event.details || '';
+                const detailsTranslations = { 'Critical Hit!': '💥 暴擊！', 'Critical Ultimate!': '💥 暴擊大絕！', 'Recovered HP': '❤️ 恢復生命值' };
+                if (detailsTranslations[detailsDisplay]) detailsDisplay = detailsTranslations[detailsDisplay];
+                
+                html += `
+                    <div class="replay-event ${actorClass}" style="animation-delay: ${index * 0.05}s;">
+                        <div class="event-marker" style="background: ${actorColor};"></div>
+                        <div class="event-content">
+                            <div class="event-header">
+                                <span class="event-turn" style="color: var(--text-muted);">${event.turn ? `第 ${event.turn} 回合` : '系統訊息'}</span>
+                                <span class="event-actor" style="color: ${actorColor}; font-weight: 700;">${event.actor || '系統'}</span>
+                            </div>
+                            <div class="event-action">${actionIcon} ${actionDisplay} ${event.value ? `<span class="event-value">${event.value}</span>` : ''}</div>
+                            ${detailsDisplay ? `<div class="event-details">${detailsDisplay}</div>` : ''}
                         </div>
-                        <div class="event-action">${actionIcon} ${actionDisplay} ${event.value ? `<span class="event-value">${event.value}</span>` : ''}</div>
-                        ${detailsDisplay ? `<div class="event-details">${detailsDisplay}</div>` : ''}
                     </div>
-                </div>
-            `;
+                `;
+            });
+            timeline.insertAdjacentHTML('beforeend', html);
         });
-        html += '</div>';
-        replayLog.innerHTML = html;
+
+        if (total === 0) {
+            replayLog.innerHTML = '<div style="text-align: center; padding: 20px; color: var(--text-secondary);">此戰鬥無回放記錄</div>';
+        }
         
     } catch (error) {
         // console.error('[showGameReplay] 載入失敗:', error);
@@ -1,28 +1,25 @@
-// 載入完整歷史並計算統計
+// 分頁狀態 (游標為上一頁最後一筆的 game_id)
+const HISTORY_PAGE_SIZE = 30;
+let historyCursor = null;
+let historyLoading = false;
+
+// 載入統計摘要與第一頁歷史
 async function loadAllHistoryWithStats() {
     const container = document.getElementById('fullHistoryList');
+    historyCursor = null;
+    
+    loadHistorySummary();
     
     try {
-        const response = await fetch('/api/all_games');
-        const games = await response.json();
+        const page = await fetchHistoryPage(null);
         
-        if (games.length === 0) {
+        if (page.games.length === 0) {
             container.innerHTML = '<div class="loading-tech"><span>尚無任何戰鬥記錄</span></div>';
-            updateSummary(0, 0, 0);
             return;
         }
         
-        // 計算統計
-        let dragonWins = 0, personWins = 0;
-        games.forEach(game => {
-            if (game.winner === '龍王') dragonWins++;
-            else if (game.winner === '勇者') personWins++;
-        });
-        
-        updateSummary(games.length, dragonWins, personWins);
-        
-        // 渲染遊戲列表
-        container.innerHTML = games.map(game => createGameItemHTML(game)).join('');
+        container.innerHTML = page.games.map(game => createGameItemHTML(game)).join('');
+        updateLoadMoreButton(page.next_cursor);
         
     } catch (error) {
         // console.error('載入完整歷史失敗:', error);
@@ -30,6 +27,85 @@ async function loadAllHistoryWithStats() {
     }
 }
 
+// 統計摘要直接讀取伺服器端的計數器，不需下載全部記錄
+async function loadHistorySummary() {
+    try {
+        const response = await fetch('/api/stats');
+        const stats = await response.json();
+        if (stats.error) return;
+        updateSummary(stats.total_games, stats.dragon_wins, stats.person_wins);
+    } catch (error) {
+        updateSummary(0, 0, 0);
+    }
+}
+
+async function fetchHistoryPage(cursor) {
+    let url = `/api/games?limit=${HISTORY_PAGE_SIZE}`;
+    if (cursor !== null && cursor !== undefined) url += `&cursor=${cursor}`;
+    
+    const response = await fetch(url);
+    if (!response.ok) throw new Error('API 回應錯誤');
+    const page = await response.json();
+    if (page.error) throw new Error(page.error);
+    
+    historyCursor = page.next_cursor;
+    return page;
+}
+
+// 載入下一頁並接在列表後面
+async function loadMoreHistory() {
+    if (historyLoading || historyCursor === null) return;
+    historyLoading = true;
+    
+    const container = document.getElementById('fullHistoryList');
+    const button = document.getElementById('loadMoreHistory');
+    if (button) button.disabled = true;
+    
+    try {
+        const page = await fetchHistoryPage(historyCursor);
+        container.insertAdjacentHTML('beforeend', page.games.map(game => createGameItemHTML(game)).join(''));
+        applyActiveHistoryFilter();
+        updateLoadMoreButton(page.next_cursor);
+    } catch (error) {
+        if (typeof showNotification === 'function') showNotification('載入更多記錄失敗');
+        if (button) button.disabled = false;
+    } finally {
+        historyLoading = false;
+    }
+}
+
+// 顯示 / 隱藏「載入更多」按鈕
+function updateLoadMoreButton(nextCursor) {
+    const container = document.getElementById('fullHistoryList');
+    let button = document.getElementById('loadMoreHistory');
+    
+    if (nextCursor === null || nextCursor === undefined) {
+        if (button) button.remove();
+        return;
+    }
+    
+    if (!button) {
+        button = document.createElement('button');
+        button.id = 'loadMoreHistory';
+        button.className = 'filter-btn load-more-btn';
+        button.innerHTML = '<i class="fas fa-angle-double-down"></i> 載入更多';
+        button.addEventListener('click', loadMoreHistory);
+        container.insertAdjacentElement('afterend', button);
+    }
+    button.disabled = false;
+}
+
+// 新載入的項目套用目前選取的篩選條件
+function applyActiveHistoryFilter() {
+    const active = document.querySelector('.filter-buttons .filter-btn.active');
+    const filter = active ? active.dataset.filter : 'all';
+    if (filter === 'all') return;
+    
+    document.querySelectorAll('#fullHistoryList .game-item-tech').forEach(game => {
+        game.style.display = game.classList.contains(`winner-${filter}`) ? 'block' : 'none';
+    });
+}
+
 // 更新統計摘要
 function updateSummary(total, dragon, person) {
     document.getElementById('summaryTotal').textContent = total;
@@ -97,71 +173,70 @@ async function showGameReplayModal(gameId) {
     replayLog.innerHTML = '<div class="loading-tech"><div class="loading-spinner"></div><span>載入回放數據...</span></div>';
     
     try {
-        const response = await fetch(`/api/game/${gameId}/replay`);
-        const events = await response.json();
-        
-        if (events.error) {
-            replayLog.innerHTML = `<div style="color: var(--dragon-color); text-align: center; padding: 20px;"><i class="fas fa-exclamation-triangle"></i> 載入失敗：${events.error}</div>`;
-            return;
-        }
-        
-        if (events.length === 0) {
-            replayLog.innerHTML = '<div style="text-align: center; padding: 20px; color: var(--text-secondary);">此戰鬥無回放記錄</div>';
-            return;
-        }
-        
-        let html = `<div class="replay-header"><h4 style="font-family: var(--font-tech); color: var(--neon-cyan); margin-bottom: 20px;"><i class="fas fa-gamepad"></i> 戰鬥 #${gameId} 完整回放</h4></div>`;
-        html += '<div class="replay-timeline">';
-        
-        events.forEach((event, index) => {
-            const actorClass = event.actor === '龍王' ? 'dragon' : event.actor === '勇者' ? 'person' : 'system';
-            const actorColor = actorClass === 'dragon' ? 'var(--dragon-color)' : actorClass === 'person' ? 'var(--person-color)' : 'var(--neon-cyan)';
-            
-            let actionIcon = '<i class="fas fa-bolt"></i>';
-            let actionDisplay = event.action || '';
-            let detailsDisplay = event.details || '';
-            
-            // 翻譯動作名稱
-            const actionTranslations = {
-                'Basic Attack': '普通攻擊',
-                'Heal': '治療',
-                'Ultimate': '大絕招'
-            };
-            if (actionTranslations[actionDisplay]) {
-                actionDisplay = actionTranslations[actionDisplay];
-            }
-            
-            // 翻譯詳細訊息
-            const detailsTranslations = {
-                'Critical Hit!': '💥 暴擊！',
-                'Critical Ultimate!': '💥 暴擊大絕！',
-                'Recovered HP': '❤️ 恢復生命值'
-            };
-            if (detailsTranslations[detailsDisplay]) {
-                detailsDisplay = detailsTranslations[detailsDisplay];
+        // 逐頁讀取並附加到時間軸，第一頁到達就開始顯示
+        replayLog.dataset.replayGameId = gameId;
+        let timeline = null;
+        const total = await fetchReplayPages(gameId, (events) => {
+            if (replayLog.dataset.replayGameId !== String(gameId)) return false;  // 已切換到別場回放
+            if (!timeline) {
+                replayLog.innerHTML = `<div class="replay-header"><h4 style="font-family: var(--font-tech); color: var(--neon-cyan); margin-bottom: 20px;"><i class="fas fa-gamepad"></i> 戰鬥 #${gameId} 完整回放</h4></div><div class="replay-timeline"></div>`;
+                timeline = replayLog.querySelector('.replay-timeline');
             }
-            
-            // 選擇圖標
-            if (actionDisplay.includes('攻擊') || actionDisplay.includes('Attack')) actionIcon = '<i class="fas fa-bolt"></i>';
-            else if (actionDisplay.includes('治療') || actionDisplay.includes('Heal')) actionIcon = '<i class="fas fa-heart"></i>';
-            else if (actionDisplay.includes('大絕') || actionDisplay.includes('Ultimate')) actionIcon = '<i class="fas fa-star"></i>';
-            
-            html += `
-                <div class="replay-event ${actorClass}" style="animation-delay: ${index * 0.05}s;">
-                    <div class="event-marker" style="background: ${actorColor};"></div>
-                    <div class="event-content">
-                        <div class="event-header">
-                            <span class="event-turn" style="color: var(--text-muted);">${event.turn ? `第 ${event.turn} 回合` : '系統訊息'}</span>
-                            <span class="event-actor" style="color: ${actorColor}; font-weight: 700;">${event.actor || '系統'}</span>
+
+            let html = '';
+            events.forEach((event, index) => {
+                const actorClass = event.actor === '龍王' ? 'dragon' : event.actor === '勇者' ? 'person' : 'system';
+                const actorColor = actorClass === 'dragon' ? 'var(--dragon-color)' : actorClass === 'person' ? 'var(--person-color)' : 'var(--neon-cyan)';
+                
+                let actionIcon = '<i class="fas fa-bolt"></i>';
+                let actionDisplay = event.action || '';
+                let detailsDisplay = event.details || '';
+                
+                // 翻譯動作名稱
+                const actionTranslations = {
+                    'Basic Attack': '普通攻擊',
+                    'Heal': '治療',
+                    'Ultimate': '大絕招'
+                };
+                if (actionTranslations[actionDisplay]) {
+                    actionDisplay = actionTranslations[actionDisplay];
+                }
+                
+                // 翻譯詳細訊息
+                const detailsTranslations = {
+                    'Critical Hit!': '💥 暴擊！',
+                    'Critical Ultimate!': '💥 暴擊大絕！',
+                    'Recovered HP': '❤️ 恢復生命值'
+                };
+                if (detailsTranslations[detailsDisplay]) {
+                    detailsDisplay = detailsTranslations[detailsDisplay];
+                }
+                
+                // 選擇圖標
+                if (actionDisplay.includes('攻擊') || actionDisplay.includes('Attack')) actionIcon = '<i class="fas fa-bolt"></i>';
+                else if (actionDisplay.includes('治療') || actionDisplay.includes('Heal')) actionIcon = '<i class="fas fa-heart"></i>';
+                else if (actionDisplay.includes('大絕') || actionDisplay.includes('Ultimate')) actionIcon = '<i class="fas fa-star"></i>';
+                
+                html += `
+                    <div class="replay-event ${actorClass}" style="animation-delay: ${index * 0.05}s;">
+                        <div class="event-marker" style="background: ${actorColor};"></div>
+                        <div class="event-content">
+                            <div class="event-header">
+                                <span class="event-turn" style="color: var(--text-muted);">${event.turn ? `第 ${event.turn} 回合` : '系統訊息'}</span>
+                                <span class="event-actor" style="color: ${actorColor}; font-weight: 700;">${event.actor || '系統'}</span>
+                            </div>
+                            <div class="event-action">${actionIcon} ${actionDisplay} ${event.value ? `<span class="event-value" style="color: ${actorColor}; font-weight: bold;">${event.value}</span>` : ''}</div>
+                            ${detailsDisplay ? `<div class="event-details" style="color: var(--text-secondary); font-size: 0.9em; margin-top: 5px;">${detailsDisplay}</div>` : ''}
                         </div>
-                        <div class="event-action">${actionIcon} ${actionDisplay} ${event.value ? `<span class="event-value" style="color: ${actorColor}; font-weight: bold;">${event.value}</span>` : ''}</div>
-                        ${detailsDisplay ? `<div class="event-details" style="color: var(--text-secondary); font-size: 0.9em; margin-top: 5px;">${detailsDisplay}</div>` : ''}
                     </div>
-                </div>
-            `;
+                `;
+            });
+            timeline.insertAdjacentHTML('beforeend', html);
         });
-        html += '</div>';
-        replayLog.innerHTML = html;
+
+        if (total === 0) {
+            replayLog.innerHTML = '<div style="text-align: center; padding: 20px; color: var(--text-secondary);">此戰鬥無回放記錄</div>';
+        }
         
     } catch (error) {
         // console.error('載入回放失敗:', error);
@@ -0,0 +1,105 @@
+// ========== MessagePack 解碼 (只需要 decode，對應後端 msgpack.packb) ==========
+// 不從 CDN 載入第三方函式庫；提供與 @msgpack/msgpack 相同的 MessagePack.decode(Uint8Array)，
+// state_protocol.js 以 typeof MessagePack 判斷是否向後端宣告支援 msgpack。
+
+(function () {
+    const textDecoder = new TextDecoder('utf-8');
+
+    function decode(bytes) {
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        let pos = 0;
+
+        function str(length) {
+            const value = textDecoder.decode(bytes.subarray(pos, pos + length));
+            pos += length;
+            return value;
+        }
+
+        function bin(length) {
+            const value = bytes.slice(pos, pos + length);
+            pos += length;
+            return value;
+        }
+
+        function array(length) {
+            const value = new Array(length);
+            for (let i = 0; i < length; i++) value[i] = read();
+            return value;
+        }
+
+        function map(length) {
+            const value = {};
+            for (let i = 0; i < length; i++) {
+                const key = read();
+                value[key] = read();
+            }
+            return value;
+        }
+
+        function ext(length) {
+            pos += 1 + length;  // 用不到擴充型別，略過 (type + data)
+            return null;
+        }
+
+        function uint64() {
+            const value = view.getUint32(pos) * 4294967296 + view.getUint32(pos + 4);
+            pos += 8;
+            return value;
+        }
+
+        function int64() {
+            const value = view.getInt32(pos) * 4294967296 + view.getUint32(pos + 4);
+            pos += 8;
+            return value;
+        }
+
+        function read() {
+            const type = bytes[pos++];
+            if (type <= 0x7f) return type;                        // positive fixint
+            if (type <= 0x8f) return map(type & 0x0f);            // fixmap
+            if (type <= 0x9f) return array(type & 0x0f);          // fixarray
+            if (type <= 0xbf) return str(type & 0x1f);            // fixstr
+            if (type >= 0xe0) return type - 0x100;                // negative fixint
+
+            let value;
+            switch (type) {
+                case 0xc0: return null;
+                case 0xc2: return false;
+                case 0xc3: return true;
+                case 0xc4: value = bytes[pos]; pos += 1; return bin(value);
+                case 0xc5: value = view.getUint16(pos); pos += 2; return bin(value);
+                case 0xc6: value = view.getUint32(pos); pos += 4; return bin(value);
+                case 0xc7: value = bytes[pos]; pos += 1; return ext(value);
+                case 0xc8: value = view.getUint16(pos); pos += 2; return ext(value);
+                case 0xc9: value = view.getUint32(pos); pos += 4; return ext(value);
+                case 0xca: value = view.getFloat32(pos); pos += 4; return value;
+                case 0xcb: value = view.getFloat64(pos); pos += 8; return value;
+                case 0xcc: value = bytes[pos]; pos += 1; return value;
+                case 0xcd: value = view.getUint16(pos); pos += 2; return value;
+                case 0xce: value = view.getUint32(pos); pos += 4; return value;
+                case 0xcf: return uint64();
+                case 0xd0: value = view.getInt8(pos); pos += 1; return value;
+                case 0xd1: value = view.getInt16(pos); pos += 2; return value;
+                case 0xd2: value = view.getInt32(pos); pos += 4; return value;
+                case 0xd3: return int64();
+                case 0xd4: return ext(1);
+                case 0xd5: return ext(2);
+                case 0xd6: return ext(4);
+                case 0xd7: return ext(8);
+                case 0xd8: return ext(16);
+                case 0xd9: value = bytes[pos]; pos += 1; return str(value);
+                case 0xda: value = view.getUint16(pos); pos += 2; return str(value);
+                case 0xdb: value = view.getUint32(pos); pos += 4; return str(value);
+                case 0xdc: value = view.getUint16(pos); pos += 2; return array(value);
+                case 0xdd: value = view.getUint32(pos); pos += 4; return array(value);
+                case 0xde: value = view.getUint16(pos); pos += 2; return map(value);
+                case 0xdf: value = view.getUint32(pos); pos += 4; return map(value);
+                default: throw new Error(`MessagePack: 無法解碼的型別 0x${type.toString(16)}`);
+            }
+        }
+
+        return read();
+    }
+
+    window.MessagePack = { decode: decode };
+})();
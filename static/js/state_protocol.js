@@ -0,0 +1,124 @@
+// ========== 遊戲狀態差異協定 (對應後端 state_protocol.py) ==========
+// 連線後送 protocol_hello，後端開啟差異傳輸時改收 <事件>_d：
+// 只含變動欄位的短鍵訊息，這裡還原成與舊版完全相同的狀態物件後交給原本的處理函式。
+
+// 短鍵 -> 原本的欄位路徑 (與 state_protocol.py 的 SHORT_KEYS 相同)
+const STATE_LONG_KEYS = {
+    g: 'game_id',
+    r: 'round',
+    tr: 'total_rounds',
+    w: 'winner',
+    o: 'game_over',
+    cc: 'consecutive_crits',
+    ev: 'turn_events',
+    a: 'action_type',
+    la: 'last_actor',
+    dh: 'dragon.hp',
+    dm: 'dragon.max_hp',
+    ph: 'person.hp',
+    pm: 'person.max_hp',
+    c1: 'person.cooldowns.1',
+    c2: 'person.cooldowns.2',
+    c3: 'person.cooldowns.3'
+};
+const STATE_EVENT_TYPES = { d: 'damage', h: 'heal' };
+const STATE_EVENT_TARGETS = { d: 'dragon', p: 'person' };
+
+const stateProtocol = { delta: false, encoding: 'json', ready: false };
+const stateStreams = {};  // "事件:遊戲編號" -> { seq -> 攤平後的狀態 }
+const protocolReadyCallbacks = [];
+
+// 協商傳輸方式 (每次連線都要送，並且要在 join_game 之前)
+// 整個頁面只能有一條 socket 呼叫這裡 (見 api.js 的 getGameSocket)，後端依協商結果決定加入哪個狀態 room
+function initStateProtocol(socket) {
+    socket.on('protocol_ack', (protocol) => {
+        stateProtocol.delta = !!protocol.delta;
+        stateProtocol.encoding = protocol.encoding || 'json';
+        stateProtocol.ready = true;
+        protocolReadyCallbacks.forEach((callback) => callback());
+    });
+    socket.on('connect', () => sendProtocolHello(socket));
+    socket.on('disconnect', () => { stateProtocol.ready = false; });
+    if (socket.connected) sendProtocolHello(socket);
+}
+
+// 每次連線協商完成後呼叫 callback (加入 room 要在這之後，斷線重連會再呼叫一次)
+function onProtocolReady(callback) {
+    protocolReadyCallbacks.push(callback);
+    if (stateProtocol.ready) callback();
+}
+
+function sendProtocolHello(socket) {
+    const encodings = (typeof MessagePack !== 'undefined') ? ['msgpack', 'json'] : ['json'];
+    socket.emit('protocol_hello', { delta: true, encodings: encodings });
+}
+
+function unpackStateEvents(events) {
+    return events.map((item) => {
+        const event = {
+            type: STATE_EVENT_TYPES[item[0]] || item[0],
+            target: STATE_EVENT_TARGETS[item[1]] || item[1],
+            value: item[2]
+        };
+        if (event.type === 'damage') event.is_crit = item[3] === 1;
+        return event;
+    });
+}
+
+// 攤平的短鍵狀態 -> 巢狀狀態物件
+function unflattenState(flat) {
+    const state = {};
+    Object.keys(flat).forEach((key) => {
+        const path = (STATE_LONG_KEYS[key] || key).split('.');
+        let node = state;
+        for (let i = 0; i < path.length - 1; i++) {
+            if (!node[path[i]]) node[path[i]] = {};
+            node = node[path[i]];
+        }
+        node[path[path.length - 1]] = key === 'ev' ? unpackStateEvents(flat[key]) : flat[key];
+    });
+    return state;
+}
+
+function decodeStatePayload(payload) {
+    if (payload instanceof ArrayBuffer || ArrayBuffer.isView(payload)) {
+        return MessagePack.decode(payload instanceof ArrayBuffer ? new Uint8Array(payload) : payload);
+    }
+    return payload;
+}
+
+// 同時監聽完整的 event 與差異的 event_d，兩者都以完整狀態呼叫 handler
+// acked 為 true 時回報 state_ack (web_update)；room 廣播 (web_game_update) 不需要
+function onStateEvent(socket, event, handler, acked) {
+    socket.on(event, handler);
+    socket.on(event + '_d', (payload) => {
+        const msg = decodeStatePayload(payload);
+        const streamKey = `${event}:${msg.id}`;
+        const snapshots = stateStreams[streamKey] || (stateStreams[streamKey] = {});
+
+        let flat;
+        if (msg.k) {
+            flat = Object.assign({}, msg.d);
+        } else {
+            const base = snapshots[msg.b];
+            if (!base) {
+                // 缺少差異基準 (訊息遺失或剛加入)，請後端重送關鍵影格
+                socket.emit('state_resync', { id: msg.id, event: event });
+                return;
+            }
+            flat = Object.assign({}, base, msg.d);
+            (msg.x || []).forEach((key) => delete flat[key]);
+        }
+
+        // 只保留這一筆之後可能用到的基準
+        Object.keys(snapshots).forEach((seq) => {
+            if (Number(seq) < (msg.k ? msg.s : msg.b)) delete snapshots[seq];
+        });
+        snapshots[msg.s] = flat;
+        if (acked) socket.emit('state_ack', { id: msg.id, s: msg.s });
+
+        const state = unflattenState(flat);
+        if (state.game_over) delete stateStreams[streamKey];
+        handler(state);
+    });
+}
@@ -0,0 +1,28 @@
+# tests/conftest.py
+"""
+測試共用設定：以 fakeredis 取代 database.redis_client
+
+必須在匯入 web_game_logic / session_store 等模組之前替換，它們會在匯入時取得 redis_client，
+所以在 conftest 載入時就安裝，每個測試前清空資料。
+"""
+import contextlib
+import io
+import os
+import sys
+import fakeredis
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import database
+
+client = fakeredis.FakeRedis(decode_responses=True)
+database.redis_client = client
+database.RedisConnection._client = client
+
+
+@pytest.fixture(autouse=True)
+def fake_redis():
+    client.flushall()
+    yield client
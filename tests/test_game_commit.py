@@ -0,0 +1,43 @@
+# tests/test_game_commit.py
+from database import save_game_to_redis, ABANDONED_WINNER
+from web_game_logic import WebBattleGame
+
+
+def _play(game_id, seed, player_name='測試玩家'):
+    game = WebBattleGame(game_id, player_name, 'normal', seed=seed)
+    game.persist_on_end = False
+    game.verbose = False
+    while not game.is_game_over:
+        game.process_turn(is_auto=True)
+    return game
+
+
+def _save(game):
+    return save_game_to_redis(game.game_id, game.dragon, game.person, game.winner, game.final_round,
+                              game.player_name, replay_fields=game.replay_fields())
+
+
+def test_duplicate_commit_does_not_count_twice(fake_redis):
+    game = _play(1, seed=42)
+    assert _save(game)['status'] == 'committed'
+    assert _save(game)['status'] == 'duplicate'
+
+    assert fake_redis.get('stats:total_games') == '1'
+    assert fake_redis.lrange('game:list', 0, -1) == ['1']
+    assert fake_redis.zcard('leaderboard:players') == 1
+    assert fake_redis.hget('stats:characters', 'games') == '1'
+
+
+def test_abandoned_game_is_saved_without_stats(fake_redis):
+    game = WebBattleGame(2, '中離玩家', 'normal', seed=7)
+    game.verbose = False
+    game.process_turn(is_auto=True)
+    game.winner = ABANDONED_WINNER
+    game.is_game_over = True
+    game.final_round = game.turn_count
+    assert _save(game)['status'] == 'committed'
+
+    assert fake_redis.hget('game:2', 'winner') == ABANDONED_WINNER
+    assert fake_redis.zscore('game:index', '2') == 2
+    assert fake_redis.get('stats:total_games') is None
+    assert fake_redis.zcard('leaderboard:players') == 0
@@ -0,0 +1,54 @@
+# tests/test_replay.py
+import pytest
+from database import decode_stream_entry
+from replay import replay_game, result_fields, verify_game, VERIFY_FIELDS
+from web_game_logic import WebBattleGame
+
+
+def test_replay_matches_live_game(fake_redis):
+    live = WebBattleGame(3, '重播玩家', 'hard', seed=20240601)
+    live.verbose = False
+    while not live.is_game_over:
+        live.process_turn(is_auto=True)
+
+    replayed, events = replay_game(live.seed, live.inputs, 'hard', game_id=3, player_name='重播玩家')
+    assert result_fields(replayed) == result_fields(live)
+
+    stored = {field: fake_redis.hget('game:3', field) for field in VERIFY_FIELDS}
+    assert stored == result_fields(live)
+    assert verify_game(3)['status'] == 'ok'
+
+    # 回放事件 (不含 ID) 與實際對戰寫入 Stream 的內容相同
+    fields = ('turn', 'actor', 'action', 'value', 'details')
+    streamed = [event for msg_id, data in fake_redis.xrange('game:3:stream')
+                for event in decode_stream_entry(msg_id, data)]
+    assert events
+    assert [[event[f] for f in fields] for event in events] == [[event[f] for f in fields] for event in streamed]
+
+
+def test_invalid_action_is_rejected_without_recording_input():
+    game = WebBattleGame(4, '玩家', 'normal', seed=42)
+    game.verbose = False
+    for action_id in (10, 0, -1, 'x', None):
+        state = game.process_turn(action_id=action_id)
+        assert state['error'] == '無效的技能'
+    assert game.inputs == '' and game.turn_count == 1
+
+    game.process_turn(action_id='1')
+    assert game.inputs == '1'
+
+
+def test_replay_rejects_unknown_input_codes(fake_redis):
+    with pytest.raises(ValueError):
+        replay_game(42, '10')
+    with pytest.raises(ValueError):
+        replay_game(42, '-1')
+
+    # 舊資料中的無效輸入：核對時回報不一致，而不是以錯誤的回合重播
+    live = WebBattleGame(5, '玩家', 'normal', seed=42)
+    live.verbose = False
+    while not live.is_game_over:
+        live.process_turn(is_auto=True)
+    fake_redis.hset('game:5', 'inputs', '10')
+    result = verify_game(5)
+    assert result['status'] == 'mismatch' and 'inputs' in result['mismatches']
@@ -0,0 +1,39 @@
+# tests/test_session_store.py
+from session_store import RedisGameSessionStore
+from web_game_logic import WebBattleGame
+
+
+def _store():
+    store = RedisGameSessionStore(max_size=10, idle_timeout=600, write_behind=False)
+    store._ensure_sweeper = lambda: None  # 測試中不啟動背景清理
+    return store
+
+
+def test_apply_turn_retries_after_watch_conflict(fake_redis, monkeypatch):
+    store = _store()
+    game = WebBattleGame(1, '玩家', 'normal', seed=99)
+    game.verbose = False
+    store.create(game)
+    key = store._key(1)
+
+    # 第一次讀取後另一個 worker 搶先寫回同一場遊戲，WATCH 應偵測到並重新讀取
+    other = WebBattleGame.from_state(fake_redis.get(key))
+    other.persist_on_end = False
+    other.process_turn(is_auto=True)
+    reads = []
+    original = WebBattleGame.from_state.__func__
+
+    def racing_from_state(cls, raw, defer_side_effects=False):
+        reads.append(raw)
+        if len(reads) == 1:
+            fake_redis.set(key, other.to_state())
+        return original(cls, raw, defer_side_effects)
+
+    monkeypatch.setattr(WebBattleGame, 'from_state', classmethod(racing_from_state))
+    state = store.apply_turn(1, is_auto=True)
+
+    assert 'error' not in state
+    assert len(reads) == 2 and reads[1] == other.to_state()
+    assert store._cas_conflicts == 1
+    # 第二次以搶先寫回的狀態為基礎，兩個回合都有算到
+    assert store.get(1).turn_count == other.turn_count + 1
@@ -0,0 +1,74 @@
+# tests/test_state_protocol.py
+from state_protocol import DeltaEncoder, flatten_state
+
+
+def _state(round_no, dragon_hp, person_hp, cooldown=0, winner=None):
+    state = {
+        'game_id': 7,
+        'round': round_no,
+        'dragon': {'hp': dragon_hp, 'max_hp': 100},
+        'person': {'hp': person_hp, 'max_hp': 50, 'cooldowns': {'1': 0, '2': cooldown, '3': 0}},
+        'turn_events': [{'type': 'damage', 'target': 'dragon', 'value': 5, 'is_crit': round_no % 2 == 0}],
+    }
+    if winner:
+        state['winner'] = winner
+    return state
+
+
+def _apply(snapshots, message):
+    """前端的還原方式：關鍵影格直接取代，差異套用在基準序號的狀態上"""
+    if message.get('k'):
+        flat = dict(message['d'])
+    else:
+        flat = dict(snapshots[message['b']])
+        flat.update(message['d'])
+        for key in message.get('x', ()):
+            flat.pop(key, None)
+    snapshots[message['s']] = flat
+    return flat
+
+
+def test_acked_deltas_reconstruct_every_state():
+    encoder = DeltaEncoder(7, keyframe_interval=3)
+    snapshots = {}
+    states = [_state(1, 100, 50), _state(2, 95, 50, cooldown=2), _state(3, 95, 40, cooldown=1),
+              _state(4, 80, 40), _state(5, 80, 30), _state(6, 0, 30, winner='勇者')]
+    for state in states:
+        message = encoder.encode(state)
+        assert _apply(snapshots, message) == flatten_state(state)
+        encoder.ack(message['s'])
+
+
+def test_delta_only_sends_changed_fields_and_removals():
+    encoder = DeltaEncoder(7)
+    first = encoder.encode(_state(1, 100, 50, winner='龍王'))
+    assert first['k'] == 1
+    encoder.ack(first['s'])
+
+    second = encoder.encode(_state(1, 90, 50))
+    assert second['b'] == first['s']
+    assert second['d'] == {'dh': 90}
+    assert second['x'] == ['w']
+
+
+def test_unacked_messages_stay_based_on_last_ack():
+    encoder = DeltaEncoder(7, keyframe_interval=10)
+    snapshots = {}
+    first = encoder.encode(_state(1, 100, 50))
+    _apply(snapshots, first)
+    encoder.ack(first['s'])
+
+    encoder.encode(_state(2, 90, 50))  # 遺失，客戶端沒有 ack
+    third = encoder.encode(_state(3, 80, 45))
+    assert third['b'] == first['s']
+    assert _apply(snapshots, third) == flatten_state(_state(3, 80, 45))
+
+
+def test_keyframe_resends_last_state():
+    encoder = DeltaEncoder(7)
+    assert encoder.keyframe() is None
+    message = encoder.encode(_state(1, 100, 50))
+    encoder.encode(_state(2, 90, 50))
+    keyframe = encoder.keyframe()
+    assert keyframe['k'] == 1 and keyframe['s'] == message['s'] + 1
+    assert keyframe['d'] == flatten_state(_state(2, 90, 50))
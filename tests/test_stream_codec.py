@@ -0,0 +1,39 @@
+# tests/test_stream_codec.py
+from database import encode_stream_event, _encode_turn_entries, decode_stream_entry
+
+EVENTS = [
+    {'turn': '1', 'actor': '勇者', 'action': 'Basic Attack', 'value': '4', 'details': 'Critical Hit!'},
+    {'turn': '1', 'actor': '龍王', 'action': 'Ultimate', 'value': '12', 'details': ''},
+    {'turn': '2', 'actor': '勇者', 'action': 'Heal', 'value': '8', 'details': 'Recovered HP'},
+    {'turn': '2', 'actor': '龍王', 'action': 'Ultimate', 'value': '20', 'details': 'Critical Ultimate!'},
+]
+FIELDS = ('turn', 'actor', 'action', 'value', 'details')
+
+
+def _decode_all(entries):
+    events = []
+    for i, entry in enumerate(entries):
+        events.extend(decode_stream_entry(f'1-{i}', entry))
+    return [{field: event[field] for field in FIELDS} for event in events]
+
+
+def test_encode_event_codes():
+    assert encode_stream_event('勇者', 'Basic Attack', 4, 'Critical Hit!') == 'p1c4'
+    assert encode_stream_event('龍王', 'Heal', 8, 'Recovered HP') == 'd28'
+    # 不認得的角色、技能或與技能不符的 details 無法編碼
+    assert encode_stream_event('路人', 'Basic Attack', 1, '') is None
+    assert encode_stream_event('勇者', 'Basic Attack', 1, 'Recovered HP') is None
+
+
+def test_v2_round_trip_groups_by_turn():
+    entries = _encode_turn_entries(EVENTS)
+    assert entries == [{'t': '1', 'e': 'p1c4 d312'}, {'t': '2', 'e': 'p28 d3c20'}]
+    assert _decode_all(entries) == EVENTS
+
+
+def test_unencodable_turn_falls_back_to_v1():
+    events = EVENTS[:2] + [{'turn': '2', 'actor': '勇者', 'action': 'Dance', 'value': '0', 'details': ''}]
+    entries = _encode_turn_entries(events)
+    assert entries[0] == {'t': '1', 'e': 'p1c4 d312'}
+    assert entries[1] is events[2]
+    assert _decode_all(entries) == events
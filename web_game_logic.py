@@ -1,50 +1,137 @@
 # web_game_logic.py
+import json
 import random
-import os
-import pygame
-from database import save_game_to_redis, load_character_from_redis, get_default_character_config
-from characters import create_role_from_config
+from config import WEB_GAME_EVENT_STREAM
+from database import save_game_to_redis, load_character_from_redis, get_default_character_config, ABANDONED_WINNER
+from combat import Combatant, create_combatant_from_config, apply_difficulty_hp, auto_player_choice
+from event_log import BattleEventLog
+
+# to_state() 的格式版本，欄位順序改變時要遞增 (from_state 仍可讀取版本 1)
+STATE_VERSION = 2
+
+# 存檔時記錄的規則版本：replay.py 只重播相同規則的遊戲，回合結算邏輯改變時要遞增
+REPLAY_RULES = 'web-1'
+
+# 勇者可選的技能編號；存檔的 inputs 每回合一個字元 (a = 自動，其餘為技能編號)
+PLAYER_ACTIONS = (1, 2, 3)
+
+
+def _pack_combatant(c):
+    """角色狀態 -> 精簡列表 (欄位順序與 _unpack_combatant 對應)"""
+    return [c.name, c.hp, c.initial_hp, c.cooldowns[1], c.cooldowns[2], c.cooldowns[3],
+            c.total_damage_dealt, c.total_healing, c.skill1_used, c.skill2_used, c.skill3_used,
+            c.critical_hits, c.skillchose]
+
+
+def _unpack_combatant(data, difficulty):
+    c = Combatant(data[0])
+    c.set_difficulty(difficulty)
+    (c.hp, c.initial_hp, c.cooldowns[1], c.cooldowns[2], c.cooldowns[3],
+     c.total_damage_dealt, c.total_healing, c.skill1_used, c.skill2_used, c.skill3_used,
+     c.critical_hits, c.skillchose) = data[1:]
+    return c
 
-class WebBattleGame:
-    def __init__(self, game_id, player_name, difficulty='normal'):
-        # 設定 SDL 為 dummy 驅動 (無頭模式)
-        os.environ["SDL_VIDEODRIVER"] = "dummy"
-        os.environ["SDL_AUDIODRIVER"] = "dummy"
-        if not pygame.get_init():
-            pygame.init()
-            pygame.display.set_mode((1, 1))
 
+def load_character_configs():
+    """讀取 (龍王設定, 勇者設定)，Redis 沒有時使用預設值"""
+    return (load_character_from_redis('dragon') or get_default_character_config('dragon'),
+            load_character_from_redis('person') or get_default_character_config('person'))
+
+
+class WebBattleGame:
+    def __init__(self, game_id, player_name, difficulty='normal', seed=None, characters=None):
+        # 網頁版只需要純邏輯的 Combatant，不初始化 pygame、不載入任何素材
         self.game_id = game_id
         self.player_name = player_name
         self.difficulty = difficulty
         self.turn_count = 1
         self.winner = None
         self.is_game_over = False
+        self.final_round = None
+
+        # 每場遊戲的亂數種子：每回合的 RNG 由 (種子, 回合數) 衍生，
+        # 因此只要保存種子，任何 worker 重建遊戲後都會得到相同的結果
+        self.seed = seed if seed is not None else random.getrandbits(32)
+
+        # 每回合的玩家輸入 ('1'/'2'/'3' 手動技能，'a' 託管)，與種子一起存檔即可重播整場
+        self.inputs = ''
+
+        # False 時遊戲結束不立即存檔，由呼叫端在狀態寫回成功後呼叫 persist_result()
+        self.persist_on_end = True
+        self.verbose = True  # 重播時關閉結束日誌
 
         self.max_consecutive_crits = 0  # 記錄最大連續暴擊數
         self.current_consecutive_crits = 0  # 當前連續暴擊數
+
+        # 戰鬥事件先緩衝，依寫入策略每回合或遊戲結束時批次寫入 Redis Stream
+        # web_game_event_stream 關閉時不寫 Stream，回放改由 replay.py 以種子與輸入重新產生
+        self.event_log = BattleEventLog(game_id, flush_policy=None if WEB_GAME_EVENT_STREAM else 'off')
         
-        # 載入角色
-        d_conf = load_character_from_redis('dragon') or get_default_character_config('dragon')
-        p_conf = load_character_from_redis('person') or get_default_character_config('person')
+        # 載入角色 (characters: 預先載入的 (龍王設定, 勇者設定)，批次模擬時避免每場都讀 Redis)
+        if characters:
+            d_conf, p_conf = characters
+        else:
+            d_conf, p_conf = load_character_configs()
         
-        self.dragon = create_role_from_config(d_conf, difficulty=difficulty)
-        self.person = create_role_from_config(p_conf, difficulty='normal')
+        self.dragon = create_combatant_from_config(d_conf, difficulty=difficulty)
+        self.person = create_combatant_from_config(p_conf, difficulty='normal')
 
-        # 根據難度調整血量
-        hp_bonus = {'easy': (2, -2), 'normal': (0, 0), 'hard': (-2, 3)}.get(difficulty, (0, 0))
-        self.person.hp += hp_bonus[0]
-        self.person.initial_hp += hp_bonus[0]
-        self.dragon.hp += hp_bonus[1]
-        self.dragon.initial_hp += hp_bonus[1]
+        # 根據難度調整血量 (含大絕初始 CD)
+        apply_difficulty_hp(self.dragon, self.person, difficulty)
 
-        self.person.cooldowns[3] = 2  # 大絕初始 CD
+    @classmethod
+    def from_state(cls, raw, defer_side_effects=False):
+        """
+        由 to_state() 的字串重建遊戲 (不讀取 Redis 的角色設定)
+        defer_side_effects: True 時事件只緩衝、遊戲結束也不存檔，
+                            由呼叫端確認狀態寫回成功後再 flush / persist_result()
+        """
+        data = json.loads(raw)
+        if data[0] not in (1, STATE_VERSION):
+            raise ValueError(f"不支援的遊戲狀態版本: {data[0]}")
+
+        game = cls.__new__(cls)
+        (_, game.game_id, game.player_name, game.difficulty, game.seed, game.turn_count,
+         game.max_consecutive_crits, game.current_consecutive_crits, dragon, person) = data[:10]
+        game.inputs = data[10] if data[0] >= 2 else ''
+        game.winner = None
+        game.is_game_over = False
+        game.final_round = None
+        game.persist_on_end = not defer_side_effects
+        game.verbose = True
+        if not WEB_GAME_EVENT_STREAM:
+            flush_policy = 'off'
+        else:
+            flush_policy = 'game_end' if defer_side_effects else None
+        game.event_log = BattleEventLog(game.game_id, flush_policy=flush_policy)
+        game.dragon = _unpack_combatant(dragon, game.difficulty)
+        game.person = _unpack_combatant(person, 'normal')
+        return game
+
+    def to_state(self):
+        """
+        將進行中的遊戲序列化成精簡的 JSON 列表 (約 150 bytes + 每回合 1 byte 的輸入)
+        只保存種子與回合數，不保存 RNG 內部狀態
+        """
+        return json.dumps([
+            STATE_VERSION, self.game_id, self.player_name, self.difficulty, self.seed, self.turn_count,
+            self.max_consecutive_crits, self.current_consecutive_crits,
+            _pack_combatant(self.dragon), _pack_combatant(self.person), self.inputs
+        ], ensure_ascii=False, separators=(',', ':'))
+
+    def _seed_turn_rng(self):
+        """以 (種子, 回合數) 建立本回合的 RNG，雙方共用"""
+        rng = random.Random(f'{self.seed}:{self.turn_count}')
+        self.dragon.rng = rng
+        self.person.rng = rng
 
     def process_turn(self, action_id=None, is_auto=False):
         """處理一回合戰鬥邏輯"""
         if self.is_game_over:
             return self.get_state()
 
+        self._seed_turn_rng()
+
         # ★★★ 新增：用來記錄這一回合發生的所有事件 ★★★
         turn_events = []
 
@@ -52,16 +139,22 @@ class WebBattleGame:
         if is_auto:
             action_id = self._get_player_ai_choice()
         else:
-            action_id = int(action_id)
+            try:
+                action_id = int(action_id)
+            except (TypeError, ValueError):
+                action_id = None
+            if action_id not in PLAYER_ACTIONS:
+                return {'error': '無效的技能', 'state': self.get_state()}
             if self.person.cooldowns.get(action_id, 0) > 0:
                 return {'error': '技能冷卻中', 'state': self.get_state()}
+        self.inputs += 'a' if is_auto else str(action_id)
 
         # --- 記錄攻擊前的狀態 ---
         dragon_hp_before = self.dragon.hp
         person_hp_before = self.person.hp
         
         # 執行行動
-        self.person.attack(self.dragon, choice=action_id, game_id=self.game_id, current_round=self.turn_count)
+        self.person.attack(self.dragon, choice=action_id, current_round=self.turn_count, event_log=self.event_log)
 
         # --- 計算行動結果並記錄事件 ---
         # ★★★ 初始化暴擊標記（預設為 False）★★★
@@ -93,7 +186,8 @@ class WebBattleGame:
 
         # ★ 檢查勇者是否獲勝（回合數 = 當前回合）
         if self.dragon.hp <= 0:
-            print(f"[回合{self.turn_count}] 龍王HP歸零 ({self.dragon.hp})，勇者獲勝！")
+            if self.verbose:
+                print(f"[回合{self.turn_count}] 龍王HP歸零 ({self.dragon.hp})，勇者獲勝！")
             return self.end_game('勇者', turn_events, final_round=self.turn_count)
 
         # === 2. 龍王行動 (AI) ===
@@ -101,7 +195,7 @@ class WebBattleGame:
         dragon_hp_before_action = self.dragon.hp
         person_hp_before = self.person.hp
         
-        self.dragon.attack(self.person, game_id=self.game_id, current_round=self.turn_count)
+        self.dragon.attack(self.person, current_round=self.turn_count, event_log=self.event_log)
 
         # --- 計算行動結果並記錄事件 ---
         # ★★★ 初始化暴擊標記（預設為 False）★★★
@@ -130,7 +224,8 @@ class WebBattleGame:
 
         # ★ 檢查龍王是否獲勝（回合數 = 當前回合）
         if self.person.hp <= 0:
-            print(f"[回合{self.turn_count}] 勇者HP歸零 ({self.person.hp})，龍王獲勝！")
+            if self.verbose:
+                print(f"[回合{self.turn_count}] 勇者HP歸零 ({self.person.hp})，龍王獲勝！")
             return self.end_game('龍王', turn_events, final_round=self.turn_count)
 
         # === 3. 回合結算 ===
@@ -148,17 +243,14 @@ class WebBattleGame:
         else:
             self.current_consecutive_crits = 0
 
+        self.event_log.end_turn()
+
         # 回傳狀態時，附帶這一回合的事件列表
         return self.get_state(turn_events)
 
     def _get_player_ai_choice(self):
         """玩家託管模式的 AI 邏輯"""
-        available = [k for k, v in self.person.cooldowns.items() if v == 0]
-        if not available: return 1
-        hp_ratio = self.person.hp / self.person.initial_hp
-        if hp_ratio < 0.4 and 2 in available: return 2
-        if 3 in available: return 3
-        return random.choice(available)
+        return auto_player_choice(self.person)
 
     def end_game(self, winner, last_events=None, final_round=None):
         """
@@ -176,18 +268,45 @@ class WebBattleGame:
         actual_round = final_round if final_round is not None else self.turn_count
         
         # 調試日誌：記錄遊戲結束時的血量和連續暴擊
-        print(f"[遊戲結束] 獲勝者: {winner}")
-        print(f"  龍王最終HP: {self.dragon.hp}/{self.dragon.initial_hp}")
-        print(f"  勇者最終HP: {self.person.hp}/{self.person.initial_hp}")
-        print(f"  總回合數: {actual_round}")
-        print(f"  最大連續暴擊: {self.max_consecutive_crits}")
+        if self.verbose:
+            print(f"[遊戲結束] 獲勝者: {winner}")
+            print(f"  龍王最終HP: {self.dragon.hp}/{self.dragon.initial_hp}")
+            print(f"  勇者最終HP: {self.person.hp}/{self.person.initial_hp}")
+            print(f"  總回合數: {actual_round}")
+            print(f"  最大連續暴擊: {self.max_consecutive_crits}")
         
-        # ★ 保存到 Redis 時使用明確的回合數
-        save_game_to_redis(self.game_id, self.dragon, self.person, winner, actual_round, self.player_name)
+        self.final_round = actual_round
+        if self.persist_on_end:
+            self.persist_result()
         
         # ★ 返回狀態時也使用明確的回合數
         return self.get_state(last_events, final_round=actual_round)
 
+    def persist_result(self):
+        """先寫入剩餘的戰鬥事件，再保存結果 (使用明確的回合數)"""
+        self.event_log.close()
+        return save_game_to_redis(self.game_id, self.dragon, self.person, self.winner, self.final_round,
+                                  self.player_name, replay_fields=self.replay_fields())
+
+    def replay_fields(self):
+        """存進 game:{id} Hash 的重播資訊 (種子 + 輸入，數十 bytes)"""
+        return {'seed': self.seed, 'inputs': self.inputs, 'difficulty': self.difficulty, 'rules': REPLAY_RULES}
+
+    def defer_writes(self):
+        """回合中不寫入 Redis：事件只緩衝、遊戲結束不存檔，改由 write_behind.write_turn_behind() 背景寫入"""
+        self.persist_on_end = False
+        if self.event_log.flush_policy != 'off':
+            self.event_log.flush_policy = 'game_end'
+
+    def abandon(self):
+        """玩家中途離開 (Session 閒置逾時或被淘汰)：寫入剩餘事件並以「中斷」存檔 (不計入統計與排行榜)"""
+        if self.is_game_over:
+            return
+        self.winner = ABANDONED_WINNER
+        self.is_game_over = True
+        self.final_round = self.turn_count
+        self.persist_result()
+
     def get_state(self, events=None, final_round=None):
         """
         打包當前遊戲狀態，可選傳入事件列表
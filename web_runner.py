@@ -0,0 +1,227 @@
+# web_runner.py
+import threading
+from datetime import datetime
+import eventlet
+from config import DIFFICULTY_SETTINGS
+from database import save_game_to_redis, load_character_from_redis, get_default_character_config
+from combat import create_combatant_from_config, apply_difficulty_hp, ai_choose_skill
+from event_log import BattleEventLog
+from state_protocol import RoomEncoders, emit_room_state
+
+AUTO_TURN_DURATION = 800     # 自動模式回合時間 (ms)
+AUTO_ACTION_DELAY = 500      # 自動模式每次動作的間隔 (ms)
+
+
+DASHBOARD_ROOM = 'dashboard'  # 只有訂閱儀表板 (遊戲完成通知) 的客戶端
+
+
+def game_room(game_id):
+    """每場遊戲的 Socket.IO room 名稱 (開始遊戲的客戶端以 join_game 加入)"""
+    return f'game_{game_id}'
+
+
+def emit_to_game(socketio, event, data, game_id):
+    """
+    只發送給該場遊戲的 room；沒有 game_id 時 (Redis 未連接的 GUI 遊戲) 退回廣播
+    web_game_update 依客戶端協定分送完整 JSON 或差異訊息 (見 state_protocol.py)
+    """
+    if game_id is None:
+        socketio.emit(event, data)
+    elif event == 'web_game_update':
+        emit_room_state(socketio, event, data, game_id, game_room(game_id))
+    else:
+        socketio.emit(event, data, to=game_room(game_id))
+        if event == 'game_over':
+            RoomEncoders.drop(game_id)
+
+
+def emit_web_state(socketio, dragon, person, action_type, actor, game_id=None):
+    """發送 JSON 狀態給前端"""
+    state = {
+        'game_id': game_id,
+        'dragon': {'hp': dragon.hp, 'max_hp': dragon.initial_hp},
+        'person': {
+            'hp': person.hp, 
+            'max_hp': person.initial_hp,
+            'cooldowns': {
+                1: person.cooldowns.get(1, 0),
+                2: person.cooldowns.get(2, 0),
+                3: person.cooldowns.get(3, 0)
+            }
+        },
+        'action_type': action_type,
+        'last_actor': actor
+    }
+    emit_to_game(socketio, 'web_game_update', state, game_id)
+
+
+class WebTurnRunner:
+    """
+    網頁顯示模式的回合引擎 (run_gui_game 只負責 Pygame 視窗)
+
+    規則與時間和 run_gui_game 相同 (只有勇者的 CD 每回合遞減)，但不跑 60 FPS 迴圈：
+    只有在玩家輸入 (put) 或計時到期 (回合逾時、動畫、自動模式間隔) 時才推進，
+    計時使用 eventlet.spawn_after，等待期間不佔用任何 green thread。
+
+    put() 與 queue.Queue 相同介面，可直接放進 app.game_input_queues。
+    """
+    def __init__(self, game_id, mode='manual', player_name='匿名玩家', difficulty='normal',
+                 socketio=None, on_finish=None):
+        self.game_id = game_id
+        self.mode = mode
+        self.player_name = player_name
+        self.difficulty = difficulty
+        self.socketio = socketio
+        self.on_finish = on_finish
+
+        diff_settings = DIFFICULTY_SETTINGS.get(difficulty, DIFFICULTY_SETTINGS['normal'])
+        self.turn_duration = (diff_settings['turn_duration'] if mode == 'manual' else AUTO_TURN_DURATION) / 1000
+        self.animation_duration = (1000 if mode == 'manual' else 400) / 1000
+
+        d_conf = load_character_from_redis('dragon') or get_default_character_config('dragon')
+        p_conf = load_character_from_redis('person') or get_default_character_config('person')
+        self.dragon = create_combatant_from_config(d_conf, difficulty=difficulty)
+        self.person = create_combatant_from_config(p_conf, difficulty='normal')
+        apply_difficulty_hp(self.dragon, self.person, difficulty)
+
+        # Redis 未連接時 game_id 是本機暫用的字串，不寫入事件與結果
+        self.event_log = BattleEventLog(game_id) if isinstance(game_id, int) else None
+        self.current_rounds = 1
+        self.turn_state = None
+        self.winner = None
+        self.game_data = None
+
+        self._timer = None
+        self._timer_generation = 0  # 每次 _schedule 加一，過期的計時器據此放棄執行
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    # --- 對外介面 ---
+
+    def start(self):
+        """發送初始狀態並進入第一個玩家回合"""
+        self._emit('init', None)
+        with self._lock:
+            self._enter_player_turn()
+        return self
+
+    def put(self, web_cmd):
+        """接收網頁按鍵 ('skill_1' ~ 'skill_3')，只在手動模式的玩家回合有效"""
+        if not isinstance(web_cmd, str) or not web_cmd.startswith('skill_'):
+            return
+        try:
+            action = int(web_cmd.split('_')[1])
+        except ValueError:
+            return
+
+        with self._lock:
+            if self.mode != 'manual' or self.turn_state != 'player_turn':
+                return
+            # 技能冷卻中就忽略，繼續等待輸入或逾時
+            if self.person.cooldowns.get(action, 0) > 0:
+                return
+            self._player_act(action)
+
+    def wait(self, timeout=None):
+        """等待遊戲結束，回傳與 run_gui_game 相同格式的結果"""
+        self._done.wait(timeout)
+        return self.game_data
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    # --- 狀態轉換 (呼叫時必須持有 self._lock) ---
+
+    def _schedule(self, seconds, callback):
+        """
+        取消上一個計時器並排程新的 (同一時間只會有一個計時器)
+        已開始執行的計時器無法 cancel()，可能正卡在 self._lock 上，
+        因此以世代編號判斷：被取代的計時器拿到鎖後不執行 callback
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_generation += 1
+        self._timer = eventlet.spawn_after(seconds, self._fire, callback, self._timer_generation)
+
+    def _fire(self, callback, generation):
+        with self._lock:
+            if generation != self._timer_generation:
+                return  # 等待鎖的期間已被新的計時器取代
+            self._timer = None
+            callback()
+
+    def _enter_player_turn(self):
+        self.turn_state = 'player_turn'
+        self.dragon.skillchose = 0
+        if self.mode == 'auto':
+            self._schedule(AUTO_ACTION_DELAY / 1000, lambda: self._player_act(ai_choose_skill(self.person, self.dragon)))
+        else:
+            # 手動模式超時：預設普攻
+            self._schedule(self.turn_duration, lambda: self._player_act(1))
+
+    def _player_act(self, action):
+        self.person.attack(self.dragon, choice=action, current_round=self.current_rounds, event_log=self.event_log)
+        self._emit('attack', 'person')
+        self.turn_state = 'animating'
+        self._schedule(self.animation_duration, self._after_animation)
+
+    def _dragon_act(self):
+        self.turn_state = 'dragon_turn'
+        self.dragon.attack(self.person, current_round=self.current_rounds, event_log=self.event_log)
+        self._emit('attack', 'dragon')
+        self.turn_state = 'animating'
+        self.person.skillchose = 0
+        self._schedule(self.animation_duration, self._after_animation)
+
+    def _after_animation(self):
+        if self.dragon.hp <= 0 or self.person.hp <= 0:
+            self._finish()
+        elif self.person.skillchose > 0:
+            self._dragon_act()
+        else:
+            # 雙方都行動過：進入下一回合 (只有勇者的 CD 遞減，與 run_gui_game 相同)
+            self.current_rounds += 1
+            self.person.decrement_cooldowns()
+            if self.event_log:
+                self.event_log.end_turn()
+            self._enter_player_turn()
+
+    def _finish(self):
+        self.turn_state = 'game_over'
+        if self.dragon.hp <= 0 and self.person.hp <= 0:
+            self.winner = '平手'
+        elif self.person.hp <= 0:
+            self.winner = '龍王'
+        else:
+            self.winner = '勇者'
+
+        # 儲存到 Redis (先寫入剩餘的戰鬥事件)
+        if self.event_log:
+            self.event_log.close()
+            save_game_to_redis(self.game_id, self.dragon, self.person, self.winner, self.current_rounds, self.player_name)
+
+        self.game_data = {
+            'game_id': self.game_id,
+            'timestamp': datetime.now().isoformat(),
+            'total_rounds': self.current_rounds,
+            'winner': self.winner,
+            'player_name': self.player_name,
+            'difficulty': self.difficulty,
+            'dragon_stats': self.dragon.get_stats(),
+            'person_stats': self.person.get_stats()
+        }
+
+        if self.socketio:
+            emit_to_game(self.socketio, 'game_over', {'winner': self.winner, 'game_id': self.game_id}, self.game_id)
+
+        self._done.set()
+        if self.on_finish:
+            try:
+                self.on_finish()
+            except Exception as e:
+                print(f"[WebRunner] 遊戲 #{self.game_id} 結束回呼失敗: {e}")
+
+    def _emit(self, action_type, actor):
+        if self.socketio:
+            emit_web_state(self.socketio, self.dragon, self.person, action_type, actor, self.game_id)
@@ -0,0 +1,106 @@
+# write_behind.py
+import queue
+import threading
+import time
+from config import WRITE_BEHIND_WORKERS, WRITE_BEHIND_QUEUE_SIZE
+from database import log_battle_events
+
+
+# --- 背景 Redis 寫入 (單例模式) ---
+class WriteBehind:
+    """
+    網頁版回合結束後的 Redis 寫入 (戰鬥事件 XADD、結果存檔交易) 的背景工作者
+
+    Socket.IO 事件處理算完回合就回傳狀態，寫入交給這裡：
+    app.py 在 eventlet.monkey_patch() 之後，工作執行緒是綠色執行緒，
+    等待 Redis 回應時會讓出給其他連線，也不會讓發出動作的客戶端等待 Redis 往返。
+
+    - 依 game_id 分配到固定的工作者，同一場遊戲的寫入維持先後順序 (事件一定在存檔之前)
+    - 同時使用的 Redis 連線最多 workers 條，不會因大量連線同時存檔而用光連線池
+    - 佇列滿了就在呼叫端同步寫入，不丟資料 (退回原本的行為)
+    """
+    _queues = None
+    _lock = threading.Lock()
+    _submitted = 0
+    _completed = 0
+    _failed = 0
+    _inline = 0
+    _busy_seconds = 0.0
+
+    @classmethod
+    def _ensure_started(cls):
+        if cls._queues is not None:
+            return
+        with cls._lock:
+            if cls._queues is not None:
+                return
+            queues = cls._queues = [queue.Queue(maxsize=WRITE_BEHIND_QUEUE_SIZE)
+                                    for _ in range(max(1, WRITE_BEHIND_WORKERS))]
+        # 在鎖外啟動：綠色執行緒的 start() 會讓出，不可持有鎖 (模組可能在 monkey_patch 之前匯入)
+        for jobs in queues:
+            threading.Thread(target=cls._run, args=(jobs,), daemon=True).start()
+        print(f"[WriteBehind] 背景寫入已啟動 ({len(queues)} 個工作者)")
+
+    @classmethod
+    def submit(cls, game_id, fn, *args):
+        """把 fn(*args) 排入 game_id 對應的工作者；佇列已滿時直接執行"""
+        cls._ensure_started()
+        jobs = cls._queues[hash(str(game_id)) % len(cls._queues)]
+        try:
+            jobs.put_nowait((game_id, fn, args))
+            cls._submitted += 1
+        except queue.Full:
+            cls._inline += 1
+            cls._call(game_id, fn, args)
+
+    @classmethod
+    def _call(cls, game_id, fn, args):
+        start = time.perf_counter()
+        try:
+            fn(*args)
+            cls._completed += 1
+        except Exception as e:
+            cls._failed += 1
+            print(f"[WriteBehind] 遊戲 #{game_id} 寫入失敗: {e}")
+        finally:
+            cls._busy_seconds += time.perf_counter() - start
+
+    @classmethod
+    def _run(cls, jobs):
+        while True:
+            game_id, fn, args = jobs.get()
+            try:
+                cls._call(game_id, fn, args)
+            finally:
+                jobs.task_done()
+
+    @classmethod
+    def join(cls):
+        """等待所有排入的寫入完成 (測試或程式結束前使用)"""
+        for jobs in cls._queues or ():
+            jobs.join()
+
+    @classmethod
+    def stats(cls):
+        return {
+            'workers': len(cls._queues) if cls._queues is not None else 0,
+            'queued': sum(jobs.qsize() for jobs in cls._queues) if cls._queues is not None else 0,
+            'submitted': cls._submitted,
+            'completed': cls._completed,
+            'failed': cls._failed,
+            'inline': cls._inline,
+            'avg_write_ms': round(cls._busy_seconds / (cls._completed + cls._failed) * 1000, 3)
+                            if cls._completed + cls._failed else 0
+        }
+
+
+def write_turn_behind(game):
+    """
+    把這一回合緩衝的戰鬥事件 (遊戲結束時再加上結果存檔) 交給 WriteBehind
+    game 必須先 defer_writes()，process_turn 本身才不會寫入 Redis
+    """
+    events = game.event_log.drain()
+    if events:
+        WriteBehind.submit(game.game_id, log_battle_events, game.game_id, events)
+    if game.is_game_over:
+        WriteBehind.submit(game.game_id, game.persist_result)